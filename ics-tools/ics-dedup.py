@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+"""
+Small application to find (and remove) items duplicated with a new UID,
+e.g. after a client imported the same calendar twice.
+"""
+
+import os
+import sys
+import getopt
+from ics.ics_stream import parse_ics_file
+from ics.ics_write import write_ics_stream
+from ics.timeindex import collections
+from ics.dedup import DigestIndex, items, digest
+from ics.sniff import sniff
+from ics.profiling import profile
+from ics.metrics import metrics
+
+verbose = 0
+
+# --------- main -------------------------------------------------------------
+
+def oldest_first(paths: list) -> list:
+    """Return paths sorted by mtime, so the original copy is kept."""
+    result = list()
+    for path in paths:
+        try:
+            result.append((os.stat(path).st_mtime_ns, path))
+        except OSError:
+            continue
+    return [ path for (mtime, path) in sorted(result) ]
+
+
+def rewrite(path: str, data: dict, drop: dict) -> bool:
+    """Replace path by data without the items (UIDs) in drop."""
+    vcalendar = data['VCALENDAR']
+    for vgroup in [ 'VEVENT', 'VTODO' ]:
+        if vgroup not in vcalendar:
+            continue
+        vcalendar[vgroup] = [ comp for (i, comp) in enumerate(vcalendar[vgroup])
+                              if comp.get('UID', (vgroup, i)) not in drop ]
+        if not vcalendar[vgroup]:
+            del vcalendar[vgroup]
+    tmpfile = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    try:
+        with profile.phase('write'), open(tmpfile, 'wb') as file_handle:
+            write_ics_stream(data, file_handle, verbose)
+        os.replace(tmpfile, path)
+    except OSError as err:
+        print(err)
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        return False
+    return True
+
+
+def dedup(paths: list, index: DigestIndex, remove: bool) -> int:
+    """Check paths against index, report and with remove drop duplicates.
+
+    Files holding nothing but duplicates are deleted, others rewritten
+    without them. Returns the number of duplicates found.
+    """
+    found = 0
+    for path in paths:
+        profile.file(path)
+        metrics.count('files_scanned')
+        with profile.phase('sniff'):
+            kind = sniff(path)
+        if kind != 'ical':
+            metrics.skip('not_ics')
+            continue
+        try:
+            size = os.path.getsize(path)
+            metrics.count('bytes_read', size)
+            with profile.phase('parse', size), open(path, 'rb') as file_handle:
+                data = parse_ics_file(file_handle, path, verbose)
+        except OSError as err:
+            print(err)
+            metrics.error('read')
+            continue
+        if (data == None) or (data.get('VCALENDAR') == None):
+            metrics.skip('not_ics')
+            continue
+        groups = items(data['VCALENDAR'])
+        drop = dict()
+        with profile.phase('hash'):
+            for (uid, components) in groups.items():
+                first = index.add(path, digest(components))
+                if first != None:
+                    drop[uid] = 1
+                    print("{} ({}) duplicates an item of {}".format(path, uid if type(uid) is str else '-', first))
+        found += len(drop)
+        metrics.count('duplicates', len(drop))
+        if (not remove) or (not drop):
+            continue
+        if len(drop) == len(groups):
+            try:
+                os.remove(path)
+            except OSError as err:
+                print(err)
+                metrics.error('remove')
+                continue
+            if verbose:
+                print("{} removed".format(path))
+            metrics.count('files_removed')
+        elif rewrite(path, data, drop):
+            if verbose:
+                print("{} rewritten".format(path))
+            metrics.count('files_modified')
+        else:
+            metrics.error('write')
+    return found
+
+
+def main(taskdir: str, remove: bool, across: bool) -> int:
+    try:
+        os.stat(taskdir)
+    except FileNotFoundError:
+        print("Directory {} not found, exiting.".format(taskdir))
+        return 1
+    with profile.phase('walk'):
+        groups = collections(taskdir, verbose)
+    found = 0
+    if across:
+        # one index, files of all collections oldest first
+        paths = [ os.path.join(d, name) for d in groups for name in groups[d] ]
+        found += dedup(oldest_first(paths), DigestIndex(), remove)
+    else:
+        # duplicates within each collection only
+        for directory in sorted(groups):
+            paths = [ os.path.join(directory, name) for name in groups[directory] ]
+            found += dedup(oldest_first(paths), DigestIndex(), remove)
+    if verbose:
+        print("{} duplicates found".format(found))
+    profile.report()
+    metrics.save()
+    return 0
+
+
+def usage():
+    print("usage: {} [-v] [-r] [-a] [taskdir]".format(sys.argv[0]))
+    print("  -v, --verbose  more output, repeat for even more")
+    print("  -r, --remove   remove the duplicates (files holding nothing else are")
+    print("                 deleted, others rewritten), the oldest copy is kept")
+    print("  -a, --across   look for duplicates across collections, not only within")
+    print("  --profile      print time and bytes per phase and the slowest files")
+    print("  --metrics=FILE append a JSON line with run metrics to FILE (- for stdout)")
+
+
+if __name__ == '__main__':
+    taskdir = '.'
+    remove = False
+    across = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hvra", ["help", "verbose", "remove", "across", "profile", "metrics="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o in ("-v", "--verbose"):
+            verbose += 1
+        elif o in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif o in ("-r", "--remove"):
+            remove = True
+        elif o in ("-a", "--across"):
+            across = True
+        elif o == "--profile":
+            profile.enable(10)
+        elif o == "--metrics":
+            metrics.enable(a, 'ics-dedup')
+    if len(args) > 0:
+        taskdir = args[0]
+    if verbose:
+        print("You are running `{}`".format(" ".join(sys.argv)))
+    rc = main(taskdir, remove, across)
+    sys.exit(rc)
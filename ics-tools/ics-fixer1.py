@@ -10,7 +10,25 @@ import sys
 import re
 import getopt
 from uuid import uuid4
-import filecmp
+from ics.tokenizer import parse_lines, decode
+from ics.ics_write import write_ics_stream
+from ics.ics_lazy import parse_ics_lazy
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from ics.uid_index import UIDIndex
+from ics.manifest import Manifest, fingerprint
+from ics.rules import RuleEngine
+from ics.walk import walk, hidden
+from ics.sniff import sniff
+from ics.profiling import profile
+from ics.metrics import metrics
+from ics.hook import changed_paths, ENVIRONMENT
+from ics.watch import Watcher, StoreLock, lockfile, LOCKFILE
+from ics.tz import ZONES, locations, normalise, tzparam
+from ics.parse_cache import cache, MAXSIZE
+
+VERSION = '0.1.0'
 
 # --------------- magic here --------------- #
 
@@ -19,11 +37,17 @@ class MyICS():
  
     global_uidset = dict()
 
-    def __init__(self, data: str =None,  file='',  verbose: int =0,  debug: dict =None):
+    def __init__(self, data: str =None,  file='',  verbose: int =0,  debug: dict =None,  lazy: bool =False):
         """Update internal class default values if needed."""
         self._verbose = verbose
         self._debug = debug
+        self._lazy = lazy
+        self.digest = None
+        self.changes = 0
+        self.repairs = list()
         if data != None:
+            if isinstance(data, bytes):
+                self.digest = hashlib.sha1(data).hexdigest()
             self.data = self.parse(data,  file)
         else:
             self.readfile(file)
@@ -35,29 +59,25 @@ class MyICS():
         if file:
             try:
                 if os.stat(file):
+                    with profile.phase('sniff'):
+                        kind = sniff(file)
+                    if kind != 'ical':
+                        # don't slurp attachments, backups etc.
+                        if self._verbose:
+                            print("{}: {} file, not reading it".format(file, kind))
+                        return ''
                     # with open(file, 'r', encoding='utf8') as file_handle:
-                    with open(file, 'rb') as file_handle:
+                    with profile.phase('read') as phase, open(file, 'rb') as file_handle:
                         file_content = file_handle.read()
+                        phase.bytes = len(file_content)
+                    metrics.count('bytes_read', len(file_content))
+                    self.digest = hashlib.sha1(file_content).hexdigest()
                     return file_content
             except FileNotFoundError as err:
                 if self._verbose > 1:
                     print(err)
         return ''
 
-    def _writefile(self, file: str, data: dict =None) -> bool:
-        """Write data to file, use empty string if no data provided."""
-        if file:
-            if data is None:
-                data = self.data
-            try:
-                with open(file, 'w', encoding='utf8') as file_handle:
-                    file_handle.write(data)
-            except OSError as err:
-                if self._verbose > 1:
-                    print(err)
-                return False
-        return True
-
     def get(self):
         return self.data
 
@@ -74,208 +94,93 @@ class MyICS():
         if self.data == None:
             return False
         if file != '':
-            data = self.write()
-            if data == None:
-                return False
-            return self._writefile(file, data)
+            try:
+                with profile.phase('write') as phase, open(file, 'wb') as file_handle:
+                    written = write_ics_stream(self.data, file_handle, self._verbose)
+                    phase.bytes = file_handle.tell()
+                    metrics.count('bytes_written', phase.bytes if profile.enabled else file_handle.tell())
+                    return written
+            except OSError as err:
+                if self._verbose > 1:
+                    print(err)
         return False
 
+    def replacefile(self, file) -> bool:
+        """Write data to a temporary file next to file, then move it over file."""
+        tmpfile = os.path.join(os.path.dirname(file), '.' + os.path.basename(file) + '.tmp')
+        if not self.writefile(tmpfile):
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            return False
+        try:
+            shutil.copymode(file, tmpfile)
+            os.replace(tmpfile, file)
+        except OSError as err:
+            if self._verbose > 1:
+                print(err)
+            return False
+        return True
+
     def fixup(self):
-        fixed = self.fix()
+        with profile.phase('fix'):
+            fixed = self.fix()
         if fixed == None:
             return False
         return self.set(fixed)
 
     def parse(self,  icsdata: str,  source='') -> dict:
-        """Parse string into structured ics dataset."""
-        ctxnames_1 = { 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1 }
-        ctxnames_2 = { 'VALARM': 1, 'STANDARD': 1, 'DAYLIGHT': 1 }
-        multivalue = [ 'ATTACH', 'ATTENDEE' ]
-        lineno = 0
-        data = dict()
-        ctxstack = list()
-        key = None
-        ctx_1 = None
-        ctx_2 = None
-        caldata = None
-        for line in icsdata.splitlines():
-            lineno += 1
-            line = str(line, 'utf-8', 'ignore')
-            if (lineno == 1) and (line.endswith('BEGIN:VCALENDAR')):
-                if not line.startswith('BEGIN:VCALENDAR'):
-                    # trim binary blob..
-                    line = str("BEGIN:VCALENDAR")
-            if (lineno == 1) and (not line.startswith('BEGIN:VCALENDAR')):
-                if self._verbose:
-                    print("Not ics data")
-                return None
-            if self._debug:
-                for pattern in self._debug:
-                    if line.count(pattern):
-                        print("Source '{}' Line {}: debug option found: {}".format(source, lineno, pattern))
-                        print(' '+line)
-                        print(" Context: "+' -> '.join(ctxstack))
-            if line.startswith('BEGIN:'):
-                (tag,ctx) = line.split(':')
-                ctxstack.append(ctx)
-                if ctx == 'VCALENDAR':
-                    caldata = dict()
-                    ctx_1 = None
-                    ctx_2 = None
-                elif ctx in ctxnames_1:
-                    ctx_1 = dict()
-                    ctx_2 = None
-                elif ctx in ctxnames_2:
-                    ctx_2 = dict()
-                else:
-                    print("unknown context; source {} line {}".format(source,lineno))
-                    print(line)
-                    continue
-            elif line.startswith('END:'):
-                (tag,ctx) = line.split(':')
-                if ctx != ctxstack[-1]:
-                    print("out of context; source {} line {}".format(source,lineno))
-                    print(line)
-                if self._verbose > 2:
-                    print("Context: "+' -> '.join(ctxstack))
-                del ctxstack[-1]
-                if ctx == 'VCALENDAR':
-                    data[ctx] = caldata
-                elif (ctx == 'VEVENT') or (ctx == 'VTODO') or (ctx == 'VTIMEZONE') or (ctx == 'ALARM'):
-                    if ctx_1 == None:
-                        print("context missing; source {} line {}".format(source,lineno))
-                        print(line)
-                        continue
-                    if ctx in caldata:
-                        caldata[ctx].append(ctx_1)
-                    else:
-                        caldata[ctx] = [ ctx_1, ]
-                    ctx_1 = None
-                elif (ctx == 'VALARM') or (ctx == 'STANDARD') or (ctx == 'DAYLIGHT'):
-                    if (ctx_2 == None) or (ctx_1 == None):
-                        print("context missing; source {} line {}".format(source,lineno))
-                        print(line)
-                        continue
-                    if ctx in ctx_1:
-                        ctx_1[ctx].append(ctx_2)
-                    else:
-                        ctx_1[ctx] = [ ctx_2, ]
-                    ctx_2 = None
-                else:
-                    print("unknown context; source {} line {}".format(source,lineno))
-                    print(line)
-                    continue
-            elif (line.startswith(' ')) or (line.startswith('\\')):
-                if line.startswith('\\'):
-                    line = ' '+line     ## fix brokenness
-                if not key:
-                    print("broken continuation; source {} line {}".format(source,lineno))
-                    print(line)
-                    print("Context: "+' -> '.join(ctxstack))
-                    continue
-                if ctx_2 != None:
-                    if key in ctx_2:
-                        ctx_2[key] += '\n'+line
-                    else:
-                        ctx_2[key] = line
-                elif ctx_1 != None:
-                    if key in ctx_1:
-                        ctx_1[key] += '\n'+line
-                    else:
-                        #print("broken continuation; source {} line {}".format(source,lineno))
-                        #print(line)
-                        #print("Context: "+' -> '.join(ctxstack))
-                        #print("key: {}\nctx: {}".format(key,ctx_1))
-                        ctx_1[key] = line
-                else:
-                    if key in caldata:
-                        caldata[key] += '\n'+line
-                    else:
-                        caldata[key] = line
-            else:
-                if line.count(':') == 0:
-                    print("broken continuation?; source {} line {}".format(source,lineno))
-                    print(line)
-                    print("Context: "+' -> '.join(ctxstack))
-                    continue
-                tokens = line.split(':')
-                key = tokens[0]
-                val = ':'.join(tokens[1:])
-                if key in multivalue:
-                    if ctx_2 != None:
-                        if key in ctx_2:
-                            ctx_2[key].append(val)
-                        else:
-                            ctx_2[key] = [ val, ]
-                    elif ctx_1 != None:
-                        if key in ctx_1:
-                            ctx_1[key].append(val)
-                        else:
-                            ctx_1[key] = [ val, ]
-                    else:
-                        if key in caldata:
-                            caldata[key].append(val)
-                        else:
-                            caldata[key] = [ val, ]
-                else:
-                    if ctx_2 != None:
-                        ctx_2[key] = val
-                    elif ctx_1 != None:
-                        ctx_1[key] = val
-                    else:
-                        caldata[key] = val
-        data['VCALENDAR'] = caldata
+        """Parse string into structured ics dataset, through the parse cache if enabled."""
+        if (not cache.enabled) or self._debug or (not isinstance(icsdata, bytes)):
+            return self._parse(icsdata, source)
+        mode = 'lazy' if self._lazy else 'eager'
+        with profile.phase('cache', len(icsdata)):
+            hit = cache.load(icsdata, mode)
+        if hit != None:
+            metrics.count('cache_hits')
+            self.repairs.extend(hit[1])
+            return hit[0]
+        metrics.count('cache_misses')
+        data = self._parse(icsdata, source)
+        with profile.phase('cache'):
+            cache.store(icsdata, mode, data, self.repairs)
         return data
 
-    def write(self, icsdata: dict =None) -> str:
-        """Write structured ics dataset to string."""
-        ctxnames_1 = { 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1 }
-        ctxnames_2 = { 'VALARM': 1, 'STANDARD': 1, 'DAYLIGHT': 1 }
-        multivalue = [ 'ATTACH', 'ATTENDEE' ]
-        if icsdata == None:
-            icsdata = self.data
-        ics = list()
-        if 'VCALENDAR' not in icsdata:
-            if self._verbose:
-                print("Not ics data")
-            return None
-        ics.append("BEGIN:VCALENDAR")
-        data = icsdata['VCALENDAR']
-        keys_1 = data.keys()
-        for key_1 in keys_1:
-            if key_1 not in ctxnames_1:
-                if key_1 in multivalue:
-                     for k in data[key_1]:
-                         ics.append("{}:{}".format(key_1,k))
-                else:
-                     ics.append("{}:{}".format(key_1,data[key_1]))
-            else:
-                for item_1 in data[key_1]:
-                    ics.append("BEGIN:{}".format(key_1))
-                    for key_2 in item_1.keys():
-                        if key_2 not in ctxnames_2:
-                            if key_2 in multivalue:
-                                for k in item_1[key_2]:
-                                    ics.append("{}:{}".format(key_2,k))
-                                pass
-                            else:
-                                ics.append("{}:{}".format(key_2,item_1[key_2]))
-                        else:
-                            for item_2 in item_1[key_2]:
-                                ics.append("BEGIN:{}".format(key_2))
-                                for key_3 in item_2.keys():
-                                    if key_3 in multivalue:
-                                        for k in item_2[key_3]:
-                                            ics.append("{}:{}".format(key_3,k))
-                                    else:
-                                        ics.append("{}:{}".format(key_3,item_2[key_3]))
-                                ics.append("END:{}".format(key_2))
-                    ics.append("END:{}".format(key_1))
-        ics.append("END:VCALENDAR")
-        return '\n'.join(ics)
-        
+    def _parse(self,  icsdata: str,  source='') -> dict:
+        size = len(icsdata)
+        if self._lazy and (not self._debug) and isinstance(icsdata, bytes):
+            with profile.phase('parse', size):
+                return parse_ics_lazy(icsdata, source, self._verbose, self.repairs)
+        if isinstance(icsdata, bytes):
+            with profile.phase('decode', size):
+                lines = list(map(decode, icsdata.splitlines()))
+        else:
+            lines = icsdata.splitlines()
+        with profile.phase('parse', size):
+            return parse_lines(lines, source, self._verbose, self._debug, self.repairs)
+
+    def uids(self,  data: dict = None) -> list:
+        """List the UID like properties fix() checks for uniqueness as (prop, value) tuples."""
+        if data == None:
+            data = self.data
+        if (data == None) or ('VCALENDAR' not in data) or (data['VCALENDAR'] == None):
+            return list()
+        uids = list()
+        for vgroup_1 in [ 'VEVENT',  'VTODO' ]:
+            for vgroup_item_1 in data['VCALENDAR'].get(vgroup_1, list()):
+                items = [ vgroup_item_1 ] + vgroup_item_1.get('VALARM', list())
+                for item in items:
+                    for vprop in [ 'UID',  'X-RADICALE-NAME' ]:
+                        if vprop in item:
+                            uids.append((vprop, item[vprop]))
+        return uids
+
     def fix(self,  data: dict = None) -> dict:
-        """Fix up broken/non-compliant or non-interchangeable ics data provided in structured dataset."""
+        """Fix up broken/non-compliant or non-interchangeable ics data provided in structured dataset.
+
+        Applies all registered rules in a single pass, see rules below.
+        Counts the modifications made in self.changes.
+        """
+        self.changes = 0
 
         if data == None:
             data = self.data
@@ -286,163 +191,137 @@ class MyICS():
         if ('VEVENT' not in data['VCALENDAR']) or (data['VCALENDAR']['VEVENT'] == None):
             return None
 
-        # - find "bad" uids
-        # - vdirsyncer checks for unique uids
-        # - vdirsyncer treats 'X-RADICALE-NAME' like a UID (?!)
-        uidset = dict()
-        vgroups_1 = [ 'VEVENT',  'VTODO' ]
-        vgroups_2 = [ 'VALARM' ]
-        vproperties = [ 'UID',  'X-RADICALE-NAME' ]
-        propregex = dict()
-        propregex['UID'] = re.compile(r'^\w[a-zA-Z0-9-]+\w$')          # underscore is not allowed, so \w does not work
-        propregex['X-RADICALE-NAME'] = re.compile(r'^[\w\./_-]+$')
-        for vgroup_1 in vgroups_1:
-            if vgroup_1 not in data['VCALENDAR']:
-                continue
-            for vgroup_iter_1 in range(len(data['VCALENDAR'][vgroup_1])):
-                vgroup_item_1 = data['VCALENDAR'][vgroup_1][vgroup_iter_1]
-                for vprop in vproperties:
-                    # check for duplicates in properties (1st level)
-                    if vprop not in vgroup_item_1:
-                        continue
-                    p = vgroup_item_1[vprop]
-                    if p.endswith('.ics'):
-                        if self._verbose:
-                            print("fixing property id with '.ics': {}".format(p))
-                        data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop] = str(uuid4())
-                    if (p in uidset) or (p in self.global_uidset):
-                        if self._verbose:
-                            print("fixing non-unique property id {}".format(p))
-                        data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop] = str(uuid4())
-                        if self._verbose > 1:
-                            print("{} -1-- {}".format(p,data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop]))
-                    uidset[data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop]] = 1
-                for vgroup_2 in vgroups_2:
-                    if vgroup_2 not in vgroup_item_1:
-                        continue
-                    for vgroup_iter_2 in range(len(vgroup_item_1[vgroup_2])):
-                        # check for duplicates in nested properties (2nd level)
-                        for vprop in vproperties:
-                            if vprop not in vgroup_item_1[vgroup_2][vgroup_iter_2]:
-                                continue
-                            p = vgroup_item_1[vgroup_2][vgroup_iter_2][vprop]
-                            if p.endswith('.ics'):
-                                if self._verbose:
-                                    print("fixing property id with '.ics': {}".format(p))
-                                data['VCALENDAR'][vgroup_1][vgroup_iter_1][vgroup_2][vgroup_iter_2][vprop] = str(uuid4())
-                            if (p in uidset) or (p in self.global_uidset):
-                                if self._verbose:
-                                    print("fixing non-unique property id {}".format(p))
-                                data['VCALENDAR'][vgroup_1][vgroup_iter_1][vgroup_2][vgroup_iter_2][vprop] = str(uuid4())
-                                if self._verbose > 1:
-                                    print("{} -2- {}".format(p,data['VCALENDAR'][vgroup_1][vgroup_iter_1][vgroup_2][vgroup_iter_2][vprop]))
-                            uidset[data['VCALENDAR'][vgroup_1][vgroup_iter_1][vgroup_2][vgroup_iter_2][vprop]] = 1
-                # check propregex
-                for vprop in vproperties:
-                    if vprop not in vgroup_item_1:
-                        continue
-                    # print("vprop: {} - {}\npropregex: {}".format(vprop, vgroup_item_1[vprop],  propregex[vprop]))
-                    if propregex[vprop].match(vgroup_item_1[vprop]) == None:    # property value not matching pattern
-                        if self._verbose:
-                            print("fixing poor/bad property id {}".format(vgroup_item_1[vprop]))
-                        data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop] = str(uuid4())
-                    uidset[data['VCALENDAR'][vgroup_1][vgroup_iter_1][vprop]] = 1
-        self.global_uidset.update(uidset)
-        # RECURRENCE-ID property errors on new radicale versions (use RRULE instead)
-        for event_iter in range(len(data['VCALENDAR']['VEVENT'])):
-            badkeys = list()
-            vevent = data['VCALENDAR']['VEVENT'][event_iter]
-            for k in vevent:
-                if k.startswith('RECURRENCE-ID'):
-                    badkeys.append(k)
-            for k in badkeys:
-                del data['VCALENDAR']['VEVENT'][event_iter][k]
-        # DT properties have TZ included no need to specify TZID (errors on radicale)
-        for event_iter in range(len(data['VCALENDAR']['VEVENT'])):
-            vevent = data['VCALENDAR']['VEVENT'][event_iter]
-            if 'TZID' in vevent:
-                del data['VCALENDAR']['VEVENT'][event_iter]['TZID']
-        ## -- following part disabled (see above) -- ##
-        ## # check if TZID are official names
-        ## for event_iter in range(len(data['VCALENDAR']['VEVENT'])):
-        ##     vevent = data['VCALENDAR']['VEVENT'][event_iter]
-        ##     if 'TZID' not in vevent:
-        ##         continue
-        ##     tz = data['VCALENDAR']['VEVENT'][event_iter]['TZID']
-        ##     if tz not in pytz.all_timezones:
-        ##         print("broken timezone id {}".format(tz))
-        ## --------- end of disabled part --------- ##
-        # Thunderbird Lightning chokes on composite 'TRIGGER'
-        # entries with VALUE=DURATION (VCALENDAR > VEVENT > VALARM)
-        # and composite 'DTSTAMP' properties with VALUE=DATE
-        # (VCALENDAR > VEVENT )
-        # it also adds annoying 'X-LIC-ERROR' entry
-        for event_iter in range(len(data['VCALENDAR']['VEVENT'])):
-            vevent = data['VCALENDAR']['VEVENT'][event_iter]
-            badkeys = list()
-            value = None
-            for k in vevent.keys():
-                if k.startswith('X-LIC-ERROR'):
-                    badkeys.append(k)
-                if k.startswith('COLOR'):
-                    badkeys.append(k)
-                if k.startswith('DTSTAMP;VALUE=DATE'):
-                    value = vevent[k]
-                    badkeys.append(k)
-                if (k == 'X-RADICALE-NAME') and ('UID' in vevent) and (vevent['UID'] == vevent['X-RADICALE-NAME']):
-                    ## TODO: check if this is correct...
-                    ## they shouldn't be the same as the previous fix should have modified one of them!
-                    #badkeys.append(k)
-                    data['VCALENDAR']['VEVENT'][event_iter][k] = str(uuid4())
-            for k in badkeys:
-                del data['VCALENDAR']['VEVENT'][event_iter][k]
-            if value != None:
-                data['VCALENDAR']['VEVENT'][event_iter]['DTSTAMP'] = value
-            if 'VALARM' not in vevent:
-                continue
-            for alarm_iter in range(len(data['VCALENDAR']['VEVENT'][event_iter]['VALARM'])):
-                valarm = data['VCALENDAR']['VEVENT'][event_iter]['VALARM'][alarm_iter]
-                badkeys = list()
-                value = None
-                for k in valarm.keys():
-                    if k.startswith('TRIGGER;VALUE=DURATION'):
-                        if self._verbose > 1:
-                            print("fixing duration alarm trigger")
-                        value = valarm[k]
-                        badkeys.append(k)
-                    if k.startswith('X-LIC-ERROR'):
-                        badkeys.append(k)
-                for k in badkeys:
-                    del data['VCALENDAR']['VEVENT'][event_iter]['VALARM'][alarm_iter][k]
-                if value != None:
-                    data['VCALENDAR']['VEVENT'][event_iter]['VALARM'][alarm_iter]['TRIGGER'] = value
-        # Thunderbird Lightning chokes on composite 'TRIGGER'
-        # entries with VALUE=DURATION (VCALENDAR > VTODO > VALARM)
-        # it also adds annoying 'X-LIC-ERROR' entry
-        if 'VTODO' in data['VCALENDAR']:
-            for event_iter in range(len(data['VCALENDAR']['VTODO'])):
-                vevent = data['VCALENDAR']['VTODO'][event_iter]
-                if 'VALARM' not in vevent:
-                    continue
-                for alarm_iter in range(len(data['VCALENDAR']['VTODO'][event_iter]['VALARM'])):
-                    valarm = data['VCALENDAR']['VTODO'][event_iter]['VALARM'][alarm_iter]
-                    badkeys = list()
-                    value = None
-                    for k in valarm.keys():
-                        if k.startswith('TRIGGER;VALUE=DURATION'):
-                            if self._verbose > 1:
-                                print("fixing duration alarm trigger")
-                            value = valarm[k]
-                            badkeys.append(k)
-                        if k.startswith('X-LIC-ERROR'):
-                            badkeys.append(k)
-                    for k in badkeys:
-                        del data['VCALENDAR']['VTODO'][event_iter]['VALARM'][alarm_iter][k]
-                    if value != None:
-                        data['VCALENDAR']['VTODO'][event_iter]['VALARM'][alarm_iter]['TRIGGER'] = value
+        self.uidset = dict()
+        self.tzids = locations(data['VCALENDAR'])
+        self.changes = rules.run(data['VCALENDAR'], self)
+        self.global_uidset.update(self.uidset)
         #
         return data
 
+
+# fix rules, called as rule(cal, component, key) and returning the number of changes
+
+rules = RuleEngine()
+
+# - find "bad" uids
+# - vdirsyncer checks for unique uids
+# - vdirsyncer treats 'X-RADICALE-NAME' like a UID (?!)
+vproperties = [ 'UID',  'X-RADICALE-NAME' ]
+propregex = dict()
+propregex['UID'] = re.compile(r'^\w[a-zA-Z0-9-]+\w$')          # underscore is not allowed, so \w does not work
+propregex['X-RADICALE-NAME'] = re.compile(r'^[\w\./_-]+$')
+
+def _unique(cal: MyICS, item, level: str) -> int:
+    changes = 0
+    for vprop in vproperties:
+        # check for duplicates in properties
+        if vprop not in item:
+            continue
+        p = item[vprop]
+        if p.endswith('.ics'):
+            if cal._verbose:
+                print("fixing property id with '.ics': {}".format(p))
+            item[vprop] = str(uuid4())
+            changes += 1
+        if (p in cal.uidset) or (p in cal.global_uidset):
+            if cal._verbose:
+                print("fixing non-unique property id {}".format(p))
+            item[vprop] = str(uuid4())
+            changes += 1
+            if cal._verbose > 1:
+                print("{} {} {}".format(p,level,item[vprop]))
+        cal.uidset[item[vprop]] = 1
+    return changes
+
+@rules.rule('unique-uid', [ 'VEVENT',  'VTODO' ])
+def fix_uids(cal: MyICS, item, key) -> int:
+    changes = _unique(cal, item, '-1--')
+    # check for duplicates in nested properties (2nd level)
+    for alarm in item.get('VALARM', list()):
+        changes += _unique(cal, alarm, '-2-')
+    # check propregex
+    for vprop in vproperties:
+        if vprop not in item:
+            continue
+        if propregex[vprop].match(item[vprop]) == None:    # property value not matching pattern
+            if cal._verbose:
+                print("fixing poor/bad property id {}".format(item[vprop]))
+            item[vprop] = str(uuid4())
+            changes += 1
+        cal.uidset[item[vprop]] = 1
+    return changes
+
+# RECURRENCE-ID property errors on new radicale versions (use RRULE instead)
+@rules.rule('recurrence-id', [ 'VEVENT' ], [ 'RECURRENCE-ID' ])
+def fix_recurrence_id(cal: MyICS, item, key) -> int:
+    del item[key]
+    return 1
+
+# DT properties have TZ included no need to specify TZID (errors on radicale)
+@rules.rule('tzid', [ 'VEVENT' ], [ 'TZID' ])
+def fix_tzid(cal: MyICS, item, key) -> int:
+    if key != 'TZID':
+        return 0
+    del item[key]
+    return 1
+
+# check if TZID parameters are official names, replace Windows/Outlook and
+# vendor prefixed names by the IANA ones unless a VTIMEZONE defines them
+@rules.rule('tzid-name', [ 'VEVENT',  'VTODO' ], [ 'DTSTART;', 'DTEND;', 'DUE;', 'EXDATE;', 'RDATE;' ])
+def fix_tzid_name(cal: MyICS, item, key) -> int:
+    tzid = tzparam(key)
+    if (tzid == None) or (tzid in ZONES) or (tzid in cal.tzids):
+        return 0
+    newkey = normalise(key)
+    if newkey == key:
+        if cal._verbose:
+            print("broken timezone id {}".format(tzid))
+        metrics.error('timezone')
+        return 0
+    if newkey in item:
+        return 0
+    if cal._verbose > 1:
+        print("fixing timezone id {}".format(tzid))
+    # in place, properties have to stay ahead of VALARMs
+    item.rename(key, newkey)
+    return 1
+
+# Thunderbird Lightning chokes on composite 'TRIGGER'
+# entries with VALUE=DURATION (VCALENDAR > VEVENT/VTODO > VALARM)
+# and composite 'DTSTAMP' properties with VALUE=DATE
+# (VCALENDAR > VEVENT )
+# it also adds annoying 'X-LIC-ERROR' entry
+@rules.rule('x-lic-error', [ 'VEVENT',  'VALARM' ], [ 'X-LIC-ERROR' ])
+@rules.rule('color', [ 'VEVENT' ], [ 'COLOR' ])
+def fix_drop(cal: MyICS, item, key) -> int:
+    del item[key]
+    return 1
+
+@rules.rule('dtstamp-date', [ 'VEVENT' ], [ 'DTSTAMP;VALUE=DATE' ])
+def fix_dtstamp(cal: MyICS, item, key) -> int:
+    value = item[key]
+    del item[key]
+    item['DTSTAMP'] = value
+    return 2
+
+@rules.rule('radicale-name', [ 'VEVENT' ], [ 'X-RADICALE-NAME' ])
+def fix_radicale_name(cal: MyICS, item, key) -> int:
+    if (key == 'X-RADICALE-NAME') and ('UID' in item) and (item['UID'] == item['X-RADICALE-NAME']):
+        ## TODO: check if this is correct...
+        ## they shouldn't be the same as the previous fix should have modified one of them!
+        item[key] = str(uuid4())
+        return 1
+    return 0
+
+@rules.rule('trigger-duration', [ 'VALARM' ], [ 'TRIGGER;VALUE=DURATION' ])
+def fix_trigger(cal: MyICS, item, key) -> int:
+    if cal._verbose > 1:
+        print("fixing duration alarm trigger")
+    value = item[key]
+    del item[key]
+    item['TRIGGER'] = value
+    return 2
+
 # --------------- end of magic --------------- #
 
 
@@ -451,26 +330,276 @@ class MyICS():
 def usage():
     pass
 
-def getfiles(topdir) -> list:
-    filelist = list()
-    for root, dirs, files in os.walk(topdir, topdown=False):
-        for name in files:
-            filelist.append(os.path.join(root, name))
-    return filelist
+def readbytes(filename) -> bytes:
+    try:
+        with open(filename, 'rb') as file_handle:
+            return file_handle.read()
+    except OSError as err:
+        print(err)
+    return None
 
-def cmpfiles(a=None, b=None, verbose: bool =False) -> bool:
-    if (a == None) or (b == None):
-        return False
-    res = True
-    lineno = 0
-    with open(a) as f1, open(b) as f2:
-        for line1, line2 in zip(f1, f2):
-            lineno += 1
-            if line1 != line2:
-                if verbose:
-                    print(f"files differ on line {lineno}:\n{line1}{line2}")
-                return False
-    return res
+def fixfile(filename, verbose: int =0, debug: list =None, uidset =None, lazy: bool =False, manifest: Manifest =None):
+    """Fix a single file, replace it atomically if anything changed.
+
+    If uidset is given it replaces the UIDs collected from earlier files,
+    see parallel() and UIDIndex.view(). Files the manifest knows as clean
+    are skipped. Returns the MyICS object or None.
+    """
+    if verbose:
+        print("reading {}".format(filename))
+    profile.file(filename)
+    metrics.count('files_scanned')
+    content = None
+    if manifest != None:
+        with profile.phase('sniff'):
+            kind = sniff(filename)
+        if kind == None:
+            metrics.error('read')
+            return None
+        if kind != 'ical':
+            if verbose:
+                print("skipping {}: not an ics file".format(filename))
+            metrics.skip('not_ics')
+            return None
+        with profile.phase('read') as phase:
+            content = readbytes(filename)
+            phase.bytes = len(content or b'')
+        if content == None:
+            metrics.error('read')
+            return None
+        metrics.count('bytes_read', len(content))
+        with profile.phase('compare', len(content)):
+            entry = manifest.same(filename, hashlib.sha1(content).hexdigest())
+        if entry != None:
+            if verbose:
+                print("skipping {}: unchanged since last run".format(filename))
+            (uidset if uidset != None else MyICS.global_uidset).update(dict.fromkeys(entry['uids'], 1))
+            metrics.skip('unchanged')
+            return None
+    if content != None:
+        cal = MyICS(data=content, file=filename, verbose=verbose, debug=debug, lazy=lazy)
+    else:
+        cal = MyICS(file=filename, verbose=verbose, debug=debug, lazy=lazy)
+    if None == cal.get():
+        print("skipping {}: not an ics file".format(filename))
+        metrics.skip('not_ics')
+        return None
+    metrics.tree(cal.get())
+    if uidset != None:
+        cal.global_uidset = uidset
+
+    if not cal.fixup():
+        print("skipping {}: fatal flaw".format(filename))
+        metrics.skip('fatal_flaw')
+        return None
+
+    cal.modified = (cal.changes > 0) or (len(cal.repairs) > 0)
+    metrics.count('changes', cal.changes)
+    metrics.count('lines_repaired', len(cal.repairs))
+    if manifest != None:
+        if cal.modified:
+            manifest.discard(filename)
+        else:
+            manifest.record(filename, cal.digest, [ u for (p, u) in cal.uids() ])
+    if not cal.modified:
+        if verbose > 1:
+            print("{} unchanged".format(filename))
+        return cal
+    if verbose > 1:
+        print("{}: {} changes, {} repaired lines".format(filename, cal.changes, len(cal.repairs)))
+    if cal.replacefile(filename):
+        if verbose > -1:
+            print("{} modified".format(filename))
+        metrics.count('files_modified')
+    else:
+        print("error writing {}".format(filename))
+        metrics.error('write')
+        return None
+    return cal
+
+def _init(profiling: bool, counting: bool, caching: tuple):
+    """Worker initializer."""
+    if profiling:
+        profile.enable(0)
+    if counting:
+        metrics.enable(None)
+    if caching[0]:
+        cache.enable(*caching[1:])
+
+def _collect(args) -> tuple:
+    """Phase 1 worker: return the UID like properties of a file (or None) and profile data."""
+    (filename, verbose, debug, lazy) = args
+    profile.reset()
+    profile.file(filename)
+    metrics.reset()
+    cache.reset()
+    cal = MyICS(file=filename, verbose=verbose, debug=debug, lazy=lazy)
+    if None == cal.get():
+        return (None, profile.snapshot(), metrics.snapshot(), cache.snapshot())
+    return (cal.uids(), profile.snapshot(), metrics.snapshot(), cache.snapshot())
+
+def _fix(args) -> tuple:
+    """Phase 2 worker: fix a file against the UIDs claimed by earlier files."""
+    (filename, taken, verbose, debug, lazy) = args
+    rules.reset()
+    profile.reset()
+    metrics.reset()
+    cache.reset()
+    cal = fixfile(filename, verbose, debug, dict.fromkeys(taken, 1), lazy)
+    if cal == None:
+        return (None, None, None, rules.stats(), profile.snapshot(), metrics.snapshot(), cache.snapshot())
+    return (cal.uids(), cal.digest, cal.modified, rules.stats(), profile.snapshot(), metrics.snapshot(), cache.snapshot())
+
+def parallel(taskfiles: list, jobs: int, verbose: int =0, debug: list =None, index: UIDIndex =None, lazy: bool =False, manifest: Manifest =None) -> int:
+    """Fix files in a process pool with deterministic cross-file UID dedup.
+
+    Phase 1 collects the UIDs of all files in parallel, then the
+    collisions are resolved centrally in file order: a UID counts as
+    taken for a file if any earlier file keeps it. Phase 2 fixes the files
+    in parallel, so the result does not depend on the number of workers.
+    With an index, UIDs the index holds for other files not handled yet
+    in this run count as taken as well, the same as in serial().
+    Files the manifest knows as clean keep their UIDs and are not touched.
+    """
+    taskfiles = [ f for f in taskfiles if not hidden(f) ]
+    seen = dict()
+    if manifest != None:
+        (taskfiles, seen) = skipclean(taskfiles, manifest, verbose)
+    # files resolved before in this run, their index entries are superseded by seen
+    done = set()
+    chunksize = max(1, len(taskfiles) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init, initargs=(profile.enabled, metrics.enabled, cache.settings())) as pool:
+        uids = list(pool.map(_collect, [ (f, verbose, debug, lazy) for f in taskfiles ], chunksize=chunksize))
+        tasks = list()
+        for (filename, (fileuids, snapshot, counters, added)) in zip(taskfiles, uids):
+            profile.merge(snapshot)
+            cache.merge(added)
+            if fileuids == None:
+                print("skipping {}: not an ics file".format(filename))
+                metrics.count('files_scanned')
+                metrics.skip('not_ics')
+                continue
+            # only the byte counts, the rest is counted in phase 2
+            metrics.count('bytes_read', counters['counters'].get('bytes_read', 0))
+            fileuids = [ u for (p, u) in fileuids ]
+            path = os.path.abspath(filename)
+            if index != None:
+                # like serial(): the index counts for files not handled yet in this run
+                taken = [ u for u in fileuids if (u in seen) or
+                          any((p != path) and (p not in done) for p in index.owners(u)) ]
+            else:
+                taken = [ u for u in fileuids if u in seen ]
+            tasks.append((filename, taken, verbose, debug, lazy))
+            # taken UIDs get renamed away, the earlier owner keeps them
+            seen.update(dict.fromkeys([ u for u in fileuids if u not in taken ], 1))
+            done.add(path)
+        if verbose:
+            print("{} files, {} unique ids collected".format(len(tasks), len(seen)))
+        results = list(pool.map(_fix, tasks, chunksize=chunksize))
+    for (task, result) in zip(tasks, results):
+        rules.merge(result[3])
+        profile.merge(result[4])
+        metrics.merge(result[5])
+        cache.merge(result[6])
+        if result[0] == None:
+            continue
+        if index != None:
+            index.update(task[0], result[0], result[1])
+        if manifest == None:
+            pass
+        elif result[2]:
+            manifest.discard(task[0])
+        else:
+            manifest.record(task[0], result[1], [ u for (p, u) in result[0] ])
+    return 0
+
+def serial(taskfiles: list, verbose: int =0, debug: list =None, index: UIDIndex =None, lazy: bool =False, manifest: Manifest =None) -> int:
+    """Fix files one after the other."""
+    if manifest != None:
+        # files found clean before keep their UIDs
+        (taskfiles, uids) = skipclean(taskfiles, manifest, verbose)
+        MyICS.global_uidset.update(uids)
+    for filename in taskfiles:
+        if hidden(filename):
+            # skip dotfiles
+            continue
+        if index != None:
+            cal = fixfile(filename, verbose, debug, index.view(filename), lazy, manifest)
+            if cal != None:
+                index.update(filename, cal.uids(), cal.digest)
+                index.commit()
+        else:
+            fixfile(filename, verbose, debug, lazy=lazy, manifest=manifest)
+    return 0
+
+def watchloop(taskdir: str, jobs: int, verbose: int =0, debug: list =None, index: UIDIndex =None, lazy: bool =False, manifest: Manifest =None, debounce: float =2.0, exclude: list =None) -> int:
+    """Fix items as they get written below taskdir, until interrupted.
+
+    Bursts of changes are collected into batches (see Watcher.batches())
+    and fixed in a process pool with jobs > 0. Each batch is fixed under
+    Radicale's storage lock, so clients cannot write items meanwhile. Our
+    own rewrites show up as changes again, the second pass over them
+    finds nothing to do. Paths starting with one of exclude (index,
+    manifest) are ignored.
+    """
+    exclude = tuple(exclude or list())
+    try:
+        watcher = Watcher(taskdir, verbose)
+    except OSError as err:
+        print("cannot watch {}: {}".format(taskdir, err))
+        return 1
+    lock = StoreLock(lockfile(taskdir), verbose)
+    if lock.path == None:
+        print("no {} found above {}, fixing without the storage lock".format(LOCKFILE, taskdir))
+    if verbose:
+        print("watching {}".format(taskdir))
+    try:
+        for (changed, deleted) in watcher.batches(debounce):
+            changed = [ f for f in changed if not os.path.abspath(f).startswith(exclude) ]
+            deleted = [ f for f in deleted if not os.path.abspath(f).startswith(exclude) ]
+            if not (changed or deleted):
+                continue
+            if verbose:
+                print("{} changed, {} deleted items".format(len(changed), len(deleted)))
+            with lock:
+                # items may have changed again or gone until we got the lock
+                changed = [ f for f in changed if os.path.isfile(f) ]
+                for filename in deleted:
+                    index.remove(filename)
+                if jobs > 0:
+                    parallel(changed, jobs, verbose, debug, index, lazy, manifest)
+                else:
+                    serial(changed, verbose, debug, index, lazy, manifest)
+                index.commit()
+            if manifest != None:
+                manifest.save()
+            cache.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+def skipclean(taskfiles: list, manifest: Manifest, verbose: int =0) -> tuple:
+    """Split off files with unchanged size and mtime since the last clean run.
+
+    Returns the remaining files and a dict with the UIDs of the clean ones.
+    """
+    remaining = list()
+    uids = dict()
+    for filename in taskfiles:
+        entry = manifest.clean(filename)
+        if entry == None:
+            remaining.append(filename)
+            continue
+        if verbose > 1:
+            print("skipping {}: unchanged since last run".format(filename))
+        metrics.count('files_scanned')
+        metrics.skip('unchanged')
+        uids.update(dict.fromkeys(entry['uids'], 1))
+    if verbose:
+        print("{} of {} files unchanged since last run".format(len(taskfiles) - len(remaining), len(taskfiles)))
+    return (remaining, uids)
 
 
 def main() -> int:
@@ -481,9 +610,23 @@ def main() -> int:
     verbose = 0
     debug = list()
     taskfiles = list()
+    jobs = 0
+    indexfile = None
+    manifestfile = None
+    lazy = False
+    stats = False
+    profiling = False
+    slowest = 10
+    pstats = None
+    hook = False
+    watch = False
+    debounce = 2.0
+    caching = False
+    cachedir = None
+    cachesize = MAXSIZE
     
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hvd:f:", ["help", "debug=", "file="])
+        opts, args = getopt.getopt(sys.argv[1:], "hvlsd:f:j:i:m:", ["help", "lazy", "stats", "debug=", "file=", "jobs=", "index=", "manifest=", "profile", "slowest=", "pstats=", "metrics=", "hook", "watch", "debounce=", "cache", "cachedir=", "cachesize="])
     except getopt.GetoptError as err:
         print(err)
         usage()
@@ -498,6 +641,55 @@ def main() -> int:
             debug.append(a)
         elif o in ("-f", "--file"):
             taskfiles.append(a)
+        elif o in ("-j", "--jobs"):
+            try:
+                jobs = int(a)
+            except ValueError:
+                print("invalid number of jobs: {}".format(a))
+                return 2
+        elif o in ("-i", "--index"):
+            indexfile = a
+        elif o in ("-l", "--lazy"):
+            lazy = True
+        elif o in ("-m", "--manifest"):
+            manifestfile = a
+        elif o in ("-s", "--stats"):
+            stats = True
+        elif o == "--profile":
+            profiling = True
+        elif o == "--slowest":
+            try:
+                slowest = int(a)
+            except ValueError:
+                print("invalid number of slowest files: {}".format(a))
+                return 2
+        elif o == "--pstats":
+            profiling = True
+            pstats = a
+        elif o == "--metrics":
+            metrics.enable(a, 'ics-fixer1')
+        elif o == "--hook":
+            hook = True
+        elif o == "--watch":
+            watch = True
+        elif o == "--debounce":
+            try:
+                debounce = float(a)
+            except ValueError:
+                print("invalid debounce time: {}".format(a))
+                return 2
+        elif o == "--cache":
+            caching = True
+        elif o == "--cachedir":
+            caching = True
+            cachedir = a
+        elif o == "--cachesize":
+            caching = True
+            try:
+                cachesize = int(a) * 1024 * 1024
+            except ValueError:
+                print("invalid cache size: {}".format(a))
+                return 2
         else:
             assert False, "unhandled option"
             return 7
@@ -507,8 +699,31 @@ def main() -> int:
         taskdir = args[0]
     if len(args) > 1:
         print("extra arguments detected: {}".format(args[1:]))    
+    if profiling:
+        profile.enable(slowest, pstats)
+    if caching:
+        cache.enable(cachedir, cachesize, verbose)
+
+    deleted = list()
+    if watch and (indexfile == None):
+        print("--watch needs a uid index (-i) of the whole store")
+        return 2
+    if hook:
+        # storage hook: only the items changed in the store (taskdir)
+        if indexfile == None:
+            print("--hook needs a uid index (-i) of the whole store")
+            return 2
+        changed = changed_paths(taskdir, verbose)
+        if changed == None:
+            print("no changed items: set ${} or use a git versioned store".format(ENVIRONMENT))
+            return 1
+        taskfiles = [ f for f in changed if os.path.isfile(f) ]
+        deleted = [ f for f in changed if not os.path.exists(f) ]
+        if verbose:
+            print("{} changed, {} deleted items".format(len(taskfiles), len(deleted)))
 
-    if len(taskfiles) == 0:
+    walked = (len(taskfiles) == 0) and (not hook) and (not watch)
+    if walked:
         try:
             os.stat(taskdir)
         except FileNotFoundError as err:
@@ -517,38 +732,43 @@ def main() -> int:
             if verbose > 1:
                 print(err)
             return 1
-        taskfiles = getfiles(taskdir)
+        taskfiles = list(profile.timed('walk', walk(taskdir, verbose)))
 
-    for filename in taskfiles:
-        if filename.startswith('\.'):
-            # skip dotfiles
-            continue
-        if verbose:
-            print("reading {}".format(filename))
-        cal = MyICS(file=filename, verbose=verbose, debug=debug)
-        if None == cal.get():
-            print("skipping {}: not an ics file".format(filename))
-            continue
-        
-        if not cal.fixup():
-            print("skipping {}: fatal flaw".format(filename))
-            continue
+    index = None
+    if indexfile != None:
+        index = UIDIndex(indexfile, verbose)
+        indexpath = os.path.abspath(indexfile)
+        taskfiles = [ f for f in taskfiles if not os.path.abspath(f).startswith(indexpath) ]
+        if walked and index.prune(taskdir, taskfiles):
+            if verbose:
+                print("removed stale entries from uid index")
+        for filename in deleted:
+            index.remove(filename)
 
-        newfile = filename+'.new'
-        if cal.writefile(newfile):
-            if verbose > 1:
-                print("{} written".format(filename, newfile))
-            # compare old and new..
-            unchanged = cmpfiles(filename, newfile, (verbose>0))
-            if unchanged:
-                os.remove(newfile)
-            else:
-                if verbose > -1:
-                    print("{} -> {} modified".format(filename, newfile))
-                pass
-        else:
-            print("error writing {}".format(newfile))
-    return 0
+    manifest = None
+    if manifestfile != None:
+        manifest = Manifest(manifestfile, VERSION + '/' + fingerprint(MyICS.fix, *[ r.func for r in rules.rules ]), verbose)
+        manifestpath = os.path.abspath(manifestfile)
+        taskfiles = [ f for f in taskfiles if not os.path.abspath(f).startswith(manifestpath) ]
+
+    if watch:
+        exclude = [ os.path.abspath(f) for f in (indexfile, manifestfile) if f != None ]
+        rc = watchloop(taskdir, jobs, verbose, debug, index, lazy, manifest, debounce, exclude)
+    elif jobs > 0:
+        rc = parallel(taskfiles, jobs, verbose, debug, index, lazy, manifest)
+    else:
+        rc = serial(taskfiles, verbose, debug, index, lazy, manifest)
+    if index != None:
+        index.close()
+    if manifest != None:
+        manifest.save()
+    cache.close()
+    if stats:
+        rules.report()
+    profile.report()
+    metrics.ruleset(rules.stats())
+    metrics.save()
+    return rc
 
 
 if __name__ == '__main__':
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+Small application to merge single item ics files into one calendar, the
+inverse of ics-splitter.py
+"""
+
+import os
+import sys
+import getopt
+import heapq
+import contextlib
+import struct
+import hashlib
+import tempfile
+from ics.component import Component
+from ics.ics_stream import iter_ics
+from ics.ics_write import component_bytes, write_properties
+from ics.timeindex import span
+from ics.walk import walk
+from ics.sniff import sniff
+from ics.profiling import profile
+from ics.metrics import metrics
+
+# --------------- magic here --------------- #
+
+# run file record: sort key, input sequence number, length of the component bytes
+record = struct.Struct('>qQI')
+# items without (usable) DTSTART go last
+NOSTART = 2**62
+
+
+class Spool():
+    """Serialised items on disk, in input order or sorted by key.
+
+    Unsorted, all items go to one temporary file. Sorted, up to buffer
+    items are kept in memory and written as a sorted run file when full;
+    items() merges the runs with heapq.merge, so memory stays bounded by
+    buffer items whatever the number of items.
+    """
+
+    def __init__(self, tmpdir: str =None, buffer: int =10000, ordered: bool =False):
+        self.tmpdir = tmpdir
+        self.buffer = buffer
+        self.ordered = ordered
+        self.pending = list()
+        self.runs = list()
+        self.count = 0
+
+    def _newrun(self):
+        run = tempfile.TemporaryFile(prefix='ics-merge-', dir=self.tmpdir)
+        self.runs.append(run)
+        return run
+
+    def add(self, key: int, blob: bytes):
+        if not self.ordered:
+            run = self.runs[0] if self.runs else self._newrun()
+            run.write(record.pack(0, self.count, len(blob)))
+            run.write(blob)
+        else:
+            self.pending.append((key, self.count, blob))
+            if len(self.pending) >= self.buffer:
+                self._flush()
+        self.count += 1
+
+    def _flush(self):
+        if not self.pending:
+            return
+        self.pending.sort(key=lambda i: (i[0], i[1]))
+        run = self._newrun()
+        for (key, seq, blob) in self.pending:
+            run.write(record.pack(key, seq, len(blob)))
+            run.write(blob)
+        self.pending = list()
+
+    @staticmethod
+    def _read(run):
+        run.seek(0)
+        while True:
+            head = run.read(record.size)
+            if len(head) < record.size:
+                return
+            (key, seq, size) = record.unpack(head)
+            yield (key, seq, run.read(size))
+
+    def items(self):
+        """Yield the component bytes of all items, sorted if ordered."""
+        if self.ordered and (not self.runs):
+            # everything fit in memory, no need for a run file
+            self.pending.sort(key=lambda i: (i[0], i[1]))
+            for (key, seq, blob) in self.pending:
+                yield blob
+            return
+        self._flush()
+        for (key, seq, blob) in heapq.merge(*[ self._read(run) for run in self.runs ]):
+            yield blob
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = list()
+        self.pending = list()
+
+
+def itemkey(comp: Component) -> bytes:
+    """Digest of UID and RECURRENCE-ID, None for items without UID."""
+    uid = comp.get('UID')
+    if uid == None:
+        return None
+    digest = hashlib.blake2b(uid.strip().encode('utf-8'), digest_size=16)
+    for key in comp.keys():
+        if (key == 'RECURRENCE-ID') or key.startswith('RECURRENCE-ID;'):
+            digest.update(b'\0' + comp[key].strip().encode('utf-8'))
+    return digest.digest()
+
+
+def merge(taskfiles: list, output, spool: Spool, verbose: int =0) -> int:
+    """Merge the items of taskfiles into one VCALENDAR written to output (binary).
+
+    The calendar properties are taken from the first file, VTIMEZONEs
+    once per TZID and items once per UID (and RECURRENCE-ID), the first
+    one seen wins. Returns the number of items written.
+    """
+    header = None
+    timezones = dict()
+    tzids = dict()
+    seen = dict()
+    for filename in taskfiles:
+        profile.file(filename)
+        metrics.count('files_scanned')
+        with profile.phase('sniff'):
+            kind = sniff(filename)
+        if kind != 'ical':
+            if verbose:
+                print("skipping {}: {} file".format(filename, kind), file=sys.stderr)
+            metrics.skip('not_ics')
+            continue
+        try:
+            size = os.path.getsize(filename)
+            metrics.count('bytes_read', size)
+            with profile.phase('parse', size), open(filename, 'rb') as file_handle:
+                for (name, comp) in iter_ics(file_handle, filename, verbose):
+                    if name == 'VCALENDAR':
+                        if header == None:
+                            header = comp
+                        continue
+                    if name == 'VTIMEZONE':
+                        tzid = (comp.get('TZID') or '').strip()
+                        if tzid not in timezones:
+                            timezones[tzid] = component_bytes(name, comp)
+                            tzids[tzid] = comp.get('X-LIC-LOCATION')
+                        continue
+                    key = itemkey(comp)
+                    if key != None:
+                        if key in seen:
+                            if verbose:
+                                print("{}: duplicate UID {}".format(filename, comp.get('UID')), file=sys.stderr)
+                            metrics.count('duplicates')
+                            continue
+                        seen[key] = 1
+                    start = None
+                    if spool.ordered:
+                        start = span(comp, tzids)
+                    spool.add(NOSTART if start == None else start[0], component_bytes(name, comp))
+        except OSError as err:
+            print(err, file=sys.stderr)
+            metrics.error('read')
+    if header == None:
+        header = Component('VCALENDAR')
+        header['VERSION'] = '2.0'
+    count = 0
+    with profile.phase('write'):
+        output.write(b'BEGIN:VCALENDAR\r\n')
+        write_properties(header, output)
+        for blob in timezones.values():
+            output.write(blob)
+        for blob in spool.items():
+            output.write(blob)
+            count += 1
+        output.write(b'END:VCALENDAR\r\n')
+    metrics.count('items_written', count)
+    metrics.count('timezones_written', len(timezones))
+    return count
+
+# --------------- end of magic --------------- #
+
+
+# --------- mains --------- #
+
+def usage():
+    print("usage: {} [-v] [-s] [-o FILE] [-f FILE ...] [taskdir]".format(sys.argv[0]))
+    print("  -v, --verbose     more output, repeat for even more")
+    print("  -o, --output=FILE write the merged calendar to FILE (default: stdout)")
+    print("  -f, --file=FILE   merge FILE (repeatable) instead of all files below taskdir")
+    print("  -s, --sort        order the items by DTSTART (external sort, bounded memory)")
+    print("  -b, --buffer=N    items sorted in memory per run file (10000)")
+    print("  -t, --tmpdir=DIR  directory for the spool and run files")
+    print("  --profile         print time and bytes per phase and the slowest files")
+    print("  --metrics=FILE    append a JSON line with run metrics to FILE (- for stderr)")
+
+
+def main() -> int:
+    """Merge all files in the given directory."""
+    taskdir = '.'
+    verbose = 0
+    taskfiles = list()
+    outfile = None
+    ordered = False
+    buffer = 10000
+    tmpdir = None
+    profiling = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hvo:f:sb:t:", ["help", "verbose", "output=", "file=", "sort", "buffer=", "tmpdir=", "profile", "metrics="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        return 2
+    for o, a in opts:
+        if o in ("-v", "--verbose"):
+            verbose += 1
+        elif o in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif o in ("-o", "--output"):
+            outfile = a
+        elif o in ("-f", "--file"):
+            taskfiles.append(a)
+        elif o in ("-s", "--sort"):
+            ordered = True
+        elif o in ("-b", "--buffer"):
+            try:
+                buffer = max(int(a), 1)
+            except ValueError:
+                print("invalid buffer size: {}".format(a))
+                return 2
+        elif o in ("-t", "--tmpdir"):
+            tmpdir = a
+        elif o == "--profile":
+            profiling = True
+        elif o == "--metrics":
+            metrics.enable(a, 'ics-merge')
+    if len(args) > 0:
+        taskdir = args[0]
+    if profiling:
+        profile.enable(10)
+
+    # the calendar may go to stdout, so everything else (parser warnings,
+    # profile report, --metrics=-) goes to stderr
+    stdout = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        return run(taskdir, taskfiles, outfile, stdout, ordered, buffer, tmpdir, profiling, verbose)
+
+
+def run(taskdir: str, taskfiles: list, outfile: str, stdout, ordered: bool, buffer: int, tmpdir: str, profiling: bool, verbose: int) -> int:
+    """Merge taskfiles (all files below taskdir if empty) into outfile or stdout."""
+    if len(taskfiles) == 0:
+        if not os.path.isdir(taskdir):
+            print("Directory {} not found, exiting.".format(taskdir), file=sys.stderr)
+            return 1
+        taskfiles = list(profile.timed('walk', walk(taskdir, verbose)))
+    if outfile != None:
+        # don't merge an earlier output into itself
+        outpath = os.path.abspath(outfile)
+        taskfiles = [ f for f in taskfiles if os.path.abspath(f) != outpath ]
+
+    spool = Spool(tmpdir, buffer, ordered)
+    try:
+        if outfile == None:
+            count = merge(taskfiles, stdout, spool, verbose)
+            stdout.flush()
+        else:
+            tmpfile = os.path.join(os.path.dirname(outpath), '.' + os.path.basename(outpath) + '.tmp')
+            with open(tmpfile, 'wb') as file_handle:
+                count = merge(taskfiles, file_handle, spool, verbose)
+            os.replace(tmpfile, outpath)
+    except OSError as err:
+        print(err, file=sys.stderr)
+        metrics.error('write')
+        return 1
+    finally:
+        spool.close()
+    if verbose:
+        print("{} items from {} files merged".format(count, len(taskfiles)), file=sys.stderr)
+    if profiling:
+        profile.report()
+    metrics.save()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,16 @@ import os
 import sys
 import re
 import getopt
+import mmap
 from uuid import uuid4
+from ics.component import Component
+from ics.tokenizer import parse_lines, decode, ctxnames_1, ctxnames_2, multivalue
+from ics.ics_write import write_ics_stream
+from ics.walk import walk, hidden
+from ics.sniff import sniff
+from ics.profiling import profile
+from ics.metrics import metrics
+from ics.parse_cache import cache, MAXSIZE
 from copy import deepcopy
 
 # --------------- magic here --------------- #
@@ -35,29 +44,24 @@ class MyICS():
         if file:
             try:
                 if os.stat(file):
+                    with profile.phase('sniff'):
+                        kind = sniff(file)
+                    if kind != 'ical':
+                        # don't slurp attachments, backups etc.
+                        if self._verbose:
+                            print("{}: {} file, not reading it".format(file, kind))
+                        return ''
                     # with open(file, 'r', encoding='utf8') as file_handle:
-                    with open(file, 'rb') as file_handle:
+                    with profile.phase('read') as phase, open(file, 'rb') as file_handle:
                         file_content = file_handle.read()
+                        phase.bytes = len(file_content)
+                    metrics.count('bytes_read', len(file_content))
                     return file_content
             except FileNotFoundError as err:
                 if self._verbose > 1:
                     print(err)
         return ''
 
-    def _writefile(self, file: str, data: dict =None) -> bool:
-        """Write data to file, use empty string if no data provided."""
-        if file:
-            if data is None:
-                data = self.data
-            try:
-                with open(file, 'w', encoding='utf8') as file_handle:
-                    file_handle.write(data)
-            except OSError as err:
-                if self._verbose > 1:
-                    print(err)
-                return False
-        return True
-
     def get(self):
         return self.data
 
@@ -74,10 +78,15 @@ class MyICS():
         if self.data == None:
             return False
         if file != '':
-            data = self.write()
-            if data == None:
-                return False
-            return self._writefile(file, data)
+            try:
+                with profile.phase('write') as phase, open(file, 'wb') as file_handle:
+                    written = write_ics_stream(self.data, file_handle, self._verbose)
+                    phase.bytes = file_handle.tell()
+                    metrics.count('bytes_written', phase.bytes if profile.enabled else file_handle.tell())
+                    return written
+            except OSError as err:
+                if self._verbose > 1:
+                    print(err)
         return False
 
     def fixup(self):
@@ -87,151 +96,34 @@ class MyICS():
         return self.set(fixed)
 
     def parse(self,  icsdata: str,  source='') -> dict:
-        """Parse string into structured ics dataset."""
-        ctxnames_1 = { 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1 }
-        ctxnames_2 = { 'VALARM': 1, 'STANDARD': 1, 'DAYLIGHT': 1 }
-        multivalue = [ 'ATTACH', 'ATTENDEE' ]
-        lineno = 0
-        data = dict()
-        ctxstack = list()
-        key = None
-        ctx_1 = None
-        ctx_2 = None
-        caldata = None
-        for line in icsdata.splitlines():
-            lineno += 1
-            line = str(line, 'utf-8', 'ignore')
-            if (lineno == 1) and (line.endswith('BEGIN:VCALENDAR')):
-                if not line.startswith('BEGIN:VCALENDAR'):
-                    # trim binary blob..
-                    line = str("BEGIN:VCALENDAR")
-            if (lineno == 1) and (not line.startswith('BEGIN:VCALENDAR')):
-                if self._verbose:
-                    print("Not ics data")
-                return None
-            if self._debug:
-                for pattern in self._debug:
-                    if line.count(pattern):
-                        print("Source '{}' Line {}: debug option found: {}".format(source, lineno, pattern))
-                        print(' '+line)
-                        print(" Context: "+' -> '.join(ctxstack))
-            if line.startswith('BEGIN:'):
-                (tag,ctx) = line.split(':')
-                ctxstack.append(ctx)
-                if ctx == 'VCALENDAR':
-                    caldata = dict()
-                    ctx_1 = None
-                    ctx_2 = None
-                elif ctx in ctxnames_1:
-                    ctx_1 = dict()
-                    ctx_2 = None
-                elif ctx in ctxnames_2:
-                    ctx_2 = dict()
-                else:
-                    print("unknown context; source {} line {}".format(source,lineno))
-                    print(line)
-                    continue
-            elif line.startswith('END:'):
-                (tag,ctx) = line.split(':')
-                if ctx != ctxstack[-1]:
-                    print("out of context; source {} line {}".format(source,lineno))
-                    print(line)
-                if self._verbose > 2:
-                    print("Context: "+' -> '.join(ctxstack))
-                del ctxstack[-1]
-                if ctx == 'VCALENDAR':
-                    data[ctx] = caldata
-                elif (ctx == 'VEVENT') or (ctx == 'VTODO') or (ctx == 'VTIMEZONE') or (ctx == 'ALARM'):
-                    if ctx_1 == None:
-                        print("context missing; source {} line {}".format(source,lineno))
-                        print(line)
-                        continue
-                    if ctx in caldata:
-                        caldata[ctx].append(ctx_1)
-                    else:
-                        caldata[ctx] = [ ctx_1, ]
-                    ctx_1 = None
-                elif (ctx == 'VALARM') or (ctx == 'STANDARD') or (ctx == 'DAYLIGHT'):
-                    if (ctx_2 == None) or (ctx_1 == None):
-                        print("context missing; source {} line {}".format(source,lineno))
-                        print(line)
-                        continue
-                    if ctx in ctx_1:
-                        ctx_1[ctx].append(ctx_2)
-                    else:
-                        ctx_1[ctx] = [ ctx_2, ]
-                    ctx_2 = None
-                else:
-                    print("unknown context; source {} line {}".format(source,lineno))
-                    print(line)
-                    continue
-            elif (line.startswith(' ')) or (line.startswith('\\')):
-                if line.startswith('\\'):
-                    line = ' '+line     ## fix brokenness
-                if not key:
-                    print("broken continuation; source {} line {}".format(source,lineno))
-                    print(line)
-                    print("Context: "+' -> '.join(ctxstack))
-                    continue
-                if ctx_2 != None:
-                    if key in ctx_2:
-                        ctx_2[key] += '\n'+line
-                    else:
-                        ctx_2[key] = line
-                elif ctx_1 != None:
-                    if key in ctx_1:
-                        ctx_1[key] += '\n'+line
-                    else:
-                        #print("broken continuation; source {} line {}".format(source,lineno))
-                        #print(line)
-                        #print("Context: "+' -> '.join(ctxstack))
-                        #print("key: {}\nctx: {}".format(key,ctx_1))
-                        ctx_1[key] = line
-                else:
-                    if key in caldata:
-                        caldata[key] += '\n'+line
-                    else:
-                        caldata[key] = line
-            else:
-                if line.count(':') == 0:
-                    print("broken continuation?; source {} line {}".format(source,lineno))
-                    print(line)
-                    print("Context: "+' -> '.join(ctxstack))
-                    continue
-                tokens = line.split(':')
-                key = tokens[0]
-                val = ':'.join(tokens[1:])
-                if key in multivalue:
-                    if ctx_2 != None:
-                        if key in ctx_2:
-                            ctx_2[key].append(val)
-                        else:
-                            ctx_2[key] = [ val, ]
-                    elif ctx_1 != None:
-                        if key in ctx_1:
-                            ctx_1[key].append(val)
-                        else:
-                            ctx_1[key] = [ val, ]
-                    else:
-                        if key in caldata:
-                            caldata[key].append(val)
-                        else:
-                            caldata[key] = [ val, ]
-                else:
-                    if ctx_2 != None:
-                        ctx_2[key] = val
-                    elif ctx_1 != None:
-                        ctx_1[key] = val
-                    else:
-                        caldata[key] = val
-        data['VCALENDAR'] = caldata
+        """Parse string into structured ics dataset, through the parse cache if enabled."""
+        if (not cache.enabled) or self._debug or (not isinstance(icsdata, bytes)):
+            return self._parse(icsdata, source)
+        with profile.phase('cache', len(icsdata)):
+            hit = cache.load(icsdata, 'eager')
+        if hit != None:
+            metrics.count('cache_hits')
+            return hit[0]
+        metrics.count('cache_misses')
+        # the fixer shares the entries, it needs the repairs
+        repairs = list()
+        data = self._parse(icsdata, source, repairs)
+        with profile.phase('cache'):
+            cache.store(icsdata, 'eager', data, repairs)
         return data
 
+    def _parse(self,  icsdata: str,  source='', repairs: list =None) -> dict:
+        size = len(icsdata)
+        if isinstance(icsdata, bytes):
+            with profile.phase('decode', size):
+                lines = list(map(decode, icsdata.splitlines()))
+        else:
+            lines = icsdata.splitlines()
+        with profile.phase('parse', size):
+            return parse_lines(lines, source, self._verbose, self._debug, repairs)
+
     def write(self, icsdata: dict =None) -> str:
         """Write structured ics dataset to string."""
-        ctxnames_1 = { 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1 }
-        ctxnames_2 = { 'VALARM': 1, 'STANDARD': 1, 'DAYLIGHT': 1 }
-        multivalue = [ 'ATTACH', 'ATTENDEE' ]
         if icsdata == None:
             icsdata = self.data
         ics = list()
@@ -288,7 +180,7 @@ class MyICS():
 
         vgroups = [ 'VEVENT',  'VTODO' ]
         splitdata = dict()
-        vcaldata = dict({'VCALENDAR': {}} )
+        vcaldata = dict({'VCALENDAR': Component('VCALENDAR')} )
         for key in data['VCALENDAR']:
             if key not in vgroups:
                 vcaldata['VCALENDAR'][key] = data['VCALENDAR'][key]
@@ -309,6 +201,102 @@ class MyICS():
         return splitdata
 
 
+
+splitregex = re.compile(rb'^(BEGIN|END):(VEVENT|VTODO)\r?$', re.M)
+uidregex = re.compile(rb'^UID:(.*?)\r?$', re.M)
+endregex = re.compile(rb'^END:VCALENDAR\r?$', re.M)
+
+def _writev(file: str, chunks: list) -> bool:
+    """Write list of buffers to file with as few syscalls as possible."""
+    try:
+        fd = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    except OSError as err:
+        print(err)
+        return False
+    try:
+        chunks = [ memoryview(c) for c in chunks if len(c) ]
+        while chunks:
+            written = os.writev(fd, chunks)
+            while chunks and (written >= len(chunks[0])):
+                written -= len(chunks[0])
+                del chunks[0]
+            if chunks:
+                chunks[0] = chunks[0][written:]
+    except OSError as err:
+        print(err)
+        return False
+    finally:
+        os.close(fd)
+    return True
+
+def mmapsplit(file: str, verbose: int =0) -> int:
+    """Split ics file into single VEVENT/VTODO files using byte offsets only.
+
+    The source is memory mapped and scanned once. Every output file is
+    written as the shared VCALENDAR header, the original bytes of one
+    component and the VCALENDAR footer, so nothing gets parsed or copied.
+    Returns number of files written, 0 for a single entry and -1 if the
+    file is not ics data.
+    """
+    with open(file, 'rb') as file_handle:
+        try:
+            mm = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return -1
+    with mm:
+        if mm.find(b'BEGIN:VCALENDAR', 0, 1024) < 0:
+            return -1
+        spans = list()
+        start = None
+        for m in splitregex.finditer(mm):
+            if m.group(1) == b'BEGIN':
+                if start == None:
+                    start = m.start()
+            elif start != None:
+                end = m.end()
+                if mm[end:end+1] == b'\n':
+                    end += 1
+                spans.append((start, end))
+                start = None
+        if len(spans) < 2:
+            # Nothing to split, just one entry!
+            return 0
+        m = endregex.search(mm, spans[-1][1])
+        footpos = m.start() if m != None else len(mm)
+        header = list()
+        pos = 0
+        for (start, end) in spans:
+            header.append(mm[pos:start])
+            pos = end
+        header.append(mm[pos:footpos])
+        header = b''.join(header)
+        if not header.endswith(b'\n'):
+            header += b'\n'
+        footer = mm[footpos:] if m != None else b'END:VCALENDAR\n'
+        dirname = os.path.dirname(file)
+        count = 0
+        with memoryview(mm) as view:
+            for (start, end) in spans:
+                m = uidregex.search(mm, start, end)
+                if m != None:
+                    uid = str(m.group(1), 'utf-8', 'ignore')
+                else:
+                    uid = str(uuid4())
+                newfile = os.path.join(dirname, uid)
+                if newfile == file:
+                    # the mapping would change under our feet
+                    print("skipping {}: would overwrite source".format(newfile))
+                    continue
+                with view[start:end] as chunk:
+                    if _writev(newfile, [ header, chunk, footer ]):
+                        count += 1
+                        if verbose:
+                            print("{} written".format(newfile))
+                    else:
+                        print("error writing {}".format(newfile))
+    return count
+
 # --------------- end of magic --------------- #
 
 
@@ -317,13 +305,6 @@ class MyICS():
 def usage():
     pass
 
-def getfiles(topdir) -> list:
-    filelist = list()
-    for root, dirs, files in os.walk(topdir, topdown=False):
-        for name in files:
-            filelist.append(os.path.join(root, name))
-    return filelist
-
 def cmpfiles(a=None, b=None, verbose: bool =False) -> bool:
     if (a == None) or (b == None):
         return False
@@ -347,9 +328,16 @@ def main() -> int:
     verbose = 0
     debug = list()
     taskfiles = list()
+    usemmap = False
+    profiling = False
+    slowest = 10
+    pstats = None
+    caching = False
+    cachedir = None
+    cachesize = MAXSIZE
     
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hvd:f:", ["help", "debug=", "file="])
+        opts, args = getopt.getopt(sys.argv[1:], "hvmd:f:", ["help", "mmap", "debug=", "file=", "profile", "slowest=", "pstats=", "metrics=", "cache", "cachedir=", "cachesize="])
     except getopt.GetoptError as err:
         print(err)
         usage()
@@ -364,6 +352,33 @@ def main() -> int:
             debug.append(a)
         elif o in ("-f", "--file"):
             taskfiles.append(a)
+        elif o in ("-m", "--mmap"):
+            usemmap = True
+        elif o == "--profile":
+            profiling = True
+        elif o == "--slowest":
+            try:
+                slowest = int(a)
+            except ValueError:
+                print("invalid number of slowest files: {}".format(a))
+                return 2
+        elif o == "--pstats":
+            profiling = True
+            pstats = a
+        elif o == "--metrics":
+            metrics.enable(a, 'ics-splitter')
+        elif o == "--cache":
+            caching = True
+        elif o == "--cachedir":
+            caching = True
+            cachedir = a
+        elif o == "--cachesize":
+            caching = True
+            try:
+                cachesize = int(a) * 1024 * 1024
+            except ValueError:
+                print("invalid cache size: {}".format(a))
+                return 2
         else:
             assert False, "unhandled option"
             return 7
@@ -373,6 +388,10 @@ def main() -> int:
         taskdir = args[0]
     if len(args) > 1:
         print("extra arguments detected: {}".format(args[1:]))    
+    if profiling:
+        profile.enable(slowest, pstats)
+    if caching:
+        cache.enable(cachedir, cachesize, verbose)
 
     if len(taskfiles) == 0:
         try:
@@ -383,25 +402,49 @@ def main() -> int:
             if verbose > 1:
                 print(err)
             return 1
-        taskfiles = getfiles(taskdir)
+        taskfiles = profile.timed('walk', walk(taskdir, verbose))
 
     for filename in taskfiles:
         splits = dict()
-        if filename.startswith('\.'):
+        if hidden(filename):
             # skip dotfiles
             continue
         if verbose:
             print("reading {}".format(filename))
+        profile.file(filename)
+        metrics.count('files_scanned')
+        if usemmap:
+            with profile.phase('split') as phase:
+                count = mmapsplit(filename, verbose)
+                if profile.enabled:
+                    phase.bytes = os.path.getsize(filename)
+            if count < 0:
+                print("skipping {}: not an ics file".format(filename))
+                metrics.skip('not_ics')
+            elif count == 0:
+                if verbose:
+                    print("skipping {}: single entry".format(filename))
+                metrics.skip('single_entry')
+            else:
+                print("{}: {} entries written".format(filename, count))
+                metrics.count('files_split')
+                metrics.count('files_written', count)
+            continue
         cal = MyICS(file=filename, verbose=verbose, debug=debug)
         if None == cal.get():
             print("skipping {}: not an ics file".format(filename))
+            metrics.skip('not_ics')
             continue
+        metrics.tree(cal.get())
 
-        splits = cal.split()
+        with profile.phase('split'):
+            splits = cal.split()
         if splits == None:
             if verbose:
                 print("skipping {}: single entry".format(filename))
+            metrics.skip('single_entry')
             continue
+        metrics.count('files_split')
         # print(splits)
         # break
 
@@ -413,8 +456,13 @@ def main() -> int:
                 if newfile == filename:
                     print("overwriting {}".format(filename))
                 print("{} written".format(newfile))
+                metrics.count('files_written')
             else:
                 print("error writing {}".format(newfile))
+                metrics.error('write')
+    cache.close()
+    profile.report()
+    metrics.save()
     return 0
 
 
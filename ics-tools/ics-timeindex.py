@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Small application to index ics items by time and to query them for a
+time window without parsing every file.
+"""
+
+import sys
+import getopt
+import calendar
+from datetime import datetime, timezone
+from dateutil.parser import isoparse
+from ics.timeindex import TimeIndex, collections
+from ics.recur import occurrences
+
+verbose = 0
+basedir = None
+
+# --------- main -------------------------------------------------------------
+
+def epoch(value: str) -> int:
+    """Return an ISO 8601 date or date-time as UTC epoch seconds, naive times are UTC."""
+    when = isoparse(value)
+    if when.tzinfo != None:
+        when = when.astimezone(timezone.utc)
+    return calendar.timegm(when.timetuple())
+
+
+def isotime(value: int) -> str:
+    if value == None:
+        return '-'
+    return datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def indexes(taskdir: str):
+    """Yield the up to date TimeIndex of every collection below taskdir, saving changes."""
+    for (directory, names) in sorted(collections(taskdir, verbose).items()):
+        index = TimeIndex(directory, verbose, basedir)
+        parsed = index.update(names)
+        if verbose and parsed:
+            print("{}: {} of {} items parsed".format(directory, parsed, len(names)))
+        index.save()
+        yield index
+
+
+def main(command: str, taskdir: str, start: int =None, end: int =None) -> int:
+    if command == 'index':
+        count = 0
+        for index in indexes(taskdir):
+            count += 1
+        if verbose:
+            print("{} collections indexed".format(count))
+        return 0
+    found = 0
+    for index in indexes(taskdir):
+        for (s, e, uid, path, recur) in sorted(index.query(start, end), key=lambda i: (i[0], str(i[2]), i[3])):
+            if recur != None:
+                # one line per instance within the window
+                spans = [ (t, t + recur[5]) for t in occurrences(uid, recur, start, end) ]
+            else:
+                spans = [ (s, e) ]
+            for (s, e) in spans:
+                print("{} {} {} {}".format(isotime(s), isotime(e), uid, path))
+                found += 1
+    if verbose:
+        print("{} items found".format(found))
+    return 0
+
+
+def usage():
+    print("usage: {} [-v] index [taskdir]".format(sys.argv[0]))
+    print("       {} [-v] query --from=TIME --to=TIME [taskdir]".format(sys.argv[0]))
+    print("  -v, --verbose  more output, repeat for even more")
+    print("  index          (re)build the time index of every collection, only new")
+    print("                 or changed items get parsed")
+    print("  query          list start, end, UID and file of the items overlapping")
+    print("                 [from, to), updating the indexes first; recurring items")
+    print("                 once per instance")
+    print("  --from=TIME    window start, ISO 8601 (e.g. 2021-03-01 or")
+    print("                 2021-03-01T08:00+01:00), times without zone are UTC")
+    print("  --to=TIME      window end, ISO 8601")
+    print("  --indexdir=DIR where to keep the indexes, default")
+    print("                 $XDG_CACHE_HOME/ics-tools/times")
+
+
+if __name__ == '__main__':
+    taskdir = '.'
+    start = None
+    end = None
+
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "hv", ["help", "verbose", "from=", "to=", "indexdir="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+    try:
+        for o, a in opts:
+            if o in ("-v", "--verbose"):
+                verbose += 1
+            elif o in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif o == "--from":
+                start = epoch(a)
+            elif o == "--to":
+                end = epoch(a)
+            elif o == "--indexdir":
+                basedir = a
+    except ValueError as err:
+        print("invalid time: {}".format(err))
+        sys.exit(2)
+    if (len(args) < 1) or (args[0] not in ('index', 'query')):
+        usage()
+        sys.exit(2)
+    command = args[0]
+    if len(args) > 1:
+        taskdir = args[1]
+    if (command == 'query') and ((start == None) or (end == None)):
+        print("query needs --from and --to")
+        usage()
+        sys.exit(2)
+    if verbose:
+        print("You are running `{}`".format(" ".join(sys.argv)))
+    rc = main(command, taskdir, start, end)
+    sys.exit(rc)
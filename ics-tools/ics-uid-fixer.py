@@ -8,21 +8,20 @@ continuation.
 import os
 import sys
 import re
+import mmap
+import getopt
 from uuid import uuid4
+from ics.walk import walk
+from ics.sniff import sniff
+from ics.profiling import profile
+from ics.metrics import metrics
+from ics.hook import changed_paths, ENVIRONMENT
 
 verbose = 0
 mytag = 'FIXER'
 
 # --------- main -------------------------------------------------------------
 
-def getfiles(topdir) -> list:
-    filelist = list()
-    for root, dirs, files in os.walk(topdir, topdown=False):
-        for name in files:
-            filelist.append(os.path.join(root, name))
-    return filelist
-
-
 def readfile(file) -> str:
     """Read from file return contents or empty string."""
     if file:
@@ -42,7 +41,11 @@ def writefile(file, data=None) -> bool:
         if data is None:
             data = ''
         try:
-            with open(file, 'x', encoding='utf8') as file_handle:
+            if isinstance(data, bytes):
+                file_handle = open(file, 'xb')
+            else:
+                file_handle = open(file, 'x', encoding='utf8')
+            with file_handle:
                 file_handle.write(data)
         except OSError as err:
             if verbose > 1:
@@ -59,13 +62,153 @@ def new_uuid() -> str:
     return uuid
 
 
-def main(taskdir) -> int:
-    pattern = r'^\w+[\w-]+\w$'
-    uidregex = re.compile(pattern)
+uidregex = re.compile(r'^\w+[\w-]+\w$')
+extregex = re.compile(r'^\w+[\w\./@-]+\w$')
+
+# all lines fixline() may change, for scanning whole files at once
+scanregex = re.compile(rb'^(?:\\|UID:|X-RADICALE-NAME:|TZID:)[^\r\n]*', re.M)
+
+
+def fixline(line, lineno, filename) -> tuple:
+    """Return the replacement lines for line and whether the file counts as modified.
+
+    Rewritten continuation and X-TZID lines only make it into the file
+    if something else in it got fixed.
+    """
+    # broken text continuation
+    if line.startswith('\\'):
+        if verbose:
+            print("Fixing line {} in {}".format(lineno, filename))
+        return ([ "  "+line ], False)
+    modify = False
+    # Make UID a UUID if non-alphnumeric
+    if line.startswith('UID:'):
+        if line.rfind(':') > 3:
+            modify = True
+        else:
+            (tag,uid) = line.split(':')
+            m = uidregex.match(uid)
+            if m == None:
+                modify = True
+    if modify:
+        # replace and add extra line
+        if verbose:
+            print("Fixing line {} in {}".format(lineno, filename))
+        if verbose > 1:
+            print(line)
+        return ([ "X-"+mytag+"-"+line, 'UID:'+new_uuid() ], True)
+    if line.startswith('X-RADICALE-NAME:'):
+        # vdirsync chokes if 'X-RADICALE-NAME' is non-alphnumeric
+        # RADICALE seems to sometimes have URLs or Timezone information
+        # stored in it - here we just prepend another 'X' tag, so the tag
+        # is no longer treated as an identifier
+        if line.rfind(':') > 15:
+            modify = True
+        else:
+            (tag,uid) = line.split(':')
+            m = extregex.match(uid)
+            if m == None:
+                modify = True
+            elif line.rfind('/') > -1:
+                line = 'X-TZID:'+uid 
+    elif line.startswith('TZID:'):
+        # vdirsync chokes if 'TZID' appears out of 'VTIMEZONE' context
+        # luckily this seems only to happen with my local timezone
+        if line.rfind(':') > 4:
+            modify = True
+        elif line.startswith('TZID:Europe/London'):
+            modify = True
+    if modify:
+        # rename tag
+        if verbose:
+            print("Fixing line {} in {}".format(lineno, filename))
+        if verbose > 1:
+            print(line)
+        return ([ "X-"+mytag+"-"+line ], True)
+    return ([ line ], False)
+
+
+def fixlines(filename) -> str:
+    """Fix file line by line, return new contents or None if unchanged."""
+    with profile.phase('read') as phase:
+        filedata = readfile(filename)
+        phase.bytes = len(filedata)
+    metrics.count('bytes_read', len(filedata.encode('utf-8')))
+    with profile.phase('fix', len(filedata)):
+        return _fixlines(filedata, filename)
+
+
+def _fixlines(filedata, filename) -> str:
+    lineno = 0
+    modified = False
+    newdata = list()
+    for line in filedata.splitlines():
+        lineno += 1
+        (lines, fixed) = fixline(line, lineno, filename)
+        newdata.extend(lines)
+        modified = modified or fixed
+    newdata.append('')
+    if not modified:
+        return None
+    return "\n".join(newdata)
 
-    pattern = r'^\w+[\w\./@-]+\w$'
-    extregex = re.compile(pattern)
 
+def scanfile(filename) -> bytes:
+    """Fix file by scanning the raw bytes, return new contents or None if unchanged.
+
+    Only the lines matched by scanregex are decoded and rewritten, everything
+    else (including line endings) is copied through. Files without fixes
+    are only read.
+    """
+    try:
+        with open(filename, 'rb') as file_handle:
+            if os.fstat(file_handle.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                chunks = list()
+                modified = False
+                pos = 0
+                lineno = 1
+                counted = 0
+                for m in scanregex.finditer(buf):
+                    if verbose:
+                        lineno += buf[counted:m.start()].count(b'\n')
+                        counted = m.start()
+                    line = str(m.group(), 'utf-8', 'replace')
+                    (lines, fixed) = fixline(line, lineno, filename)
+                    if lines == [ line ]:
+                        continue
+                    eol = b'\r\n' if buf[m.end():m.end()+2] == b'\r\n' else b'\n'
+                    chunks.append(buf[pos:m.start()])
+                    chunks.append(eol.join([ l.encode('utf-8') for l in lines ]))
+                    pos = m.end()
+                    modified = modified or fixed
+                if not modified:
+                    return None
+                chunks.append(buf[pos:])
+    except (OSError, ValueError) as err:
+        if verbose > 1:
+            print(err)
+        return None
+    return b''.join(chunks)
+
+
+def main(taskdir, scan: bool =False, hook: bool =False) -> int:
+    files = None
+    if hook:
+        # storage hook: only the items changed in the store (taskdir)
+        files = changed_paths(taskdir, verbose)
+        if files == None:
+            print("no changed items: set ${} or use a git versioned store".format(ENVIRONMENT))
+            return 1
+        files = [ f for f in files if os.path.isfile(f) ]
+    rc = run(taskdir, scan, files)
+    profile.report()
+    metrics.save()
+    return rc
+
+
+def run(taskdir, scan: bool =False, files: list =None) -> int:
     try:
         os.stat(taskdir)
     except FileNotFoundError as err:
@@ -75,102 +218,99 @@ def main(taskdir) -> int:
             print(err)
         return 1
 
-    for filename in getfiles(taskdir):
+    if files == None:
+        files = profile.timed('walk', walk(taskdir, verbose))
+    for filename in files:
         if verbose:
             print(filename)
-        modified = False
-        filedata = readfile(filename)
-        lineno = 0
-        newdata = list()
-        for line in filedata.splitlines():
-            lineno += 1
-            # broken text continuation
-            if line.startswith('\\'):
-                if verbose:
-                    print("Fixing line {} in {}".format(lineno, filename))
-                newdata.append("  "+line)
-                continue
-            modify = False
-            # Make UID a UUID if non-alphnumeric
-            if line.startswith('UID:'):
-                if line.rfind(':') > 3:
-                    modify = True
-                else:
-                    (tag,uid) = line.split(':')
-                    m = uidregex.match(uid)
-                    if m == None:
-                        modify = True
-            if modify:
-                # reset flag
-                modify = False
-                # replace and add extra line
-                if verbose:
-                    print("Fixing line {} in {}".format(lineno, filename))
-                if verbose > 1:
-                    print(line)
-                newdata.append("X-"+mytag+"-"+line)
-                newdata.append('UID:'+new_uuid())
-                modified = True
-                continue
-            if line.startswith('X-RADICALE-NAME:'):
-                # vdirsync chokes if 'X-RADICALE-NAME' is non-alphnumeric
-                # RADICALE seems to sometimes have URLs or Timezone information
-                # stored in it - here we just prepend another 'X' tag, so the tag
-                # is no longer treated as an identifier
-                if line.rfind(':') > 15:
-                    modify = True
-                else:
-                    (tag,uid) = line.split(':')
-                    m = extregex.match(uid)
-                    if m == None:
-                        modify = True
-                    elif line.rfind('/') > -1:
-                        line = 'X-TZID:'+uid 
-            elif line.startswith('TZID:'):
-                # vdirsync chokes if 'TZID' appears out of 'VTIMEZONE' context
-                # luckily this seems only to happen with my local timezone
-                if line.rfind(':') > 4:
-                    modify = True
-                elif line.startswith('TZID:Europe/London'):
-                    modify = True
-            if modify:
-                # reset tag
-                modify = False
-                # rename tag
-                if verbose:
-                    print("Fixing line {} in {}".format(lineno, filename))
-                if verbose > 1:
-                    print(line)
-                newdata.append("X-"+mytag+"-"+line)
-                modified = True
-                continue
-            newdata.append(line)
-        newdata.append('')
-        if modified:
-            if writefile(filename+'.new', "\n".join(newdata)):
+        profile.file(filename)
+        metrics.count('files_scanned')
+        with profile.phase('sniff'):
+            kind = sniff(filename)
+        if kind not in ('ical', 'vcard'):
+            if verbose:
+                print("skipping {}: {} file".format(filename, kind))
+            metrics.skip(kind or 'unknown')
+            continue
+        if scan:
+            with profile.phase('fix') as phase:
+                newdata = scanfile(filename)
+                phase.bytes = os.path.getsize(filename)
+            metrics.count('bytes_read', phase.bytes)
+        else:
+            newdata = fixlines(filename)
+        if newdata != None:
+            with profile.phase('write', len(newdata)):
+                written = writefile(filename+'.new', newdata)
+            if written:
                 if verbose > -1:
                     print("{} modified".format(filename))
                 os.rename(filename+'.new', filename)
+                metrics.count('files_modified')
+                metrics.count('bytes_written', len(newdata if isinstance(newdata, bytes) else newdata.encode('utf-8')))
             else:
+                metrics.error('write')
                 return 2
     return 0
 
 
+def usage():
+    print("usage: {} [-v] [-s] [taskdir]".format(sys.argv[0]))
+    print("  -v, --verbose  more output, repeat for even more")
+    print("  -s, --scan     scan whole files for the lines to fix instead of")
+    print("                 decoding and checking them line by line")
+    print("  --profile      print time and bytes per phase and the slowest files")
+    print("  --slowest=N    number of slowest files to list (10)")
+    print("  --pstats=FILE  also run cProfile and save its data to FILE")
+    print("  --metrics=FILE append a JSON line with run metrics to FILE (- for stdout)")
+    print("  --hook         only fix the items changed in the store taskdir, taken")
+    print("                 from ${} or git".format(ENVIRONMENT))
+
+
 if __name__ == '__main__':
     # taskdir = os.path.abspath(os.getcwd())
     # taskdir = os.getcwd()
     taskdir = '.'
+    scan = False
+    profiling = False
+    slowest = 10
+    pstats = None
+    hook = False
 
-    if sys.argv[1] == '-v':
-        verbose = 1
-        taskdir = sys.argv[2]
-    elif sys.argv[1] == '-vv':
-        verbose = 2
-        taskdir = sys.argv[2]
-    else:
-        taskdir = sys.argv[1]
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hvs", ["help", "verbose", "scan", "profile", "slowest=", "pstats=", "metrics=", "hook"])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o in ("-v", "--verbose"):
+            verbose += 1
+        elif o in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif o in ("-s", "--scan"):
+            scan = True
+        elif o == "--profile":
+            profiling = True
+        elif o == "--slowest":
+            try:
+                slowest = int(a)
+            except ValueError:
+                print("invalid number of slowest files: {}".format(a))
+                sys.exit(2)
+        elif o == "--pstats":
+            profiling = True
+            pstats = a
+        elif o == "--metrics":
+            metrics.enable(a, 'ics-uid-fixer')
+        elif o == "--hook":
+            hook = True
+    if len(args) > 0:
+        taskdir = args[0]
     if verbose:
         print("You are running `{}`".format(" ".join(sys.argv)))
-    rc = main(taskdir)
+    if profiling:
+        profile.enable(slowest, pstats)
+    rc = main(taskdir, scan, hook)
     sys.exit(rc)
-
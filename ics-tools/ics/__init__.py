@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 """Import submodules into one namespace."""
+from .component import Component
 from .ics_parse import parse_ics
-from .ics_write import write_ics
+from .ics_write import write_ics, write_ics_stream
+from .ics_stream import iter_ics, parse_ics_file
 
 if True is False:
     string = ''
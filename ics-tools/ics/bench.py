@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+
+"""
+Small benchmark for the ics parsing code
+
+Run as `python3 -m ics.bench [options] [events]` from the ics-tools directory.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import getopt
+import platform
+import importlib.util
+import tracemalloc
+
+from .ics_parse import parse_ics
+from .ics_write import write_ics, fold
+from .tokenizer import ctxnames_1, ctxnames_2, multivalue
+from .walk import walk
+
+# --------------- magic here --------------- #
+
+
+def legacy_parse_ics(icsdata: str, source='', verbose=False) -> dict:
+    """Line parser as used before the shared tokenizer, kept as baseline."""
+    lineno = 0
+    data = dict()
+    ctxstack = list()
+    key = None
+    ctx_1 = None
+    ctx_2 = None
+    caldata = None
+    for line in icsdata.splitlines():
+        lineno += 1
+        if (lineno == 1) and (not line.startswith('BEGIN:VCALENDAR')):
+            if verbose:
+                print("Not ics data")
+            return None
+        if line.startswith('BEGIN:'):
+            (tag,ctx) = line.split(':')
+            ctxstack.append(ctx)
+            if ctx == 'VCALENDAR':
+                caldata = dict()
+                ctx_1 = None
+                ctx_2 = None
+            elif ctx in ctxnames_1:
+                ctx_1 = dict()
+                ctx_2 = None
+            elif ctx in ctxnames_2:
+                ctx_2 = dict()
+            else:
+                print("unknown context; source {} line {}".format(source,lineno))
+                print(line)
+                continue
+        elif line.startswith('END:'):
+            (tag,ctx) = line.split(':')
+            if ctx != ctxstack[-1]:
+                print("out of context; source {} line {}".format(source,lineno))
+                print(line)
+            if verbose:
+                print("Context: "+' -> '.join(ctxstack))
+            del ctxstack[-1]
+            if ctx == 'VCALENDAR':
+                data[ctx] = caldata
+            elif (ctx == 'VEVENT') or (ctx == 'VTODO') or (ctx == 'VTIMEZONE') or (ctx == 'ALARM'):
+               
+                if ctx_1 == None:
+                    print("context missing; source {} line {}".format(source,lineno))
+                    print(line)
+                    continue
+                if ctx in caldata:
+                    caldata[ctx].append(ctx_1)
+                else:
+                    caldata[ctx] = [ ctx_1, ]
+                ctx_1 = None
+            elif (ctx == 'VALARM') or (ctx == 'STANDARD') or (ctx == 'DAYLIGHT'):
+                if (ctx_2 == None) or (ctx_1 == None):
+                    print("context missing; source {} line {}".format(source,lineno))
+                    print(line)
+                    continue
+                if ctx in ctx_1:
+                    ctx_1[ctx].append(ctx_2)
+                else:
+                    ctx_1[ctx] = [ ctx_2, ]
+                ctx_2 = None
+            else:
+                print("unknown context; source {} line {}".format(source,lineno))
+                print(line)
+                continue
+        elif (line.startswith(' ')) or (line.startswith('\\')):
+            if line.startswith('\\'):
+                line = ' '+line     ## fix brokenness
+            if not key:
+                print("broken continuation; source {} line {}".format(source,lineno))
+                print(line)
+                print("Context: "+' -> '.join(ctxstack))
+                continue
+            if ctx_2 != None:
+                if key in ctx_2:
+                    ctx_2[key] += '\n'+line
+                else:
+                    ctx_2[key] = line
+            elif ctx_1 != None:
+                if key in ctx_1:
+                    ctx_1[key] += '\n'+line
+                else:
+                    #print("broken continuation; source {} line {}".format(source,lineno))
+                    #print(line)
+                    #print("Context: "+' -> '.join(ctxstack))
+                    #print("key: {}\nctx: {}".format(key,ctx_1))
+                    ctx_1[key] = line
+            else:
+                if key in caldata:
+                    caldata[key] += '\n'+line
+                else:
+                    caldata[key] = line
+        else:
+            if line.count(':') == 0:
+                print("broken continuation?; source {} line {}".format(source,lineno))
+                print(line)
+                print("Context: "+' -> '.join(ctxstack))
+                continue
+            token = line.split(':')
+            key = token[0]
+            val = ':'.join(token[1:])
+            if key in multivalue:
+                if ctx_2 != None:
+                    if key in ctx_2:
+                        ctx_2[key].append(val)
+                    else:
+                        ctx_2[key] = [ val, ]
+                elif ctx_1 != None:
+                    if key in ctx_1:
+                        ctx_1[key].append(val)
+                    else:
+                        ctx_1[key] = [ val, ]
+                else:
+                    if key in caldata:
+                        caldata[key].append(val)
+                    else:
+                        caldata[key] = [ val, ]
+            else:
+                if ctx_2 != None:
+                    ctx_2[key] = val
+                elif ctx_1 != None:
+                    ctx_1[key] = val
+                else:
+                    caldata[key] = val
+    data['VCALENDAR'] = caldata
+    return data
+
+
+def make_calendar(events: int =10000) -> str:
+    """Create a calendar with some typical properties per event."""
+    ics = [ 'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ics-tools//bench//EN' ]
+    for i in range(events):
+        ics.extend([
+            'BEGIN:VEVENT',
+            'UID:bench-{}'.format(i),
+            'DTSTAMP:20200101T000000Z',
+            'DTSTART;TZID=Europe/Berlin:20200102T100000',
+            'DTEND;TZID=Europe/Berlin:20200102T110000',
+            'SUMMARY:Meeting number {}'.format(i),
+            'DESCRIPTION:' + 'x' * 62,
+            ' ' + 'y' * 74,
+            ' ' + 'z' * 40,
+            'ATTENDEE;CN=Someone:mailto:someone@example.com',
+            'ATTENDEE;CN=Other:mailto:other@example.com',
+            'BEGIN:VALARM',
+            'ACTION:DISPLAY',
+            'TRIGGER:-PT15M',
+            'END:VALARM',
+            'END:VEVENT',
+        ])
+    ics.append('END:VCALENDAR')
+    return '\n'.join(ics)
+
+
+def timeit(func, data, rounds: int =5) -> float:
+    """Return best wall time of some rounds."""
+    best = None
+    for i in range(rounds):
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        if (best == None) or (elapsed < best):
+            best = elapsed
+    return best
+
+
+def bench_tokenizer(events: int =10000) -> dict:
+    """Compare lines/sec of the legacy parser and the shared tokenizer."""
+    data = make_calendar(events)
+    lines = data.count('\n') + 1
+    result = dict()
+    for (name, func) in [ ('legacy', legacy_parse_ics), ('tokenizer', parse_ics) ]:
+        elapsed = timeit(func, data)
+        result[name] = lines / elapsed
+    return result
+
+zones = [
+    ('Europe/Berlin', '+0100', '+0200'),
+    ('Europe/London', '+0000', '+0100'),
+    ('America/New_York', '-0500', '-0400'),
+    ('Australia/Sydney', '+1000', '+1100'),
+    ('America/Sao_Paulo', '-0300', '-0200'),
+]
+words = ( 'meeting', 'agenda', 'budget', 'review', 'call', 'lunch', 'project',
+          'dial-in', 'room', 'notes', 'follow-up', 'Zürich', 'café', 'deadline' )
+
+
+def _folded(line: str) -> str:
+    return str(fold(line.encode('utf-8')), 'utf-8')
+
+
+def make_vtimezone(i: int) -> list:
+    """VTIMEZONE lines for zone number i."""
+    (tzid, std, dst) = zones[i % len(zones)]
+    if i >= len(zones):
+        tzid = '{}-{}'.format(tzid, i)
+    return [
+        'BEGIN:VTIMEZONE',
+        'TZID:' + tzid,
+        'X-LIC-LOCATION:' + tzid,
+        'BEGIN:DAYLIGHT',
+        'TZOFFSETFROM:' + std,
+        'TZOFFSETTO:' + dst,
+        'TZNAME:DST',
+        'DTSTART:19700329T020000',
+        'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+        'END:DAYLIGHT',
+        'BEGIN:STANDARD',
+        'TZOFFSETFROM:' + dst,
+        'TZOFFSETTO:' + std,
+        'TZNAME:STD',
+        'DTSTART:19701025T030000',
+        'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+        'END:STANDARD',
+        'END:VTIMEZONE',
+    ]
+
+
+def make_vevent(i: int, rng: random.Random, alarms: int =1, attendees: int =2,
+                description: int =300, attach: int =0, timezones: int =1) -> list:
+    """Lines of one realistic VEVENT, long lines folded."""
+    tzid = zones[i % max(1, min(timezones, len(zones)))][0]
+    day = 1 + (i % 28)
+    hour = 8 + (i % 10)
+    text = list()
+    size = 0
+    while size < description:
+        word = rng.choice(words)
+        text.append(word)
+        size += len(word) + 1
+        if rng.random() < 0.05:
+            text.append('\\n')
+    ics = [
+        'BEGIN:VEVENT',
+        'UID:{:08x}-{:04x}-4{:03x}-a{:03x}-{:012x}'.format(rng.getrandbits(32), rng.getrandbits(16),
+            rng.getrandbits(12), rng.getrandbits(12), rng.getrandbits(48)),
+        'DTSTAMP:20200101T000000Z',
+        'CREATED:20200101T000000Z',
+        'LAST-MODIFIED:20200101T000000Z',
+        'DTSTART;TZID={}:202003{:02d}T{:02d}0000'.format(tzid, day, hour),
+        'DTEND;TZID={}:202003{:02d}T{:02d}3000'.format(tzid, day, hour),
+        'SUMMARY:{} {}'.format(rng.choice(words).capitalize(), i),
+        'LOCATION:{} {}'.format(rng.choice(words), rng.randint(1, 500)),
+        _folded('DESCRIPTION:' + ' '.join(text)),
+        'SEQUENCE:0',
+        'STATUS:CONFIRMED',
+    ]
+    if i % 7 == 0:
+        ics.append('RRULE:FREQ=WEEKLY;COUNT=10')
+    if attendees:
+        ics.append(_folded('ORGANIZER;CN=Organizer:mailto:organizer@example.com'))
+    for a in range(attendees):
+        ics.append(_folded('ATTENDEE;CUTYPE=INDIVIDUAL;ROLE=REQ-PARTICIPANT;PARTSTAT=NEEDS-ACTION;'
+                           'CN=Attendee {0}:mailto:attendee{0}@example.com'.format(a)))
+    if attach:
+        blob = base64.b64encode(rng.getrandbits(8 * attach).to_bytes(attach, 'little'))
+        ics.append(_folded('ATTACH;ENCODING=BASE64;VALUE=BINARY;FMTTYPE=application/octet-stream:'
+                           + str(blob, 'ascii')))
+    for a in range(alarms):
+        ics.extend([
+            'BEGIN:VALARM',
+            'ACTION:DISPLAY',
+            'DESCRIPTION:Reminder',
+            'TRIGGER:-PT{}M'.format(15 * (a + 1)),
+            'END:VALARM',
+        ])
+    ics.append('END:VEVENT')
+    return ics
+
+
+def generate(events: int =1000, alarms: int =1, timezones: int =1, attendees: int =2,
+             description: int =300, attach: int =0, seed: int =0) -> str:
+    """Create a realistic calendar with CRLF line endings, reproducible by seed.
+
+    alarms and attendees are per event, description is the approximate
+    length of the (folded) DESCRIPTION, attach the size in bytes of a
+    base64 encoded ATTACH per event (0 for none).
+    """
+    rng = random.Random(seed)
+    ics = [ 'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ics-tools//bench//EN', 'CALSCALE:GREGORIAN' ]
+    for i in range(timezones):
+        ics.extend(make_vtimezone(i))
+    for i in range(events):
+        ics.extend(make_vevent(i, rng, alarms, attendees, description, attach, timezones))
+    ics.append('END:VCALENDAR')
+    ics.append('')
+    return '\r\n'.join(ics)
+
+
+def make_tree(topdir: str, users: int =2, collections: int =2, items: int =100, seed: int =0, **kwargs) -> int:
+    """Create a Radicale multifilesystem style tree below topdir, returns total bytes.
+
+    One event per item file, plus the .Radicale.props and
+    .Radicale.cache files Radicale keeps next to them. Further keyword
+    arguments are passed on to generate().
+    """
+    rng = random.Random(seed)
+    total = 0
+    for u in range(users):
+        for c in range(collections):
+            collection = os.path.join(topdir, 'collection-root', 'user{}'.format(u), 'calendar{}'.format(c))
+            cache = os.path.join(collection, '.Radicale.cache', 'item')
+            os.makedirs(cache, exist_ok=True)
+            with open(os.path.join(collection, '.Radicale.props'), 'w', encoding='utf8') as file_handle:
+                json.dump({ 'tag': 'VCALENDAR', 'D:displayname': 'calendar {}'.format(c) }, file_handle)
+            for i in range(items):
+                data = generate(1, seed=rng.getrandbits(32), **kwargs).encode('utf-8')
+                name = '{:016x}.ics'.format(rng.getrandbits(64))
+                with open(os.path.join(collection, name), 'wb') as file_handle:
+                    file_handle.write(data)
+                with open(os.path.join(cache, name), 'wb') as file_handle:
+                    file_handle.write(data[:200])
+                total += len(data)
+    return total
+
+
+def load_script(name: str):
+    """Import one of the hyphenated ics-tools scripts, e.g. 'ics-fixer1'."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name + '.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, setup=None, size: int =0, items: int =0, rounds: int =5) -> dict:
+    """Time func(setup()) (setup not timed), plus one traced run for peak memory.
+
+    Returns seconds (best round), MB/s for size bytes, items/s and the
+    peak of memory allocated by func in KiB.
+    """
+    best = None
+    for i in range(rounds):
+        arg = setup() if setup != None else None
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        if (best == None) or (elapsed < best):
+            best = elapsed
+    arg = setup() if setup != None else None
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = max(best, 1e-9)
+    return { 'seconds': best, 'mb_s': size / best / 1e6, 'items_s': items / best,
+             'peak_kib': peak / 1024 }
+
+
+def run(events: int =1000, files: int =1000, rounds: int =5, tmpdir: str =None, **kwargs) -> dict:
+    """Run all benchmarks, returns the results as a dict ready for JSON."""
+    import tempfile
+    fixer = load_script('ics-fixer1')
+    splitter = load_script('ics-splitter')
+    uidfixer = load_script('ics-uid-fixer')
+    data = generate(events, **kwargs)
+    raw = data.encode('utf-8')
+    size = len(raw)
+    parsed = parse_ics(data)
+
+    def fixsetup():
+        fixer.MyICS.global_uidset.clear()
+        return fixer.MyICS(data=raw)
+
+    results = dict()
+    results['parse_ics'] = measure(parse_ics, lambda: data, size, events, rounds)
+    results['write_ics'] = measure(write_ics, lambda: parsed, size, events, rounds)
+    results['MyICS.fix'] = measure(lambda cal: cal.fix(), fixsetup, size, events, rounds)
+    results['MyICS.fix(lazy)'] = measure(lambda cal: cal.fix(),
+        lambda: (fixer.MyICS.global_uidset.clear(), fixer.MyICS(data=raw, lazy=True))[1], size, events, rounds)
+    results['MyICS.split'] = measure(lambda cal: cal.split(), lambda: splitter.MyICS(data=data), size, events, rounds)
+
+    with tempfile.TemporaryDirectory(dir=tmpdir) as topdir:
+        users = 2
+        collections = 2
+        items = max(1, files // (users * collections))
+        treesize = make_tree(topdir, users, collections, items, **kwargs)
+        count = users * collections * items
+        results['walk'] = measure(lambda x: sum(1 for f in walk(topdir)), None, treesize, count, rounds)
+        results['uid-fixer lines'] = measure(lambda x: [ uidfixer.fixlines(f) for f in walk(topdir) ],
+                                             None, treesize, count, rounds)
+        results['uid-fixer scan'] = measure(lambda x: [ uidfixer.scanfile(f) for f in walk(topdir) ],
+                                            None, treesize, count, rounds)
+    return { 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+             'machine': platform.machine(), 'events': events, 'bytes': size, 'files': count,
+             'tree_bytes': treesize, 'rounds': rounds, 'options': kwargs, 'results': results }
+
+
+def report(result: dict):
+    print("{} events ({} bytes), {} files ({} bytes)".format(result['events'], result['bytes'],
+                                                            result['files'], result['tree_bytes']))
+    print("{:18s} {:>10s} {:>10s} {:>12s} {:>10s}".format('benchmark', 'seconds', 'MB/s', 'items/s', 'peak KiB'))
+    for (name, r) in result['results'].items():
+        print("{:18s} {:10.4f} {:10.2f} {:12.0f} {:10.0f}".format(name, r['seconds'], r['mb_s'],
+                                                                 r['items_s'], r['peak_kib']))
+
+
+def usage():
+    print("usage: python3 -m ics.bench [options] [events]")
+    print("  -f, --files=N        items in the generated Radicale tree (1000)")
+    print("  -r, --rounds=N       rounds per benchmark, best one counts (5)")
+    print("  -o, --output=FILE    save results as JSON")
+    print("  -t, --tokenizer      only compare the tokenizer with the legacy parser")
+    print("      --alarms=N --timezones=N --attendees=N --description=N --attach=N")
+    print("                       shape of the generated events")
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    events = 1000
+    files = 1000
+    rounds = 5
+    output = None
+    tokenizer = False
+    shape = dict()
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hf:r:o:t", ["help", "files=", "rounds=", "output=", "tokenizer",
+                                   "alarms=", "timezones=", "attendees=", "description=", "attach="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+    try:
+        for o, a in opts:
+            if o in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif o in ("-f", "--files"):
+                files = int(a)
+            elif o in ("-r", "--rounds"):
+                rounds = int(a)
+            elif o in ("-o", "--output"):
+                output = a
+            elif o in ("-t", "--tokenizer"):
+                tokenizer = True
+            else:
+                shape[o[2:]] = int(a)
+        if len(args) > 0:
+            (o, a) = ('events', args[0])
+            events = int(a)
+    except ValueError:
+        print("invalid number for {}: {}".format(o, a))
+        usage()
+        sys.exit(2)
+    if tokenizer:
+        result = bench_tokenizer(events)
+        for name in result:
+            print("{:10s} {:12.0f} lines/sec".format(name, result[name]))
+        print("speedup    {:12.2f}x".format(result['tokenizer'] / result['legacy']))
+        sys.exit(0)
+    result = run(events, files, rounds, **shape)
+    report(result)
+    if output != None:
+        with open(output, 'w', encoding='utf8') as file_handle:
+            json.dump(result, file_handle, indent=2)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+Small library with a compact container for ics components
+"""
+
+import sys
+
+# --------------- magic here --------------- #
+
+
+class Component():
+    """Dict like container for the properties and subcomponents of one component.
+
+    Property names are interned and kept in a list parallel to the values,
+    which takes a fraction of the memory of a dict per component. Lookups
+    are linear, but components rarely have more than a few dozen entries.
+    """
+
+    __slots__ = ('name', '_keys', '_values')
+
+    def __init__(self, name: str =None, items=None):
+        if name != None:
+            name = sys.intern(name)
+        self.name = name
+        self._keys = list()
+        self._values = list()
+        if items != None:
+            self.update(items)
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            self._values[self._keys.index(key)] = value
+        except ValueError:
+            self._keys.append(sys.intern(key))
+            self._values.append(value)
+
+    def __delitem__(self, key):
+        try:
+            i = self._keys.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        del self._keys[i]
+        del self._values[i]
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Component, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "Component({!r}, {!r})".format(self.name, dict(self.items()))
+
+    @classmethod
+    def fromdict(cls, name: str, items: dict):
+        """Create component from a dict without going through __setitem__."""
+        new = cls(name)
+        new._keys = list(map(sys.intern, items))
+        new._values = list(items.values())
+        return new
+
+    def keys(self) -> list:
+        return list(self._keys)
+
+    def values(self) -> list:
+        return list(self._values)
+
+    def items(self) -> list:
+        return list(zip(self._keys, self._values))
+
+    def get(self, key, default=None):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            return default
+
+    def pop(self, key, *default):
+        try:
+            i = self._keys.index(key)
+        except ValueError:
+            if default:
+                return default[0]
+            raise KeyError(key) from None
+        del self._keys[i]
+        return self._values.pop(i)
+
+    def rename(self, old, new):
+        """Replace key old by new, keeping its value and position."""
+        try:
+            i = self._keys.index(old)
+        except ValueError:
+            raise KeyError(old) from None
+        self._keys[i] = sys.intern(new)
+
+    def setdefault(self, key, default=None):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            self[key] = default
+            return default
+
+    def update(self, items):
+        if hasattr(items, 'items'):
+            items = items.items()
+        for (key, value) in items:
+            self[key] = value
+
+    def copy(self):
+        new = Component(self.name)
+        new._keys = list(self._keys)
+        new._values = list(self._values)
+        return new
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains an ics component class. No need to call it directly.")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Small library to find duplicate ics items by a canonical content hash
+"""
+
+import hashlib
+
+from .component import Component
+from .tz import resolve
+
+# --------------- magic here --------------- #
+
+# properties differing between copies of the same event, e.g. after a
+# client imported a calendar twice
+VOLATILE = frozenset([ 'UID', 'DTSTAMP', 'X-RADICALE-NAME', 'LAST-MODIFIED', 'CREATED', 'X-WR-ALARMUID' ])
+DIGESTSIZE = 16
+
+
+def canonical_key(key: str) -> str:
+    """Return a property key with sorted parameters and canonical TZID."""
+    parts = key.split(';')
+    params = list()
+    for param in parts[1:]:
+        (name, sep, value) = param.partition('=')
+        name = name.upper()
+        value = value.strip('"')
+        if name == 'TZID':
+            value = resolve(value) or value
+        params.append(name + '=' + value)
+    return ';'.join([ parts[0].upper() ] + sorted(params))
+
+
+def unfold(value: str) -> str:
+    """Drop the fold continuations (newline and space or tab) the parsers keep in values."""
+    return value.replace('\r\n', '\n').replace('\n ', '').replace('\n\t', '')
+
+
+def canonical(name: str, comp, volatile: frozenset =VOLATILE) -> bytes:
+    """Return comp as bytes independent of property order and volatile properties.
+
+    Properties (and values of multi value ones like ATTENDEE) are sorted,
+    subcomponents like VALARM canonicalised the same way and sorted.
+    """
+    lines = list()
+    subs = list()
+    for (key, value) in comp.items():
+        if key.split(';', 1)[0].upper() in volatile:
+            continue
+        if (type(value) is list) and value and isinstance(value[0], (dict, Component)):
+            subs.extend(canonical(key, sub, volatile) for sub in value)
+            continue
+        key = canonical_key(key)
+        if type(value) is not list:
+            value = [ value ]
+        # folding is not content, the same line may be folded elsewhere
+        lines.extend("{}:{}".format(key, unfold(v).rstrip()).encode('utf-8') for v in value)
+    lines.sort()
+    subs.sort()
+    return b'\n'.join([ b'BEGIN:' + name.encode('utf-8') ] + lines + subs + [ b'END:' + name.encode('utf-8') ])
+
+
+def items(vcalendar) -> dict:
+    """Group the VEVENTs and VTODOs of a VCALENDAR by UID, {uid: [(name, component)]}.
+
+    A recurring event and its overrides (RECURRENCE-ID) share their UID
+    and are one item. Components without UID are items of their own.
+    """
+    result = dict()
+    for vgroup in [ 'VEVENT', 'VTODO' ]:
+        for (i, comp) in enumerate(vcalendar.get(vgroup, list())):
+            uid = comp.get('UID')
+            if uid == None:
+                uid = (vgroup, i)
+            result.setdefault(uid, list()).append((vgroup, comp))
+    return result
+
+
+def digest(components: list, volatile: frozenset =VOLATILE) -> bytes:
+    """Return the blake2b digest of an item, a list of (name, component)."""
+    h = hashlib.blake2b(digest_size=DIGESTSIZE)
+    for blob in sorted(canonical(name, comp, volatile) for (name, comp) in components):
+        h.update(blob)
+        h.update(b'\0')
+    return h.digest()
+
+
+class DigestIndex():
+    """Map of item digests to the file of the first item seen with it.
+
+    One dict entry (16 byte digest, file number) per distinct item, so
+    millions of items fit in memory; paths are kept once per file.
+    """
+
+    def __init__(self):
+        self.digests = dict()
+        self.paths = list()
+        self.items = 0
+        self.duplicates = 0
+
+    def add(self, path: str, key: bytes) -> str:
+        """Record an item of path, return the path of an earlier copy or None."""
+        self.items += 1
+        found = self.digests.get(key)
+        if found != None:
+            self.duplicates += 1
+            return self.paths[found]
+        if (not self.paths) or (self.paths[-1] != path):
+            self.paths.append(path)
+        self.digests[key] = len(self.paths) - 1
+        return None
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a duplicate detection library. No need to call it directly.")
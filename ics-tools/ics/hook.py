@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Small library to find the items changed in a Radicale store, for storage hooks
+"""
+
+import os
+import subprocess
+
+# --------------- magic here --------------- #
+
+# newline separated paths (relative to the store or absolute), set by the caller of the hook
+ENVIRONMENT = 'ICS_TOOLS_CHANGED'
+
+
+def _git(storedir: str, args: list, verbose: int =0) -> list:
+    try:
+        result = subprocess.run([ 'git', '-C', storedir ] + args, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True)
+    except (OSError, subprocess.CalledProcessError) as err:
+        if verbose:
+            print("git {} failed: {}".format(' '.join(args), err))
+        return None
+    return [ p for p in str(result.stdout, 'utf-8', 'surrogateescape').split('\0') if p ]
+
+
+def item(path: str) -> bool:
+    """Check if path could be a collection item, i.e. no dotfile and not below a dot directory."""
+    return not any(part.startswith('.') for part in os.path.normpath(path).split(os.sep) if part not in ('.', '..'))
+
+
+def changed_paths(storedir: str ='.', verbose: int =0) -> list:
+    """Return the paths of changed items below storedir, deleted ones included.
+
+    Taken from $ICS_TOOLS_CHANGED if set, otherwise from git in the store:
+    files differing from HEAD (git diff --name-only) plus untracked files,
+    i.e. everything the usual git hook would commit next. Radicale
+    metadata (dotfiles, .Radicale.cache) is left out. Returns None if
+    neither source is available.
+    """
+    value = os.environ.get(ENVIRONMENT)
+    if value:
+        paths = [ p for p in value.splitlines() if p ]
+    else:
+        paths = _git(storedir, [ 'diff', '--name-only', '--relative', '-z', 'HEAD' ], verbose)
+        if paths == None:
+            # no commit yet
+            paths = list()
+            if _git(storedir, [ 'rev-parse', '--git-dir' ], verbose) == None:
+                return None
+        untracked = _git(storedir, [ 'ls-files', '--others', '--exclude-standard', '-z' ], verbose)
+        if untracked == None:
+            return None
+        paths.extend(untracked)
+    seen = dict()
+    for path in paths:
+        if not item(os.path.relpath(path, storedir) if os.path.isabs(path) else path):
+            continue
+        seen[os.path.join(storedir, path)] = 1
+    return sorted(seen)
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a storage hook library. No need to call it directly.")
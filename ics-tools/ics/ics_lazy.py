@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""
+Small library to parse ics data sources lazily
+"""
+
+import re
+from functools import partial
+
+from .component import Component
+from .tokenizer import tokenize
+
+# --------------- magic here --------------- #
+
+# end of a logical (unfolded) line
+logical = re.compile(rb'\n(?![ \\])')
+unfold = re.compile(rb'\r?\n ')
+
+
+def decode_value(src: bytes, span: tuple) -> str:
+    """Decode a raw property value the same way parse_ics() would."""
+    (start, end) = span
+    lines = src[start:end].splitlines()
+    for i in range(1, len(lines)):
+        if lines[i].startswith(b'\\'):
+            lines[i] = b' '+lines[i]     ## fix brokenness
+    return str(b'\n'.join(lines), 'utf-8', 'ignore')
+
+
+class LazyComponent(Component):
+    """Component keeping byte spans into the source instead of decoded values.
+
+    Values are decoded on first access. As long as nothing was changed the
+    original bytes of the whole component are available through raw().
+    """
+
+    __slots__ = ('_src', '_span', '_dirty')
+
+    def __init__(self, name: str =None, src: bytes =None, start: int =0):
+        Component.__init__(self, name)
+        self._src = src
+        self._span = (start, start)
+        self._dirty = False
+
+    def _decoded(self, value):
+        if type(value) is tuple:
+            return decode_value(self._src, value)
+        if (type(value) is list) and value and (type(value[0]) is tuple):
+            return [ decode_value(self._src, v) for v in value ]
+        return value
+
+    def _decode(self, i: int):
+        value = self._values[i]
+        if type(value) is tuple:
+            value = self._values[i] = self._decoded(value)
+        elif (type(value) is list) and value and (type(value[0]) is tuple):
+            value[:] = self._decoded(value)
+        return value
+
+    def __getitem__(self, key):
+        try:
+            return self._decode(self._keys.index(key))
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        Component.__setitem__(self, key, value)
+        self._dirty = True
+
+    def __delitem__(self, key):
+        Component.__delitem__(self, key)
+        self._dirty = True
+
+    def rename(self, old, new):
+        Component.rename(self, old, new)
+        self._dirty = True
+
+    def __getstate__(self):
+        # byte spans are meaningless without the source buffer, raw() needs
+        # it attached again (see parse_cache); the live object stays lazy
+        return (None, { 'name': self.name, '_keys': self._keys, '_values': [ self._decoded(v) for v in self._values ],
+                        '_src': None, '_span': self._span, '_dirty': self._dirty })
+
+    def values(self) -> list:
+        return [ self._decode(i) for i in range(len(self._keys)) ]
+
+    def items(self) -> list:
+        return list(zip(self._keys, self.values()))
+
+    def get(self, key, default=None):
+        try:
+            return self._decode(self._keys.index(key))
+        except ValueError:
+            return default
+
+    def pop(self, key, *default):
+        if key in self._keys:
+            self._decode(self._keys.index(key))
+            self._dirty = True
+        return Component.pop(self, key, *default)
+
+    def copy(self):
+        new = LazyComponent(self.name, self._src, self._span[0])
+        new._keys = list(self._keys)
+        new._values = list(self._values)
+        new._span = self._span
+        new._dirty = self._dirty
+        return new
+
+    def decode(self):
+        """Decode all values, e.g. before the source buffer goes away."""
+        for i in range(len(self._keys)):
+            value = self._decode(i)
+            if type(value) is list:
+                for item in value:
+                    if isinstance(item, LazyComponent):
+                        item.decode()
+
+    def clean(self) -> bool:
+        """Check if neither this component nor a subcomponent was changed."""
+        if self._dirty or (self._src == None):
+            return False
+        for value in self._values:
+            if (type(value) is list) and value and isinstance(value[0], Component):
+                for item in value:
+                    if (not isinstance(item, LazyComponent)) or (not item.clean()):
+                        return False
+        return True
+
+    def raw(self) -> bytes:
+        """Return the original bytes of an unchanged component or None."""
+        if not self.clean():
+            return None
+        return self._src[self._span[0]:self._span[1]]
+
+
+def _records(icsdata: bytes, offsets: dict, repairs: list =None):
+    """Yield (lineno, line) for tokenize(), one per logical line of icsdata.
+
+    Properties come as (name, (start, end)) with the span of the raw value,
+    or with the decoded value if a broken continuation needs rewriting.
+    BEGIN/END and stray continuation lines come decoded, the offsets of
+    BEGIN and the end of END lines are noted in offsets by line number.
+    """
+    lineno = 0
+    size = len(icsdata)
+    pos = 0
+    while pos < size:
+        lineno += 1
+        start = pos
+        if (lineno == 1) or icsdata.startswith(b'BEGIN:', start) or icsdata.startswith(b'END:', start):
+            # BEGIN/END lines are never folded
+            stop = icsdata.find(b'\n', start)
+            folded = False
+        else:
+            m = logical.search(icsdata, start)
+            stop = m.start() if m != None else -1
+            folded = True
+        if stop < 0:
+            stop = size
+            pos = size
+        else:
+            pos = stop + 1
+        first = lineno
+        if folded:
+            lineno += icsdata.count(b'\n', start, stop)
+        if (stop > start) and (icsdata[stop-1:stop] == b'\r'):
+            stop -= 1
+        if not folded:
+            begin = icsdata.rfind(b'BEGIN:', start, stop)
+            if begin > -1:
+                offsets[first] = begin
+            else:
+                offsets[first] = pos
+            yield (first, str(icsdata[start:stop], 'utf-8', 'ignore'))
+            continue
+        lead = icsdata[start:start+1]
+        colon = icsdata.find(b':', start, stop)
+        if (lead == b' ') or (lead == b'\\') or (colon < 0):
+            # continuation after a BEGIN/END line, or no property at all
+            yield (first, decode_value(icsdata, (start, stop)))
+            continue
+        key = icsdata[start:colon]
+        if key.find(b'\n') > -1:
+            # property name or parameters folded, unfold them
+            key = unfold.sub(b'', key)
+        value = (colon+1, stop)
+        broken = icsdata.find(b'\n\\', colon, stop)
+        if broken > -1:
+            # broken continuation, decoded and repaired now, so rewritten later
+            value = decode_value(icsdata, value)
+            if repairs != None:
+                repairs.append((first + icsdata.count(b'\n', start, broken) + 1, 'broken continuation'))
+        yield (first, (str(key, 'utf-8', 'ignore'), value))
+
+
+def parse_ics_lazy(icsdata: bytes, source='', verbose=False, repairs: list =None) -> dict:
+    """Parse bytes into structured ics dataset without decoding values.
+
+    Same layout as parse_ics(), but built from LazyComponents referring to
+    icsdata. Folded lines are skipped with a single regex search per
+    property and only property names get decoded while parsing, the
+    structure is built by the shared tokenize().
+    Lines needing a repair are reported as (lineno, reason) in repairs.
+    """
+    offsets = dict()
+
+    def finish(ctx: str, values: dict, first: int, last: int) -> LazyComponent:
+        comp = LazyComponent.fromdict(ctx, values)
+        comp._src = icsdata
+        comp._span = (offsets.get(first, 0), offsets.get(last, len(icsdata)))
+        # decoded values were repaired or continued, the raw bytes are stale
+        for value in comp._values:
+            if (type(value) is str) or ((type(value) is list) and (str in map(type, value))):
+                comp._dirty = True
+                break
+        return comp
+
+    tokens = tokenize(_records(icsdata, offsets, repairs), source, verbose, repairs=repairs,
+                      finish=finish, resolve=partial(decode_value, icsdata))
+    try:
+        while True:
+            next(tokens)
+    except StopIteration as stop:
+        return stop.value
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a lazy ics parsing library. No need to call it directly.")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""
+Small library to parse ics data sources as a stream of components
+"""
+
+from .component import Component
+from .tokenizer import tokenize
+
+# --------------- magic here --------------- #
+
+
+def iter_ics(fileobj, source='', verbose=False):
+    """Yield (name, component) for every finished top-level component.
+
+    Reads line by line from a text or binary file object, so only the
+    component currently being built is held in memory. The properties of
+    the VCALENDAR itself are yielded last as ('VCALENDAR', Component),
+    without its child components.
+    """
+    lines = (line.rstrip(b'\r\n' if type(line) is bytes else '\r\n') for line in fileobj)
+    yield from tokenize(lines, source, verbose, stream=True)
+
+
+def parse_ics_file(fileobj, source='', verbose=False) -> dict:
+    """Collect the components of iter_ics() into the parse_ics() layout."""
+    caldata = Component('VCALENDAR')
+    found = False
+    for (ctx, item) in iter_ics(fileobj, source, verbose):
+        found = True
+        if ctx == 'VCALENDAR':
+            # keep header properties in front of the components
+            header = item.copy()
+            header.update(caldata)
+            caldata = header
+        elif ctx in caldata:
+            caldata[ctx].append(item)
+        else:
+            caldata[ctx] = [ item, ]
+    if not found:
+        return None
+    return { 'VCALENDAR': caldata }
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a streaming ics parser. No need to call it directly.")
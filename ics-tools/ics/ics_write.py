@@ -1,16 +1,22 @@
 #!/usr/bin/env python3
 
 """
-Small library to parse ics data sources
+Small library to write ics data: write_ics() builds a string, write_ics_stream(),
+write_component() and component_bytes() emit folded CRLF lines (see fold())
 """
 
+import re
+
+from .component import Component
+from .ics_lazy import LazyComponent
+from .tokenizer import ctxnames_1, ctxnames_2, multivalue
+
 # --------------- magic here --------------- #
 
+crlf = re.compile(rb'\r?\n')
+
 
 def write_ics(icsdata: dict, verbose=False) -> str:
-    ctxnames_1 = { 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1 }
-    ctxnames_2 = { 'VALARM': 1, 'STANDARD': 1, 'DAYLIGHT': 1 }
-    multivalue = [ 'ATTACH', 'ATTENDEE' ]
     ics = list()
     if 'VCALENDAR' not in icsdata:
         if verbose:
@@ -28,6 +34,11 @@ def write_ics(icsdata: dict, verbose=False) -> str:
                  ics.append("{}:{}".format(key_1,data[key_1]))
         else:
             for item_1 in data[key_1]:
+                raw = item_1.raw() if isinstance(item_1, LazyComponent) else None
+                if raw != None:
+                    # unchanged, copy original lines
+                    ics.append(str(raw, 'utf-8', 'ignore').replace('\r\n', '\n').rstrip('\n'))
+                    continue
                 ics.append("BEGIN:{}".format(key_1))
                 for key_2 in item_1.keys():
                     if key_2 not in ctxnames_2:
@@ -39,6 +50,10 @@ def write_ics(icsdata: dict, verbose=False) -> str:
                             ics.append("{}:{}".format(key_2,item_1[key_2]))
                     else:
                         for item_2 in item_1[key_2]:
+                            raw = item_2.raw() if isinstance(item_2, LazyComponent) else None
+                            if raw != None:
+                                ics.append(str(raw, 'utf-8', 'ignore').replace('\r\n', '\n').rstrip('\n'))
+                                continue
                             ics.append("BEGIN:{}".format(key_2))
                             for key_3 in item_2.keys():
                                 if key_3 in multivalue:
@@ -51,9 +66,106 @@ def write_ics(icsdata: dict, verbose=False) -> str:
     ics.append("END:VCALENDAR")
     return '\n'.join(ics)
 
+def fold(line: bytes, limit: int =75) -> bytes:
+    """Fold line at limit octets (RFC 5545 3.1) without splitting UTF-8 sequences."""
+    if len(line) <= limit:
+        return line
+    parts = list()
+    start = 0
+    width = limit
+    while len(line) - start > width:
+        cut = start + width
+        while (cut > start + 1) and ((line[cut] & 0xC0) == 0x80):
+            cut -= 1
+        parts.append(line[start:cut])
+        start = cut
+        # continuation lines start with a space
+        width = limit - 1
+    parts.append(line[start:])
+    return b'\r\n '.join(parts)
+
+
+def _stream_lines(name: str, item, out: list):
+    """Append CRLF terminated, folded lines of a component to out."""
+    raw = item.raw() if isinstance(item, LazyComponent) else None
+    if raw != None:
+        # unchanged, copy original bytes, with CRLF like the rewritten lines
+        if raw.count(b'\n') != raw.count(b'\r\n'):
+            raw = crlf.sub(b'\r\n', raw)
+        out.append(raw)
+        return
+    out.append("BEGIN:{}\r\n".format(name).encode('utf-8'))
+    for key in item.keys():
+        value = item[key]
+        if type(value) is not list:
+            value = [ value, ]
+        elif value and isinstance(value[0], (dict, Component)):
+            for sub in value:
+                _stream_lines(key, sub, out)
+            continue
+        out.extend(_property_lines(key, value))
+    out.append("END:{}\r\n".format(name).encode('utf-8'))
+
+
+def write_ics_stream(icsdata: dict, fileobj, verbose=False) -> bool:
+    """Write structured ics dataset to a binary file object.
+
+    Lines are folded at 75 octets and terminated with CRLF. Output is
+    handed to fileobj one top-level component at a time, so no copy of
+    the whole calendar is built in memory.
+    """
+    if ('VCALENDAR' not in icsdata) or (icsdata['VCALENDAR'] == None):
+        if verbose:
+            print("Not ics data")
+        return False
+    data = icsdata['VCALENDAR']
+    fileobj.write(b'BEGIN:VCALENDAR\r\n')
+    for key in data.keys():
+        value = data[key]
+        if (type(value) is list) and value and isinstance(value[0], (dict, Component)):
+            for item in value:
+                write_component(key, item, fileobj)
+            continue
+        fileobj.writelines(_property_lines(key, value))
+    fileobj.write(b'END:VCALENDAR\r\n')
+    return True
+
+
+def _property_lines(key: str, value) -> list:
+    """Return the CRLF terminated, folded lines of one (multi value) property."""
+    out = list()
+    if type(value) is not list:
+        value = [ value, ]
+    for v in value:
+        for line in "{}:{}".format(key, v).split('\n'):
+            out.append(fold(line.encode('utf-8')) + b'\r\n')
+    return out
+
+
+def write_properties(comp: Component, fileobj):
+    """Write the properties of comp (not its subcomponents) to a binary file object."""
+    for (key, value) in comp.items():
+        if (type(value) is list) and value and isinstance(value[0], (dict, Component)):
+            continue
+        fileobj.writelines(_property_lines(key, value))
+
+
+def component_bytes(name: str, item) -> bytes:
+    """Return one component (BEGIN to END) as CRLF terminated, folded lines."""
+    out = list()
+    _stream_lines(name, item, out)
+    return b''.join(out)
+
+
+def write_component(name: str, item, fileobj):
+    """Write one component (BEGIN to END) to a binary file object."""
+    out = list()
+    _stream_lines(name, item, out)
+    fileobj.writelines(out)
+
 # --------------- end of magic --------------- #
 
 
 if __name__ == '__main__':
-    print("This file contains an ics writing function. No need to call it directly.")
+    print("This file contains ics writing functions. No need to call it directly.")
 
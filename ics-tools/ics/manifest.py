@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Small library to remember which files a tool already found clean
+"""
+
+import os
+import json
+import hashlib
+import inspect
+
+# --------------- magic here --------------- #
+
+
+def fingerprint(*objects) -> str:
+    """Hash the source code of functions/classes, e.g. the fix rules."""
+    digest = hashlib.sha1()
+    for obj in objects:
+        try:
+            digest.update(inspect.getsource(obj).encode('utf-8'))
+        except (OSError, TypeError):
+            digest.update(repr(obj).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Manifest():
+    """JSON cache of files known to be clean, keyed on path, size, mtime and hash.
+
+    The whole manifest is dropped when the version string (tool version and
+    rule set fingerprint) differs from the one it was written with.
+    Paths are stored relative to the directory holding the manifest.
+    """
+
+    def __init__(self, file: str, version: str, verbose: int =0):
+        self._verbose = verbose
+        self.file = file
+        self.version = version
+        self._root = os.path.dirname(os.path.abspath(file))
+        self.files = dict()
+        self.changed = False
+        try:
+            with open(file, 'r', encoding='utf8') as file_handle:
+                data = json.load(file_handle)
+            if data.get('version') == version:
+                self.files = data.get('files', dict())
+            else:
+                if verbose:
+                    print("manifest {} outdated, starting over".format(file))
+                self.changed = True
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as err:
+            if verbose:
+                print("ignoring broken manifest {}: {}".format(file, err))
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self._root)
+
+    def clean(self, path: str) -> dict:
+        """Return the entry of path if size and mtime are unchanged, else None."""
+        entry = self.files.get(self._key(path))
+        if entry == None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (entry['size'] != st.st_size) or (entry['mtime'] != st.st_mtime_ns):
+            return None
+        return entry
+
+    def same(self, path: str, digest: str) -> dict:
+        """Return the entry of path if the content hash is unchanged, else None.
+
+        Refreshes size and mtime, so the next run can skip path on stat alone.
+        """
+        entry = self.files.get(self._key(path))
+        if (entry == None) or (entry['hash'] != digest):
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry['size'] = st.st_size
+        entry['mtime'] = st.st_mtime_ns
+        self.changed = True
+        return entry
+
+    def record(self, path: str, digest: str, uids: list =None):
+        """Remember path as clean."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self.files[self._key(path)] = { 'size': st.st_size, 'mtime': st.st_mtime_ns,
+                                        'hash': digest, 'uids': uids or list() }
+        self.changed = True
+
+    def discard(self, path: str):
+        if self.files.pop(self._key(path), None) != None:
+            self.changed = True
+
+    def save(self) -> bool:
+        """Write manifest atomically if anything changed."""
+        if not self.changed:
+            return True
+        tmpfile = self.file + '.tmp'
+        try:
+            with open(tmpfile, 'w', encoding='utf8') as file_handle:
+                json.dump({ 'version': self.version, 'files': self.files }, file_handle)
+            os.replace(tmpfile, self.file)
+        except OSError as err:
+            print("error writing manifest {}: {}".format(self.file, err))
+            return False
+        self.changed = False
+        return True
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a manifest cache library. No need to call it directly.")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Small library to collect run metrics as JSON for monitoring
+"""
+
+import json
+import time
+
+from .component import Component
+
+# --------------- magic here --------------- #
+
+
+class Metrics():
+    """Counters of one run, saved as a single JSON line.
+
+    Plain dict increments only, cheap enough to leave on. Disabled until
+    enable() was called; the tools share the module level instance
+    `metrics`. Appending one line per run to the same file gives a JSON
+    lines history to graph from.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.file = None
+        self.tool = None
+        self.reset()
+
+    def enable(self, file: str, tool: str =None):
+        """Start counting, save() writes to file ('-' for stdout)."""
+        self.enabled = True
+        self.file = file
+        self.tool = tool
+        self.start = time.time()
+
+    def reset(self):
+        self.start = time.time()
+        self.counters = dict()
+        self.components = dict()
+        self.rules = dict()
+        self.errors = dict()
+
+    def count(self, name: str, n: int =1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def skip(self, reason: str):
+        """Count a skipped file, in total and per reason."""
+        if self.enabled:
+            self.count('files_skipped')
+            self.count('skipped_' + (reason or 'unknown'))
+
+    def error(self, category: str, n: int =1):
+        if self.enabled:
+            self.errors[category] = self.errors.get(category, 0) + n
+
+    def tree(self, data: dict):
+        """Count the components of a parsed dataset per type."""
+        if (not self.enabled) or (data == None) or (data.get('VCALENDAR') == None):
+            return
+        self._tree(data['VCALENDAR'])
+
+    def _tree(self, comp: Component):
+        self.components[comp.name] = self.components.get(comp.name, 0) + 1
+        # raw values, lazy components stay undecoded
+        for value in comp._values:
+            if (type(value) is list) and value and isinstance(value[0], Component):
+                for sub in value:
+                    self._tree(sub)
+
+    def ruleset(self, stats: list):
+        """Take the hit counts of RuleEngine.stats()."""
+        if self.enabled:
+            for (name, calls, hits, elapsed) in stats:
+                self.rules[name] = self.rules.get(name, 0) + hits
+
+    def snapshot(self) -> dict:
+        """Counters as plain dict, e.g. to return them from a worker process."""
+        return { 'counters': self.counters, 'components': self.components, 'errors': self.errors }
+
+    def merge(self, snapshot: dict):
+        """Add a snapshot() taken elsewhere."""
+        if (not self.enabled) or (snapshot == None):
+            return
+        for (field, target) in [ ('counters', self.counters), ('components', self.components),
+                                 ('errors', self.errors) ]:
+            for (name, n) in snapshot[field].items():
+                target[name] = target.get(name, 0) + n
+
+    def summary(self) -> dict:
+        elapsed = max(time.time() - self.start, 1e-9)
+        counters = dict(self.counters)
+        for name in [ 'files_scanned', 'files_skipped', 'files_modified', 'bytes_read', 'bytes_written' ]:
+            counters.setdefault(name, 0)
+        return { 'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start)),
+                 'tool': self.tool, 'seconds': round(elapsed, 6), **counters,
+                 'components': self.components, 'rules': self.rules, 'errors': self.errors,
+                 'files_per_sec': round(counters['files_scanned'] / elapsed, 3),
+                 'mb_read_per_sec': round(counters['bytes_read'] / elapsed / 1e6, 3) }
+
+    def save(self) -> bool:
+        """Append the summary as one JSON line."""
+        if not self.enabled:
+            return True
+        line = json.dumps(self.summary(), sort_keys=True)
+        if self.file == '-':
+            print(line)
+            return True
+        try:
+            with open(self.file, 'a', encoding='utf8') as file_handle:
+                file_handle.write(line + '\n')
+        except OSError as err:
+            print("error writing metrics {}: {}".format(self.file, err))
+            return False
+        return True
+
+
+metrics = Metrics()
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a run metrics library. No need to call it directly.")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""
+Small library to cache parsed ics data sets on disk, keyed by content hash
+"""
+
+import os
+import zlib
+import pickle
+import hashlib
+
+from .component import Component
+from .ics_lazy import LazyComponent, parse_ics_lazy, decode_value, _records
+from .tokenizer import tokenize, parse_lines
+from .manifest import fingerprint
+
+# --------------- magic here --------------- #
+
+MAXSIZE = 512 * 1024 * 1024
+
+
+def cachedir() -> str:
+    """Default cache directory, $XDG_CACHE_HOME/ics-tools/parse (~/.cache if unset)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ics-tools', 'parse')
+
+
+def attach(comp: Component, src: bytes):
+    """Give lazy components loaded from the cache their source bytes back, for raw()."""
+    if isinstance(comp, LazyComponent):
+        comp._src = src
+    for value in comp._values:
+        if (type(value) is list) and value and isinstance(value[0], Component):
+            for sub in value:
+                attach(sub, src)
+
+
+class ParseCache():
+    """Pickled and compressed parse results, one file per content hash.
+
+    Entries are keyed by sha256 of the parser version (a fingerprint of
+    the parser code), the parse mode and the file content, so changed
+    files or parsers simply miss. Hits touch their entry; close() evicts
+    the least recently used entries above the size limit. The cache size
+    is scanned at the first close() only, after that the bytes stored
+    (merged from workers, see snapshot()) are added up until the total
+    exceeds the limit. Disabled until enable() was called; the tools
+    share the module level instance `cache`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.maxsize = MAXSIZE
+        self.version = None
+        self.added = 0
+        self._size = None
+        self._verbose = 0
+
+    def enable(self, directory: str =None, maxsize: int =MAXSIZE, verbose: int =0):
+        self.enabled = True
+        self.directory = directory or cachedir()
+        self.maxsize = maxsize
+        self._verbose = verbose
+        self.version = fingerprint(Component, LazyComponent, parse_ics_lazy, _records, decode_value, tokenize, parse_lines)
+
+    def reset(self):
+        self.added = 0
+
+    def snapshot(self) -> int:
+        """Bytes stored since reset(), e.g. to return them from a worker process."""
+        return self.added
+
+    def merge(self, added: int):
+        """Add a snapshot() taken elsewhere."""
+        self.added += added or 0
+
+    def settings(self) -> tuple:
+        """Arguments to enable() an equivalent cache, e.g. in a worker process."""
+        return (self.enabled, self.directory, self.maxsize, self._verbose)
+
+    def _path(self, content: bytes, mode: str) -> str:
+        digest = hashlib.sha256(self.version.encode('ascii') + mode.encode('ascii') + b'\0')
+        digest.update(content)
+        key = digest.hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, content: bytes, mode: str):
+        """Return (data, repairs) parsed from content before, None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(content, mode)
+        try:
+            with open(path, 'rb') as file_handle:
+                (data, repairs) = pickle.loads(zlib.decompress(file_handle.read()))
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError) as err:
+            if self._verbose:
+                print("dropping broken cache entry {}: {}".format(path, err))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if (data != None) and (data.get('VCALENDAR') != None):
+            attach(data['VCALENDAR'], content)
+        return (data, repairs)
+
+    def store(self, content: bytes, mode: str, data: dict, repairs: list =None) -> bool:
+        """Save the parse result of content, before anything modified it.
+
+        Lazy components are decoded for pickling, their source is attached
+        again on load.
+        """
+        if not self.enabled:
+            return False
+        path = self._path(content, mode)
+        tmpfile = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            blob = zlib.compress(pickle.dumps((data, repairs or list()), pickle.HIGHEST_PROTOCOL), 1)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmpfile, 'wb') as file_handle:
+                file_handle.write(blob)
+            os.replace(tmpfile, path)
+        except (OSError, pickle.PicklingError, RecursionError) as err:
+            if self._verbose:
+                print("cannot cache parse result in {}: {}".format(path, err))
+            return False
+        self.added += len(blob)
+        return True
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the cache fits in 90% of maxsize.
+
+        Returns the number of entries removed.
+        """
+        entries = list()
+        total = 0
+        try:
+            with os.scandir(self.directory) as subdirs:
+                for subdir in subdirs:
+                    if not subdir.is_dir(follow_symlinks=False):
+                        continue
+                    with os.scandir(subdir.path) as files:
+                        for entry in files:
+                            st = entry.stat(follow_symlinks=False)
+                            entries.append((st.st_mtime, st.st_size, entry.path))
+                            total += st.st_size
+        except OSError as err:
+            if self._verbose:
+                print(err)
+            return 0
+        self._size = total
+        self.added = 0
+        if total <= self.maxsize:
+            return 0
+        removed = 0
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.maxsize * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._size = total
+        if self._verbose:
+            print("parse cache: {} entries evicted".format(removed))
+        return removed
+
+    def close(self):
+        """Evict at the end of a run or batch, if the cache may have outgrown maxsize."""
+        if not self.enabled:
+            return
+        if (self._size == None) or (self._size + self.added > self.maxsize):
+            self.evict()
+        else:
+            self._size += self.added
+            self.added = 0
+
+
+cache = ParseCache()
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a parse cache library. No need to call it directly.")
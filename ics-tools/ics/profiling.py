@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Small library to record where the tools spend their time
+"""
+
+import time
+
+# --------------- magic here --------------- #
+
+# phases in report order
+PHASES = ( 'walk', 'sniff', 'read', 'cache', 'decode', 'parse', 'fix', 'split', 'write', 'compare' )
+
+
+class _Phase():
+    """Context manager timing one phase, bytes may be set while it runs."""
+
+    __slots__ = ('profile', 'name', 'bytes', 'start')
+
+    def __init__(self, profile, name: str, nbytes: int =0):
+        self.profile = profile
+        self.name = name
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.start, self.bytes)
+        return False
+
+
+class _NoPhase():
+    """Stand-in for _Phase while profiling is off."""
+
+    __slots__ = ('bytes', )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Profile():
+    """Wall time and bytes per phase, per file and in aggregate.
+
+    Disabled unless enable() was called, then phase() is a no-op. The tools
+    share the module level instance `profile`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slowest = 10
+        self.pstats = None
+        self._cprofile = None
+        self._nophase = _NoPhase()
+        self.reset()
+
+    def enable(self, slowest: int =10, pstats: str =None):
+        """Start recording, with pstats also run cProfile and dump to that file."""
+        self.enabled = True
+        self.slowest = slowest
+        self.pstats = pstats
+        if pstats != None:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def reset(self):
+        self.phases = dict()
+        self.files = dict()
+        self.current = None
+
+    def file(self, name: str):
+        """Account the following phases to file name."""
+        if self.enabled:
+            self.current = name
+
+    def phase(self, name: str, nbytes: int =0):
+        """Return a context manager timing phase name."""
+        if not self.enabled:
+            return self._nophase
+        return _Phase(self, name, nbytes)
+
+    def add(self, name: str, seconds: float, nbytes: int =0, file: str =None):
+        if not self.enabled:
+            return
+        total = self.phases.setdefault(name, [ 0.0, 0, 0 ])
+        total[0] += seconds
+        total[1] += nbytes or 0
+        total[2] += 1
+        if file == None:
+            file = self.current
+        if file:
+            entry = self.files.setdefault(file, dict()).setdefault(name, [ 0.0, 0 ])
+            entry[0] += seconds
+            entry[1] += nbytes or 0
+
+    def timed(self, name: str, iterable):
+        """Iterate, timing each step as phase name (not accounted to a file)."""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, file='')
+                return
+            self.add(name, time.perf_counter() - start, file='')
+            yield item
+
+    def snapshot(self) -> dict:
+        """Recorded data as plain dict, e.g. to return it from a worker process."""
+        return { 'phases': self.phases, 'files': self.files }
+
+    def merge(self, snapshot: dict):
+        """Add a snapshot() taken elsewhere."""
+        if (not self.enabled) or (snapshot == None):
+            return
+        for (name, (seconds, nbytes, count)) in snapshot['phases'].items():
+            total = self.phases.setdefault(name, [ 0.0, 0, 0 ])
+            total[0] += seconds
+            total[1] += nbytes
+            total[2] += count
+        for (file, phases) in snapshot['files'].items():
+            for (name, (seconds, nbytes)) in phases.items():
+                entry = self.files.setdefault(file, dict()).setdefault(name, [ 0.0, 0 ])
+                entry[0] += seconds
+                entry[1] += nbytes
+
+    def report(self):
+        """Print the aggregate and the slowest files, dump the cProfile data."""
+        if not self.enabled:
+            return
+        if self._cprofile != None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.pstats)
+            print("cProfile data written to {}".format(self.pstats))
+        names = [ p for p in PHASES if p in self.phases ] + sorted(p for p in self.phases if p not in PHASES)
+        print("{:10s} {:>10s} {:>8s} {:>14s} {:>10s}".format('phase', 'seconds', 'calls', 'bytes', 'MB/s'))
+        for name in names:
+            (seconds, nbytes, count) = self.phases[name]
+            rate = nbytes / seconds / 1e6 if seconds and nbytes else 0.0
+            print("{:10s} {:10.4f} {:8d} {:14d} {:10.2f}".format(name, seconds, count, nbytes, rate))
+        if not self.files or not self.slowest:
+            return
+        total = lambda f: sum(s for (s, b) in self.files[f].values())
+        print("slowest files:")
+        for file in sorted(self.files, key=total, reverse=True)[:self.slowest]:
+            phases = self.files[file]
+            detail = ' '.join("{}={:.4f}".format(p, phases[p][0]) for p in names if p in phases)
+            print("{:10.4f} {} ({})".format(total(file), file, detail))
+
+
+profile = Profile()
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a profiling library. No need to call it directly.")
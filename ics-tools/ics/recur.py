@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""
+Small library to expand recurring ics items (RRULE, RDATE, EXDATE) into
+the instances within a time window
+"""
+
+import calendar
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from dateutil.rrule import rrulestr
+
+from .timeindex import params, parse_datetime, recurrence
+from .tz import zone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --------------- magic here --------------- #
+
+DAY = 86400
+CACHESIZE = 4096
+EPOCH = datetime(1970, 1, 1)
+WEEKDAYS = { 'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6 }
+
+# rule parts the vectorised expansion understands, anything else goes to dateutil
+SIMPLE = {
+    'DAILY': { 'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'WKST' },
+    'WEEKLY': { 'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'WKST', 'BYDAY' },
+    'MONTHLY': { 'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'WKST', 'BYMONTHDAY' },
+}
+
+
+def parts(rule: str) -> dict:
+    """Return the parts of an RRULE value, e.g. {'FREQ': 'WEEKLY', 'BYDAY': 'MO,TH'}."""
+    result = dict()
+    for part in rule.split(';'):
+        (name, sep, value) = part.partition('=')
+        if sep:
+            result[name.strip().upper()] = value.strip().upper()
+    return result
+
+
+def simple(rule: dict) -> bool:
+    """Check if rule can be expanded without dateutil."""
+    freq = rule.get('FREQ')
+    if (freq not in SIMPLE) or any(p not in SIMPLE[freq] for p in rule):
+        return False
+    try:
+        if int(rule.get('INTERVAL', 1)) < 1:
+            return False
+        if freq == 'WEEKLY':
+            return all(d in WEEKDAYS for d in rule.get('BYDAY', 'MO').split(','))
+        if freq == 'MONTHLY':
+            return all(0 < abs(int(d)) <= 31 for d in rule.get('BYMONTHDAY', '1').split(','))
+    except ValueError:
+        return False
+    return True
+
+
+def _local(value: str) -> datetime:
+    """Return the naive wall clock time of a DATE or DATE-TIME value."""
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d')
+    return datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+
+
+def _vectorised(local0: datetime, rule: dict, lo: int, hi: int):
+    """Return the wall clock start times (as epoch seconds) of a simple rule in [lo, hi].
+
+    Whole periods (day, week or month) are laid out as a grid of period
+    starts plus the offsets of the instances within the period, so no
+    instance before the window is generated unless COUNT needs them.
+    """
+    t0 = calendar.timegm(local0.timetuple())
+    freq = rule['FREQ']
+    interval = int(rule.get('INTERVAL', 1))
+    timeofday = t0 % DAY
+    if 'COUNT' in rule:
+        lo = t0
+    lo = max(lo, t0)
+    if freq == 'MONTHLY':
+        m0 = numpy.datetime64(local0, 'M')
+        first = (numpy.datetime64(lo, 's').astype('datetime64[M]') - m0).astype('int64') // interval
+        last = (numpy.datetime64(hi, 's').astype('datetime64[M]') - m0).astype('int64') // interval
+        if last < 0:
+            return numpy.zeros(0, 'int64')
+        months = m0 + numpy.arange(max(first, 0), last + 1) * interval
+        mstart = months.astype('datetime64[D]')
+        mdays = ((months + 1).astype('datetime64[D]') - mstart).astype('int64')
+        days = numpy.array([ int(d) for d in rule.get('BYMONTHDAY', str(local0.day)).split(',') ], 'int64')
+        # negative BYMONTHDAY counts from the end of the month, days may coincide then
+        day = numpy.where(days[None, :] > 0, days[None, :], mdays[:, None] + days[None, :] + 1)
+        valid = (day >= 1) & (day <= mdays[:, None])
+        times = (mstart.astype('datetime64[s]').astype('int64')[:, None] + (day - 1) * DAY + timeofday)[valid]
+        times = numpy.unique(times)
+    else:
+        if freq == 'DAILY':
+            base = t0
+            period = interval * DAY
+            offsets = numpy.zeros(1, 'int64')
+        else:
+            wkst = WEEKDAYS.get(rule.get('WKST', 'MO'), 0)
+            base = t0 - timeofday - ((local0.weekday() - wkst) % 7) * DAY
+            period = interval * 7 * DAY
+            days = rule.get('BYDAY')
+            days = [ WEEKDAYS[d] for d in days.split(',') ] if days else [ local0.weekday() ]
+            offsets = numpy.array(sorted({ ((d - wkst) % 7) * DAY + timeofday for d in days }), 'int64')
+        if hi < base:
+            return numpy.zeros(0, 'int64')
+        ks = numpy.arange(max((lo - base) // period - 1, 0), (hi - base) // period + 1, dtype='int64')
+        times = (base + ks[:, None] * period + offsets[None, :]).ravel()
+    times = times[times >= t0]
+    if 'COUNT' in rule:
+        times = times[:int(rule['COUNT'])]
+    return times[times <= hi]
+
+
+def _dateutil(local0: datetime, rule: dict, lo: int, hi: int) -> list:
+    """Return the wall clock start times (as epoch seconds) of any rule in [lo, hi]."""
+    text = ';'.join("{}={}".format(name, value) for (name, value) in rule.items() if name != 'UNTIL')
+    try:
+        expansion = rrulestr(text, dtstart=local0)
+    except (ValueError, TypeError):
+        return list()
+    lo = EPOCH + timedelta(seconds=max(lo, calendar.timegm(local0.timetuple())))
+    hi = EPOCH + timedelta(seconds=hi)
+    return [ calendar.timegm(d.timetuple()) for d in expansion.between(lo, hi, inc=True) ]
+
+
+@lru_cache(maxsize=64)
+def _transitions(tzid: str):
+    """Return the transitions of zone tzid as wall clock times and UTC offsets (numpy arrays)."""
+    tz = zone(tzid)
+    utc = getattr(tz, '_utc_transition_times', None)
+    if utc == None:
+        offset = int(tz.utcoffset(datetime(2000, 1, 1)).total_seconds())
+        return (numpy.zeros(1, 'int64'), numpy.array([ offset ], 'int64'))
+    offsets = [ int(info[0].total_seconds()) for info in tz._transition_info ]
+    utc = [ calendar.timegm(t.timetuple()) for t in utc ]
+    return (numpy.array([ u + o for (u, o) in zip(utc, offsets) ], 'int64'), numpy.array(offsets, 'int64'))
+
+
+def _utc(tzid: str, times) -> list:
+    """Convert wall clock times in tzid (None: UTC or floating) to UTC epoch seconds.
+
+    Like pytz localize(), times in a DST gap or overlap get the offset
+    from before the transition resp. standard time.
+    """
+    if (tzid == None) or (zone(tzid) == None):
+        return [ int(t) for t in times ]
+    if numpy != None:
+        (local, offsets) = _transitions(tzid)
+        times = numpy.asarray(times, 'int64')
+        i = numpy.maximum(numpy.searchsorted(local, times, 'right') - 1, 0)
+        return (times - offsets[i]).tolist()
+    tz = zone(tzid)
+    return [ calendar.timegm(tz.localize(EPOCH + timedelta(seconds=int(t))).utctimetuple()) for t in times ]
+
+
+def _dates(pairs: tuple) -> set:
+    """Return the UTC epoch seconds of RDATE/EXDATE (key, value) pairs, periods by their start."""
+    result = set()
+    for (key, value) in pairs:
+        for v in value.split(','):
+            when = parse_datetime(key, v.split('/')[0])[0]
+            if when != None:
+                result.add(when)
+    return result
+
+
+@lru_cache(maxsize=CACHESIZE)
+def expand(uid: str, dtkey: str, dtvalue: str, rule: str, rdates: tuple, exdates: tuple,
+           start: int, end: int, length: int =0) -> tuple:
+    """Return the sorted UTC start times of the instances overlapping [start, end).
+
+    The instances are DTSTART, those of rule (an RRULE value or None) and
+    rdates, less exdates (both tuples of (key, value) pairs). Simple
+    DAILY/WEEKLY/MONTHLY rules are expanded with numpy if available, all
+    others with dateutil.rrule, in wall clock time of the DTSTART zone.
+    Results are memoised per item, rule and window.
+    """
+    (first, isdate) = parse_datetime(dtkey, dtvalue)
+    if first == None:
+        return tuple()
+    result = { first }
+    if rule:
+        tzid = params(dtkey).get('TZID')
+        if isdate or dtvalue.endswith('Z'):
+            tzid = None
+        local0 = _local(dtvalue)
+        rp = parts(rule)
+        # wall clock window, wide enough for any UTC offset
+        lo = start - length - DAY
+        hi = end + DAY
+        until = None
+        if 'UNTIL' in rp:
+            until = parse_datetime('UNTIL' if tzid == None else 'UNTIL;TZID=' + tzid, rp['UNTIL'])[0]
+            if until != None:
+                hi = min(hi, until + DAY)
+        if hi >= lo:
+            if (numpy != None) and simple(rp):
+                times = _vectorised(local0, rp, lo, hi)
+            else:
+                times = _dateutil(local0, rp, lo, hi)
+            times = _utc(tzid, times)
+            if until != None:
+                times = [ t for t in times if t <= until ]
+            result.update(times)
+    result.update(_dates(rdates))
+    result.difference_update(_dates(exdates))
+    return tuple(sorted(t for t in result if (t < end) and ((t + length > start) or (t >= start))))
+
+
+def occurrences(uid: str, recur: list, start: int, end: int) -> tuple:
+    """Return the instance start times within [start, end) for a recurrence() list."""
+    (dtkey, dtvalue, rule, rdates, exdates, length) = recur
+    return expand(uid, dtkey, dtvalue, rule, tuple(map(tuple, rdates)), tuple(map(tuple, exdates)),
+                  start, end, length)
+
+
+def instances(comp, start: int, end: int, tzids: dict =None) -> tuple:
+    """Return the instance start times of a VEVENT/VTODO within [start, end), None if it does not recur.
+
+    tzids are the VTIMEZONE locations of its calendar, see tz.locations().
+    """
+    recur = recurrence(comp, tzids)
+    if recur == None:
+        return None
+    return occurrences(comp.get('UID'), recur, start, end)
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a recurrence expansion library. No need to call it directly.")
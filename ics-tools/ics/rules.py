@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Small library to run fix rules over ics data in a single traversal
+"""
+
+import time
+
+from .component import Component
+
+# --------------- magic here --------------- #
+
+
+class Rule():
+    """A fix rule, matched on component name and optionally property name prefixes."""
+
+    __slots__ = ('name', 'components', 'props', 'func', 'calls', 'hits', 'elapsed')
+
+    def __init__(self, name: str, components: tuple, props: tuple, func):
+        self.name = name
+        self.components = components
+        self.props = props
+        self.func = func
+        self.calls = 0
+        self.hits = 0
+        self.elapsed = 0.0
+
+
+class RuleEngine():
+    """Registry of fix rules, all of them applied in one walk over the tree.
+
+    Component rules (no props) are called as func(context, component, None)
+    once per matching component, property rules as
+    func(context, component, key) for every key starting with one of their
+    prefixes. Rules return the number of changes they made. Rules run in
+    registration order, component rules before property rules.
+    """
+
+    def __init__(self):
+        self.rules = list()
+        self._plan = None
+
+    def rule(self, name: str, components: tuple, props: tuple =None):
+        """Decorator registering a rule function."""
+        def register(func):
+            self.rules.append(Rule(name, tuple(components), props and tuple(props), func))
+            self._plan = None
+            return func
+        return register
+
+    def _compile(self) -> dict:
+        """Group rules per component name, with one prefix tuple for a quick skip."""
+        plan = dict()
+        for rule in self.rules:
+            for name in rule.components:
+                (comprules, proprules, prefixes) = plan.get(name, (list(), list(), tuple()))
+                if rule.props == None:
+                    comprules.append(rule)
+                else:
+                    proprules.append(rule)
+                    prefixes = prefixes + rule.props
+                plan[name] = (comprules, proprules, prefixes)
+        return plan
+
+    def _call(self, rule: Rule, context, comp, key) -> int:
+        start = time.perf_counter()
+        changes = rule.func(context, comp, key) or 0
+        rule.elapsed += time.perf_counter() - start
+        rule.calls += 1
+        if changes:
+            rule.hits += 1
+        return changes
+
+    def _walk(self, comp, context) -> int:
+        changes = 0
+        plan = self._plan.get(comp.name)
+        if plan != None:
+            (comprules, proprules, prefixes) = plan
+            for rule in comprules:
+                changes += self._call(rule, context, comp, None)
+        # raw items, so lazy components only decode what the rules look at
+        for (key, value) in Component.items(comp):
+            if (plan != None) and key.startswith(prefixes):
+                for rule in proprules:
+                    if key not in comp:
+                        break
+                    if key.startswith(rule.props):
+                        changes += self._call(rule, context, comp, key)
+            if (type(value) is list) and value and isinstance(value[0], Component):
+                for sub in value:
+                    changes += self._walk(sub, context)
+        return changes
+
+    def run(self, comp: Component, context=None) -> int:
+        """Apply all rules to comp and its subcomponents, returns number of changes."""
+        if self._plan == None:
+            self._plan = self._compile()
+        return self._walk(comp, context)
+
+    def stats(self) -> list:
+        """Return (name, calls, hits, seconds) for every rule."""
+        return [ (r.name, r.calls, r.hits, r.elapsed) for r in self.rules ]
+
+    def merge(self, stats: list):
+        """Add stats() of another engine with the same rules, e.g. from a worker."""
+        for (rule, (name, calls, hits, elapsed)) in zip(self.rules, stats):
+            rule.calls += calls
+            rule.hits += hits
+            rule.elapsed += elapsed
+
+    def reset(self):
+        for rule in self.rules:
+            rule.calls = 0
+            rule.hits = 0
+            rule.elapsed = 0.0
+
+    def report(self):
+        print("{:24s} {:>8s} {:>8s} {:>10s}".format('rule', 'calls', 'fired', 'seconds'))
+        for (name, calls, hits, elapsed) in self.stats():
+            print("{:24s} {:8d} {:8d} {:10.4f}".format(name, calls, hits, elapsed))
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a rule engine library. No need to call it directly.")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Small library to tell ics files from other files by their first bytes
+"""
+
+import os
+
+# --------------- magic here --------------- #
+
+# enough for the first line of any item Radicale writes
+HEADSIZE = 512
+
+
+def classify(head: bytes, name: str ='') -> str:
+    """Classify the start of a file as 'ical', 'vcard', 'radicale', 'empty' or 'junk'.
+
+    Like the parsers, a first line ending in BEGIN:VCALENDAR counts as
+    ical (binary blob in front). A first line longer than head is only
+    accepted if it already contains BEGIN:VCALENDAR.
+    """
+    if os.path.basename(name).startswith('.Radicale'):
+        return 'radicale'
+    if not head:
+        return 'empty'
+    end = head.find(b'\n')
+    if end < 0:
+        first = head
+    else:
+        first = head[:end].rstrip(b'\r')
+    if first.startswith(b'BEGIN:VCALENDAR') or first.endswith(b'BEGIN:VCALENDAR'):
+        return 'ical'
+    if (end < 0) and (head.find(b'BEGIN:VCALENDAR') > -1):
+        return 'ical'
+    if first.startswith(b'BEGIN:VCARD') or first.startswith(b'\xef\xbb\xbfBEGIN:VCARD'):
+        return 'vcard'
+    if head.lstrip().startswith(b'{'):
+        # .Radicale.props and friends are JSON
+        return 'radicale'
+    return 'junk'
+
+
+def sniff(file: str, size: int =HEADSIZE) -> str:
+    """Classify a file reading at most size bytes, see classify().
+
+    Returns None if the file cannot be read.
+    """
+    try:
+        with open(file, 'rb') as file_handle:
+            head = file_handle.read(size)
+    except OSError:
+        return None
+    return classify(head, file)
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a file type sniffing library. No need to call it directly.")
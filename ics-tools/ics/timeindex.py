@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+"""
+Small library to index ics items by time, for time window queries
+"""
+
+import os
+import re
+import json
+import hashlib
+import calendar
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import pytz
+from dateutil.rrule import rrulestr
+
+from .ics_lazy import parse_ics_lazy
+from .walk import walk
+from .tz import zone, locations, normalise
+
+# --------------- magic here --------------- #
+
+INDEXVERSION = 4
+
+durationregex = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+untilregex = re.compile(r'(?:^|;)UNTIL=([0-9TZ]+)')
+countregex = re.compile(r'(?:^|;)COUNT=(\d+)')
+# longer COUNT limited rules are taken as unbounded instead of expanded
+MAXCOUNT = 100000
+
+
+def params(key: str) -> dict:
+    """Return the parameters of a property key like 'DTSTART;TZID=Europe/Berlin'."""
+    result = dict()
+    for param in key.split(';')[1:]:
+        (name, sep, value) = param.partition('=')
+        result[name.upper()] = value.strip('"')
+    return result
+
+
+def prop(comp, name: str):
+    """Return (key, value) of the first property name, with or without parameters."""
+    prefix = name + ';'
+    for key in comp.keys():
+        if (key == name) or key.startswith(prefix):
+            return (key, comp[key])
+    return (None, None)
+
+
+def parse_datetime(key: str, value: str, tzids: dict =None) -> tuple:
+    """Return (UTC epoch seconds, is a date) for a DATE or DATE-TIME property.
+
+    DATE-TIME with TZID is converted from that zone (resolved with the
+    calendar's VTIMEZONE locations tzids), with a trailing Z it is UTC.
+    Floating times, dates and unknown zones are taken as UTC.
+    Returns (None, False) if value cannot be parsed.
+    """
+    value = value.strip()
+    p = params(key)
+    try:
+        if (p.get('VALUE') == 'DATE') or (len(value) == 8):
+            day = datetime.strptime(value[:8], '%Y%m%d')
+            return (calendar.timegm(day.timetuple()), True)
+        when = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    except ValueError:
+        return (None, False)
+    if (not value.endswith('Z')) and ('TZID' in p):
+        tz = zone(p['TZID'], (tzids or dict()).get(p['TZID']))
+        if tz != None:
+            when = tz.localize(when).astimezone(pytz.utc)
+    return (calendar.timegm(when.timetuple()), False)
+
+
+def parse_duration(value: str) -> int:
+    """Return an RFC 5545 duration (e.g. PT1H30M, P1W, -P1D) in seconds or None."""
+    m = durationregex.match(value.strip())
+    if (m == None) or (value.strip() in ('P', 'PT', '-P', '+P')):
+        return None
+    (sign, weeks, days, hours, minutes, seconds) = m.groups()
+    total = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    total = int(total.total_seconds())
+    return -total if sign == '-' else total
+
+
+def span(comp, tzids: dict =None) -> tuple:
+    """Return (start, end) in UTC epoch seconds of one VEVENT/VTODO instance.
+
+    End is DTEND (DUE for VTODO) or DTSTART plus DURATION, else one day
+    for dates and zero length otherwise. Returns None without a usable
+    DTSTART.
+    """
+    (key, value) = prop(comp, 'DTSTART')
+    if key == None:
+        return None
+    (start, isdate) = parse_datetime(key, value, tzids)
+    if start == None:
+        return None
+    end = None
+    (key, value) = prop(comp, 'DUE' if comp.name == 'VTODO' else 'DTEND')
+    if key != None:
+        end = parse_datetime(key, value, tzids)[0]
+    if end == None:
+        (key, value) = prop(comp, 'DURATION')
+        if key != None:
+            length = parse_duration(value)
+            if length != None:
+                end = start + length
+    if end == None:
+        end = start + (86400 if isdate else 0)
+    return (start, max(start, end))
+
+
+def props(comp, name: str) -> list:
+    """Return [key, value] of all properties name, with or without parameters."""
+    prefix = name + ';'
+    result = list()
+    for (key, value) in comp.items():
+        if (key == name) or key.startswith(prefix):
+            for v in (value if type(value) is list else [ value ]):
+                result.append([ key, v ])
+    return result
+
+
+def recurrence(comp, tzids: dict =None) -> list:
+    """Return [dtstart key, dtstart value, RRULE or None, RDATEs, EXDATEs, length] or None.
+
+    RDATE/EXDATE as lists of [key, value], None if comp does not recur.
+    TZIDs in the keys are canonical, so they resolve without the calendar.
+    """
+    rdates = [ [ normalise(k, tzids), v ] for (k, v) in props(comp, 'RDATE') ]
+    (key, rule) = prop(comp, 'RRULE')
+    if (key == None) and (not rdates):
+        return None
+    result = span(comp, tzids)
+    if result == None:
+        return None
+    (start, end) = result
+    (dtkey, dtvalue) = prop(comp, 'DTSTART')
+    exdates = [ [ normalise(k, tzids), v ] for (k, v) in props(comp, 'EXDATE') ]
+    return [ normalise(dtkey, tzids), dtvalue.strip(), rule.strip() if key != None else None, rdates, exdates, end - start ]
+
+
+def last(key: str, value: str, rule: str, tzids: dict =None) -> int:
+    """Return the UTC start of the last instance of a COUNT limited RRULE, None if unknown.
+
+    key and value are those of DTSTART, the rule is expanded in its wall
+    clock time like recur.expand() does.
+    """
+    value = value.strip()
+    isdate = (params(key).get('VALUE') == 'DATE') or (len(value) == 8)
+    try:
+        local0 = datetime.strptime(value[:8] if isdate else value[:15], '%Y%m%d' if isdate else '%Y%m%dT%H%M%S')
+        final = rrulestr(rule, dtstart=local0)[-1]
+    except (ValueError, TypeError, IndexError):
+        return None
+    if isdate:
+        return parse_datetime(key, final.strftime('%Y%m%d'), tzids)[0]
+    return parse_datetime(key, final.strftime('%Y%m%dT%H%M%S') + ('Z' if value.endswith('Z') else ''), tzids)[0]
+
+
+def interval(comp, tzids: dict =None) -> tuple:
+    """Return (start, end) in UTC epoch seconds of a VEVENT/VTODO, end None if unbounded.
+
+    Recurring items run until their last RDATE, UNTIL or COUNTth instance
+    (plus their length), or forever. Returns None without a usable DTSTART.
+    """
+    result = span(comp, tzids)
+    if result == None:
+        return None
+    (start, end) = result
+    length = end - start
+    for (key, value) in props(comp, 'RDATE'):
+        for v in value.split(','):
+            rdate = parse_datetime(key, v.split('/')[0], tzids)[0]
+            if rdate != None:
+                end = max(end, rdate + length)
+    (key, rule) = prop(comp, 'RRULE')
+    if key != None:
+        m = untilregex.search(rule)
+        count = countregex.search(rule)
+        until = None
+        if m != None:
+            until = parse_datetime('UNTIL', m.group(1))[0]
+        elif (count != None) and (int(count.group(1)) <= MAXCOUNT):
+            (dtkey, dtvalue) = prop(comp, 'DTSTART')
+            until = last(dtkey, dtvalue, rule.strip(), tzids)
+        if until == None:
+            return (start, None)
+        end = max(end, until + length)
+    return (start, end)
+
+
+def intervals(data: dict) -> list:
+    """Return [start, end, uid, recurrence] for all VEVENTs and VTODOs of a parsed dataset."""
+    result = list()
+    if (data == None) or (data.get('VCALENDAR') == None):
+        return result
+    tzids = locations(data['VCALENDAR'])
+    for vgroup in [ 'VEVENT', 'VTODO' ]:
+        for comp in data['VCALENDAR'].get(vgroup, list()):
+            total = interval(comp, tzids)
+            if total == None:
+                continue
+            result.append([ total[0], total[1], comp.get('UID'), recurrence(comp, tzids) ])
+    return result
+
+
+def indexdir() -> str:
+    """Default index directory, $XDG_CACHE_HOME/ics-tools/times (~/.cache if unset)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ics-tools', 'times')
+
+
+def indexfile(directory: str, basedir: str =None) -> str:
+    """Index file of a collection, named by the hash of its absolute path."""
+    name = hashlib.sha256(os.path.abspath(directory).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(basedir or indexdir(), name + '.json')
+
+
+def bucket(length: int) -> int:
+    """Length class of a bounded interval, lengths within a factor of 4 share one."""
+    return length.bit_length() // 2
+
+
+class TimeIndex():
+    """Intervals of the items of one collection, persisted outside the store.
+
+    Entries are refreshed by size and mtime, so only new or changed items
+    get parsed. Bounded intervals are grouped by length class, each a
+    start sorted array: an interval overlapping [start, end) starts at or
+    after start minus the longest one of its class, so a few long series
+    do not make every query scan short items. Unbounded (recurring)
+    intervals are checked apart. scanned counts the entries the last
+    query looked at.
+    """
+
+    def __init__(self, directory: str, verbose: int =0, basedir: str =None):
+        self._verbose = verbose
+        self.directory = directory
+        self.file = indexfile(directory, basedir)
+        self.files = dict()
+        self.changed = False
+        self.scanned = 0
+        self._arrays = None
+        try:
+            with open(self.file, 'r', encoding='utf8') as file_handle:
+                data = json.load(file_handle)
+            if data.get('version') == INDEXVERSION:
+                self.files = data.get('files', dict())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as err:
+            if verbose:
+                print("ignoring broken time index {}: {}".format(self.file, err))
+
+    def update(self, names: list) -> int:
+        """Bring the index up to date for the item file names given, returns the number parsed."""
+        parsed = 0
+        keep = dict.fromkeys(names, 1)
+        for name in list(self.files):
+            if name not in keep:
+                del self.files[name]
+                self.changed = True
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entry = self.files.get(name)
+            if (entry != None) and (entry[0] == st.st_size) and (entry[1] == st.st_mtime_ns):
+                continue
+            try:
+                with open(path, 'rb') as file_handle:
+                    data = parse_ics_lazy(file_handle.read(), path)
+            except OSError as err:
+                if self._verbose:
+                    print(err)
+                continue
+            self.files[name] = [ st.st_size, st.st_mtime_ns, intervals(data) ]
+            self.changed = True
+            parsed += 1
+        if self.changed:
+            self._arrays = None
+        return parsed
+
+    def save(self) -> bool:
+        """Write the index atomically if anything changed."""
+        if not self.changed:
+            return True
+        tmpfile = self.file + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            with open(tmpfile, 'w', encoding='utf8') as file_handle:
+                json.dump({ 'version': INDEXVERSION, 'files': self.files }, file_handle)
+            os.replace(tmpfile, self.file)
+        except OSError as err:
+            print("error writing time index {}: {}".format(self.file, err))
+            return False
+        self.changed = False
+        return True
+
+    def _build(self):
+        buckets = dict()
+        unbounded = list()
+        for (name, (size, mtime, spans)) in self.files.items():
+            for (start, end, uid, recur) in spans:
+                if end == None:
+                    unbounded.append((start, end, uid, name, recur))
+                else:
+                    buckets.setdefault(bucket(end - start), list()).append((start, end, uid, name, recur))
+        bounded = list()
+        for items in buckets.values():
+            items.sort(key=lambda i: i[0])
+            starts = [ i[0] for i in items ]
+            longest = max(i[1] - i[0] for i in items)
+            bounded.append((starts, items, longest))
+        self._arrays = (bounded, unbounded)
+
+    def query(self, start: int, end: int) -> list:
+        """Return (start, end, uid, path, recurrence) of the items overlapping [start, end).
+
+        Zero length items count when they lie within the window. For
+        recurring items start and end cover all instances, see
+        recur.occurrences() for the instances within the window.
+        """
+        if self._arrays == None:
+            self._build()
+        (bounded, unbounded) = self._arrays
+        result = list()
+        self.scanned = len(unbounded)
+        for (starts, items, longest) in bounded:
+            lo = bisect_left(starts, start - longest)
+            hi = bisect_left(starts, end)
+            self.scanned += max(0, hi - lo)
+            for i in range(lo, hi):
+                item = items[i]
+                if (item[1] > start) or (item[0] >= start):
+                    result.append(item)
+        for item in unbounded:
+            if item[0] < end:
+                result.append(item)
+        return [ (s, e, uid, os.path.join(self.directory, name), recur) for (s, e, uid, name, recur) in result ]
+
+
+def collections(topdir: str, verbose: int =0) -> dict:
+    """Group the item files below topdir by directory, {directory: [names]}."""
+    result = dict()
+    for path in walk(topdir, verbose):
+        (directory, name) = os.path.split(path)
+        result.setdefault(directory, list()).append(name)
+    return result
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a time index library. No need to call it directly.")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""
+Small library with the line tokenizer shared by all ics parsers
+"""
+
+from itertools import chain
+from functools import partial
+
+from .component import Component
+
+# --------------- magic here --------------- #
+
+# first character of folded continuation lines, everything else is
+# classified by splitting once on the first colon
+continuation = { ' ': 1, '\\': 1 }
+
+# nesting level of the components the parsers know; BEGIN and END dispatch
+# on it, a finished component goes into the one open a level above
+CONTEXTS = { 'VCALENDAR': 0, 'VEVENT': 1, 'VTODO': 1, 'VTIMEZONE': 1, 'ALARM': 1,
+             'VALARM': 2, 'STANDARD': 2, 'DAYLIGHT': 2 }
+ctxnames_1 = { ctx: 1 for (ctx, level) in CONTEXTS.items() if level == 1 }
+ctxnames_2 = { ctx: 1 for (ctx, level) in CONTEXTS.items() if level == 2 }
+multivalue = { 'ATTACH': 1, 'ATTENDEE': 1 }
+
+decode = partial(str, encoding='utf-8', errors='ignore')
+
+
+def _component(ctx: str, values: dict, first: int, last: int) -> Component:
+    """Turn the values collected between BEGIN (line first) and END (line last) into a Component."""
+    return Component.fromdict(ctx, values)
+
+
+def tokenize(lines, source='', verbose: int =0, debug: list =None, stream: bool =False, repairs: list =None,
+             finish=_component, resolve=None):
+    """Build the nested ics data layout from an iterable of str or bytes lines.
+
+    Generator; with stream set it yields (name, component) for every
+    finished top-level component instead of attaching it to the VCALENDAR,
+    and ('VCALENDAR', component) at its end. The complete dataset (or None
+    for non-ics data) is the return value, see parse_lines().
+    Components are filled as dicts and handed to finish() once complete.
+    Lines repaired on the fly are reported as (lineno, reason) in repairs.
+
+    Other parsers drive it with (lineno, line) pairs instead, see
+    ics_lazy.parse_ics_lazy(): a line may then be a (name, value) tuple of
+    a property split already, with any value finish() understands. Such
+    values get turned into str by resolve() before a continuation line is
+    appended to them.
+    """
+    data = dict()
+    ctxstack = list()
+    # values of the component open on each level and its BEGIN line
+    stack = [ None ] * (max(CONTEXTS.values()) + 1)
+    begun = list(stack)
+    key = None
+    target = None
+    calend = None
+    pending = None
+    lines = iter(lines)
+    first = next(lines, '')
+    numbered = (type(first) is tuple)
+    line = first[1] if numbered else first
+    if type(line) is bytes:
+        line = str(line, 'utf-8', 'ignore')
+        lines = map(decode, lines)
+    if line.endswith('BEGIN:VCALENDAR') and (not line.startswith('BEGIN:VCALENDAR')):
+        # trim binary blob..
+        line = 'BEGIN:VCALENDAR'
+        if repairs != None:
+            repairs.append((1, 'binary blob'))
+    if not line.startswith('BEGIN:VCALENDAR'):
+        if verbose:
+            print("Not ics data")
+        return None
+    if numbered:
+        records = chain(((first[0], line),), lines)
+    else:
+        records = enumerate(chain((line,), lines), 1)
+    for (lineno, line) in records:
+        if type(line) is tuple:
+            (name, val) = line
+        else:
+            if debug:
+                for pattern in debug:
+                    if line.count(pattern):
+                        print("Source '{}' Line {}: debug option found: {}".format(source, lineno, pattern))
+                        print(' '+line)
+                        print(" Context: "+' -> '.join(ctxstack))
+            if (pending != None) and (line[:1] == ' '):
+                # property name or parameters folded, unfold them
+                line = pending + line[1:]
+                pending = None
+            elif line[:1] in continuation:
+                if line[:1] == '\\':
+                    line = ' '+line     ## fix brokenness
+                    if repairs != None:
+                        repairs.append((lineno, 'broken continuation'))
+                if (not key) or (target == None):
+                    print("broken continuation; source {} line {}".format(source,lineno))
+                    print(line)
+                    print("Context: "+' -> '.join(ctxstack))
+                    continue
+                value = target.get(key)
+                if value == None:
+                    target[key] = line
+                elif type(value) is list:
+                    # multi value property, the last one continues
+                    value[-1] = (value[-1] if type(value[-1]) is str else resolve(value[-1]))+'\n'+line
+                else:
+                    target[key] = (value if type(value) is str else resolve(value))+'\n'+line
+                continue
+            elif pending != None:
+                print("broken continuation?; source {} line {}".format(source,lineno-1))
+                print(pending)
+                print("Context: "+' -> '.join(ctxstack))
+                pending = None
+            (name, sep, val) = line.partition(':')
+            if not sep:
+                # maybe folded before the colon, decided by the next line
+                pending = line
+                continue
+        if (name != 'BEGIN') and (name != 'END'):
+            key = name
+            if target == None:
+                print("property outside of VCALENDAR; source {} line {}".format(source,lineno))
+                print(line)
+            elif key in multivalue:
+                if key in target:
+                    target[key].append(val)
+                else:
+                    target[key] = [ val, ]
+            else:
+                target[key] = val
+            continue
+        ctx = val
+        level = CONTEXTS.get(ctx)
+        if name == 'BEGIN':
+            ctxstack.append(ctx)
+            if level == None:
+                print("unknown context; source {} line {}".format(source,lineno))
+                print(line)
+                continue
+            target = dict()
+            stack[level] = target
+            begun[level] = lineno
+            for deeper in range(level + 1, len(stack)):
+                stack[deeper] = None
+            continue
+        if (not ctxstack) or (ctx != ctxstack[-1]):
+            print("out of context; source {} line {}".format(source,lineno))
+            print(line)
+        if verbose > 2:
+            print("Context: "+' -> '.join(ctxstack))
+        if ctxstack:
+            del ctxstack[-1]
+        if level == None:
+            print("unknown context; source {} line {}".format(source,lineno))
+            print(line)
+        elif level == 0:
+            calend = lineno
+            if stream and (stack[0] != None):
+                yield (ctx, finish(ctx, stack[0], begun[0], lineno))
+            key = None
+        elif (stack[level] == None) or (stack[level - 1] == None):
+            print("context missing; source {} line {}".format(source,lineno))
+            print(line)
+        else:
+            comp = finish(ctx, stack[level], begun[level], lineno)
+            stack[level] = None
+            target = stack[level - 1]
+            if stream and (level == 1):
+                yield (ctx, comp)
+            elif ctx in target:
+                target[ctx].append(comp)
+            else:
+                target[ctx] = [ comp, ]
+    if pending != None:
+        print("broken continuation?; source {} line {}".format(source,lineno))
+        print(pending)
+    caldata = stack[0]
+    if caldata != None:
+        caldata = finish('VCALENDAR', caldata, begun[0], calend)
+    data['VCALENDAR'] = caldata
+    return data
+
+
+def parse_lines(lines, source='', verbose: int =0, debug: list =None, repairs: list =None) -> dict:
+    """Parse an iterable of str or bytes lines into structured ics dataset."""
+    tokens = tokenize(lines, source, verbose, debug, repairs=repairs)
+    try:
+        while True:
+            next(tokens)
+    except StopIteration as stop:
+        return stop.value
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains the ics line tokenizer. No need to call it directly.")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+Small library to resolve TZIDs (IANA, Windows/Outlook names, embedded
+VTIMEZONE definitions) to canonical zones
+"""
+
+import re
+from functools import lru_cache
+
+import pytz
+
+# --------------- magic here --------------- #
+
+ZONES = pytz.all_timezones_set
+_folded = { name.lower(): name for name in pytz.all_timezones }
+
+# Windows zone names (as written by Outlook and Exchange) to IANA, the
+# territory "001" mapping of the CLDR windowsZones table for the common ones
+WINDOWS = {
+    'Dateline Standard Time': 'Etc/GMT+12',
+    'Hawaiian Standard Time': 'Pacific/Honolulu',
+    'Alaskan Standard Time': 'America/Anchorage',
+    'Pacific Standard Time': 'America/Los_Angeles',
+    'Pacific Standard Time (Mexico)': 'America/Tijuana',
+    'US Mountain Standard Time': 'America/Phoenix',
+    'Mountain Standard Time': 'America/Denver',
+    'Central America Standard Time': 'America/Guatemala',
+    'Central Standard Time': 'America/Chicago',
+    'Central Standard Time (Mexico)': 'America/Mexico_City',
+    'Canada Central Standard Time': 'America/Regina',
+    'SA Pacific Standard Time': 'America/Bogota',
+    'Eastern Standard Time': 'America/New_York',
+    'US Eastern Standard Time': 'America/Indianapolis',
+    'Atlantic Standard Time': 'America/Halifax',
+    'SA Western Standard Time': 'America/La_Paz',
+    'Pacific SA Standard Time': 'America/Santiago',
+    'Newfoundland Standard Time': 'America/St_Johns',
+    'E. South America Standard Time': 'America/Sao_Paulo',
+    'Argentina Standard Time': 'America/Buenos_Aires',
+    'SA Eastern Standard Time': 'America/Cayenne',
+    'UTC': 'Etc/UTC',
+    'Coordinated Universal Time': 'Etc/UTC',
+    'GMT Standard Time': 'Europe/London',
+    'Greenwich Standard Time': 'Atlantic/Reykjavik',
+    'W. Europe Standard Time': 'Europe/Berlin',
+    'Central Europe Standard Time': 'Europe/Budapest',
+    'Romance Standard Time': 'Europe/Paris',
+    'Central European Standard Time': 'Europe/Warsaw',
+    'W. Central Africa Standard Time': 'Africa/Lagos',
+    'GTB Standard Time': 'Europe/Bucharest',
+    'E. Europe Standard Time': 'Europe/Chisinau',
+    'FLE Standard Time': 'Europe/Kiev',
+    'Israel Standard Time': 'Asia/Jerusalem',
+    'Egypt Standard Time': 'Africa/Cairo',
+    'South Africa Standard Time': 'Africa/Johannesburg',
+    'Turkey Standard Time': 'Europe/Istanbul',
+    'Russian Standard Time': 'Europe/Moscow',
+    'Arab Standard Time': 'Asia/Riyadh',
+    'Arabian Standard Time': 'Asia/Dubai',
+    'Iran Standard Time': 'Asia/Tehran',
+    'Pakistan Standard Time': 'Asia/Karachi',
+    'India Standard Time': 'Asia/Calcutta',
+    'Nepal Standard Time': 'Asia/Katmandu',
+    'Bangladesh Standard Time': 'Asia/Dhaka',
+    'SE Asia Standard Time': 'Asia/Bangkok',
+    'China Standard Time': 'Asia/Shanghai',
+    'Singapore Standard Time': 'Asia/Singapore',
+    'Taipei Standard Time': 'Asia/Taipei',
+    'Tokyo Standard Time': 'Asia/Tokyo',
+    'Korea Standard Time': 'Asia/Seoul',
+    'Cen. Australia Standard Time': 'Australia/Adelaide',
+    'AUS Central Standard Time': 'Australia/Darwin',
+    'E. Australia Standard Time': 'Australia/Brisbane',
+    'AUS Eastern Standard Time': 'Australia/Sydney',
+    'Tasmania Standard Time': 'Australia/Hobart',
+    'New Zealand Standard Time': 'Pacific/Auckland',
+}
+_windows = { name.lower(): zone for (name, zone) in WINDOWS.items() }
+
+# prefixes some clients put in front of the Olson name,
+# e.g. /mozilla.org/20050126_1/Europe/Berlin
+prefixregex = re.compile(r'^/?(?:[^/]*\.(?:org|net|com)/)(?:[^/]*\d[^/]*/)*(?:Tzfile/)?', re.I)
+
+
+@lru_cache(maxsize=1024)
+def resolve(tzid: str, location: str =None) -> str:
+    """Return the canonical IANA name for tzid, None if it cannot be resolved.
+
+    Tried in turn: the name as is (set lookup), case folded, Windows names,
+    with vendor prefixes removed, and the X-LIC-LOCATION of the embedded
+    VTIMEZONE (location) for made up names like "Customized Time Zone".
+    """
+    if tzid == None:
+        return None
+    name = tzid.strip().strip('"')
+    if name in ZONES:
+        return name
+    for candidate in (name, prefixregex.sub('', name)):
+        folded = candidate.lower()
+        if folded in _folded:
+            return _folded[folded]
+        if folded in _windows:
+            return _windows[folded]
+    if location:
+        return resolve(location)
+    return None
+
+
+@lru_cache(maxsize=1024)
+def zone(tzid: str, location: str =None):
+    """Return the (shared) pytz tzinfo for tzid, None if it cannot be resolved."""
+    name = resolve(tzid, location)
+    if name == None:
+        return None
+    return pytz.timezone(name)
+
+
+def locations(vcalendar) -> dict:
+    """Return {TZID: X-LIC-LOCATION or None} of the VTIMEZONEs of a VCALENDAR component."""
+    result = dict()
+    if vcalendar == None:
+        return result
+    for vtimezone in vcalendar.get('VTIMEZONE', list()):
+        tzid = vtimezone.get('TZID')
+        if tzid != None:
+            result[tzid.strip()] = vtimezone.get('X-LIC-LOCATION')
+    return result
+
+
+def tzparam(key: str) -> str:
+    """Return the TZID parameter of a property key, None if there is none."""
+    for param in key.split(';')[1:]:
+        (name, sep, value) = param.partition('=')
+        if name.upper() == 'TZID':
+            return value.strip('"')
+    return None
+
+
+def normalise(key: str, tzids: dict =None) -> str:
+    """Return key with its TZID parameter replaced by the canonical name, if it has one.
+
+    tzids are the locations() of the calendar, so TZIDs defined by an
+    embedded VTIMEZONE resolve through its X-LIC-LOCATION.
+    """
+    tzid = tzparam(key)
+    if tzid == None:
+        return key
+    name = resolve(tzid, (tzids or dict()).get(tzid))
+    if (name == None) or (name == tzid):
+        return key
+    parts = key.split(';')
+    for (i, param) in enumerate(parts):
+        if param.upper().startswith('TZID='):
+            parts[i] = 'TZID=' + name
+    return ';'.join(parts)
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a timezone resolution library. No need to call it directly.")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Small library to keep a persistent index of UIDs used in a collection
+"""
+
+import os
+import sqlite3
+
+# --------------- magic here --------------- #
+
+
+class UIDIndex():
+    """SQLite backed map of UID like properties to the files using them.
+
+    Paths are stored relative to the directory holding the index file, so
+    the index can live in the collection root and survive moves of it.
+    """
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, hash TEXT)',
+        'CREATE TABLE IF NOT EXISTS uids (uid TEXT, prop TEXT, path TEXT)',
+        'CREATE INDEX IF NOT EXISTS uids_uid ON uids (uid)',
+        'CREATE INDEX IF NOT EXISTS uids_path ON uids (path)',
+    ]
+
+    def __init__(self, file: str, verbose: int =0):
+        self._verbose = verbose
+        self.file = file
+        self._root = os.path.dirname(os.path.abspath(file))
+        self._db = sqlite3.connect(file)
+        for statement in self.schema:
+            self._db.execute(statement)
+        self._db.commit()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self._root)
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def commit(self):
+        self._db.commit()
+
+    def owners(self, uid: str) -> list:
+        """Return the paths using uid."""
+        cur = self._db.execute('SELECT DISTINCT path FROM uids WHERE uid = ?', (uid,))
+        return [ os.path.join(self._root, row[0]) for row in cur ]
+
+    def taken(self, uid: str, path: str) -> bool:
+        """Check if uid is used by any file other than path."""
+        cur = self._db.execute('SELECT 1 FROM uids WHERE uid = ? AND path != ? LIMIT 1',
+                               (uid, self._key(path)))
+        return cur.fetchone() != None
+
+    def filehash(self, path: str) -> str:
+        """Return the content hash recorded for path or None."""
+        cur = self._db.execute('SELECT hash FROM files WHERE path = ?', (self._key(path),))
+        row = cur.fetchone()
+        if row == None:
+            return None
+        return row[0]
+
+    def update(self, path: str, uids: list, filehash: str =None):
+        """Replace the entries of path with uids, a list of (prop, uid) tuples."""
+        key = self._key(path)
+        self._db.execute('DELETE FROM uids WHERE path = ?', (key,))
+        self._db.executemany('INSERT INTO uids (uid, prop, path) VALUES (?, ?, ?)',
+                             [ (uid, prop, key) for (prop, uid) in uids ])
+        self._db.execute('INSERT OR REPLACE INTO files (path, hash) VALUES (?, ?)', (key, filehash))
+
+    def remove(self, path: str):
+        key = self._key(path)
+        self._db.execute('DELETE FROM uids WHERE path = ?', (key,))
+        self._db.execute('DELETE FROM files WHERE path = ?', (key,))
+
+    def prune(self, topdir: str, paths: list) -> int:
+        """Drop entries below topdir for files not listed in paths."""
+        top = self._key(topdir)
+        keep = set([ self._key(p) for p in paths ])
+        stale = list()
+        for (key,) in self._db.execute('SELECT path FROM files'):
+            if (top != '.') and (key != top) and (not key.startswith(top + os.sep)):
+                continue
+            if key not in keep:
+                stale.append(key)
+        for key in stale:
+            if self._verbose > 1:
+                print("dropping {} from uid index".format(key))
+            self._db.execute('DELETE FROM uids WHERE path = ?', (key,))
+            self._db.execute('DELETE FROM files WHERE path = ?', (key,))
+        return len(stale)
+
+    def view(self, path: str):
+        """Return a set like view of the uids used by files other than path."""
+        return UIDView(self, path)
+
+
+class UIDView():
+    """Set like stand-in for MyICS.global_uidset backed by an UIDIndex."""
+
+    def __init__(self, index: UIDIndex, path: str):
+        self._index = index
+        self._path = path
+
+    def __contains__(self, uid) -> bool:
+        return self._index.taken(uid, self._path)
+
+    def update(self, uidset: dict):
+        # recorded by UIDIndex.update() once the file has been handled
+        pass
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains an uid index library. No need to call it directly.")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Small library to walk Radicale collection trees
+"""
+
+import os
+
+# --------------- magic here --------------- #
+
+
+def hidden(path: str) -> bool:
+    """Check for dotfiles, e.g. Radicale's .Radicale.props, .Radicale.lock or our temp files."""
+    return os.path.basename(path).startswith('.')
+
+
+def walk(topdir: str, verbose: int =0):
+    """Yield the item files below topdir, in sorted order, one directory at a time.
+
+    Follows the Radicale multifilesystem layout
+    (collection-root/user/collection/item.ics): dotfiles and dot
+    directories are Radicale metadata (.Radicale.cache with item caches and
+    sync-tokens, .Radicale.props, .Radicale.lock, .Radicale.tmp-*) and are
+    pruned without being descended into. Each directory is listed once
+    when it is entered, files created there later are not picked up.
+    """
+    stack = [ topdir ]
+    while stack:
+        directory = stack.pop()
+        files = list()
+        dirs = list()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError as err:
+            if verbose:
+                print(err)
+            continue
+        files.sort()
+        dirs.sort(reverse=True)
+        stack.extend(dirs)
+        yield from files
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains a collection walker library. No need to call it directly.")
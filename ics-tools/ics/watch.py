@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""
+Small library to watch a Radicale collection tree for changed items (Linux inotify)
+"""
+
+import os
+import time
+import errno
+import fcntl
+import struct
+import select
+import ctypes
+import ctypes.util
+
+from .walk import walk
+
+# --------------- magic here --------------- #
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# written items arrive closed after writing or renamed into place (Radicale
+# writes temporary files first), new collections as created/renamed directories
+WATCHMASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+event = struct.Struct('iIII')
+
+# Radicale's storage lock, in its filesystem_folder above collection-root
+LOCKFILE = '.Radicale.lock'
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc == None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ ctypes.c_int ]
+        _libc.inotify_add_watch.argtypes = [ ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 ]
+        _libc.inotify_rm_watch.argtypes = [ ctypes.c_int, ctypes.c_int ]
+    return _libc
+
+
+class Watcher():
+    """Recursive inotify watch on all (non dot) directories below topdir.
+
+    batches() yields the items written or deleted since the last batch,
+    once things calmed down for a moment.
+    """
+
+    def __init__(self, topdir: str, verbose: int =0):
+        self._verbose = verbose
+        self.topdir = topdir
+        self._wds = dict()
+        libc = _inotify()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._changed = dict()
+        self._deleted = dict()
+        self.overflow = False
+        self._add(topdir)
+
+    def _add(self, directory: str) -> list:
+        """Watch directory and its subdirectories, return the files found in them."""
+        stack = [ directory ]
+        files = list()
+        while stack:
+            d = stack.pop()
+            wd = _libc.inotify_add_watch(self._fd, os.fsencode(d), WATCHMASK)
+            if wd < 0:
+                if self._verbose:
+                    err = ctypes.get_errno()
+                    print("cannot watch {}: {}".format(d, os.strerror(err)))
+                continue
+            self._wds[wd] = d
+            try:
+                with os.scandir(d) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            files.append(entry.path)
+            except OSError:
+                continue
+        if self._verbose > 1:
+            print("watching {} directories".format(len(self._wds)))
+        return files
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _read(self, timeout: float) -> bool:
+        """Wait up to timeout (None: forever) for events and queue them, True if there were any."""
+        (ready, w, x) = select.select([ self._fd ], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            buf = os.read(self._fd, 65536)
+        except OSError as err:
+            if err.errno == errno.EAGAIN:
+                return False
+            raise
+        pos = 0
+        while pos < len(buf):
+            (wd, mask, cookie, length) = event.unpack_from(buf, pos)
+            name = buf[pos+event.size:pos+event.size+length].rstrip(b'\0')
+            pos += event.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+            directory = self._wds.get(wd)
+            if (directory == None) or (not name) or name.startswith(b'.'):
+                # Radicale metadata and temporary files
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # new collection (or user), items may be in already
+                    for f in self._add(path):
+                        self._changed[f] = 1
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._changed[path] = 1
+                self._deleted.pop(path, None)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._deleted[path] = 1
+                self._changed.pop(path, None)
+        return True
+
+    def batches(self, debounce: float =2.0, maxdelay: float =30.0):
+        """Yield (changed, deleted) lists of paths, forever.
+
+        A batch is complete once there was no event for debounce seconds
+        or maxdelay seconds after its first event, so a client pushing
+        thousands of items gives a few large batches. After an inotify
+        queue overflow, all items below topdir count as changed.
+        """
+        while True:
+            self._read(None)
+            first = time.monotonic()
+            while time.monotonic() - first < maxdelay:
+                if not self._read(min(debounce, max(0.0, maxdelay - (time.monotonic() - first)))):
+                    break
+            if self.overflow:
+                if self._verbose:
+                    print("inotify queue overflow, rescanning {}".format(self.topdir))
+                self.overflow = False
+                self._changed.update(dict.fromkeys(walk(self.topdir), 1))
+            changed = sorted(p for p in self._changed if os.path.isfile(p))
+            deleted = sorted(p for p in self._deleted if not os.path.exists(p))
+            self._changed = dict()
+            self._deleted = dict()
+            if changed or deleted:
+                yield (changed, deleted)
+
+
+
+def lockfile(topdir: str) -> str:
+    """Return the path of the storage lock of the store holding topdir, None if there is none."""
+    directory = os.path.abspath(topdir)
+    while True:
+        path = os.path.join(directory, LOCKFILE)
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+class StoreLock():
+    """Exclusive flock on Radicale's storage lock, as Radicale takes it to write.
+
+    While held, clients cannot write (or read) items, so a batch can be
+    read, fixed and replaced without overwriting a concurrent change.
+    Without a lock file (no Radicale store) it does nothing.
+    """
+
+    def __init__(self, path: str, verbose: int =0):
+        self.path = path
+        self._verbose = verbose
+        self._file = None
+
+    def __enter__(self):
+        if self.path != None:
+            self._file = open(self.path, 'a')
+            if self._verbose > 1:
+                print("waiting for {}".format(self.path))
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file != None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
+
+# --------------- end of magic --------------- #
+
+
+if __name__ == '__main__':
+    print("This file contains an inotify watch library. No need to call it directly.")
@@ -0,0 +1,78 @@
+"""
+Shared helpers for the ics-tools tests, run with `python3 -m pytest` from ics-tools
+"""
+
+import os
+import re
+import sys
+import subprocess
+
+import pytest
+
+TOOLS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOLS)
+
+from ics.bench import load_script
+
+
+def calendar(*components: str, eol: str ='\r\n') -> bytes:
+    """Return a VCALENDAR holding components (lines joined with \\n) as bytes."""
+    lines = [ 'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ics-tools//test//EN' ]
+    for comp in components:
+        lines.extend(comp.split('\n'))
+    lines.append('END:VCALENDAR')
+    return (eol.join(lines) + eol).encode('utf-8')
+
+
+def vevent(uid: str, *props: str) -> str:
+    """Return the lines of a VEVENT with uid and further property lines."""
+    return '\n'.join([ 'BEGIN:VEVENT', 'UID:' + uid, 'DTSTAMP:20200101T000000Z',
+                       'DTSTART:20200102T100000Z' ] + list(props) + [ 'END:VEVENT' ])
+
+
+def sample(events: int =10) -> str:
+    """Return a calendar (str, CRLF) with a VTIMEZONE and events with folded lines and alarms."""
+    lines = [ 'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ics-tools//test//EN',
+              'BEGIN:VTIMEZONE', 'TZID:Europe/Berlin', 'BEGIN:STANDARD', 'TZOFFSETFROM:+0200',
+              'TZOFFSETTO:+0100', 'DTSTART:19701025T030000', 'END:STANDARD', 'END:VTIMEZONE' ]
+    for i in range(events):
+        lines.extend([ 'BEGIN:VEVENT', 'UID:event-{}-uid'.format(i), 'DTSTAMP:20200101T000000Z',
+                       'DTSTART;TZID=Europe/Berlin:202003{:02d}T100000'.format(1 + i % 28),
+                       'SUMMARY:event {}'.format(i),
+                       'DESCRIPTION:a description long enough to be folded by the writer of',
+                       ' a calendar, continued on a second line\\nand a third {}'.format(i),
+                       'ATTENDEE;CN=Attendee {0}:mailto:attendee{0}@example.com'.format(i),
+                       'BEGIN:VALARM', 'ACTION:DISPLAY', 'TRIGGER:-PT15M', 'END:VALARM', 'END:VEVENT' ])
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+uuidregex = re.compile(rb'[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}')
+
+
+def snapshot(directory, pattern: str ='*.ics') -> dict:
+    """Contents of all files matching pattern below directory (a Path), generated UUIDs masked."""
+    return { str(p.relative_to(directory)): uuidregex.sub(b'<uuid>', p.read_bytes())
+             for p in sorted(directory.rglob(pattern)) }
+
+
+@pytest.fixture(autouse=True)
+def cachehome(tmp_path_factory, monkeypatch):
+    """Keep what the tools write below $XDG_CACHE_HOME out of the home directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path_factory.mktemp('cache')))
+
+
+@pytest.fixture
+def script():
+    """Import a hyphenated script by name, e.g. script('ics-fixer1')."""
+    return load_script
+
+
+@pytest.fixture
+def tool():
+    """Run a script as the command line would, returning the CompletedProcess."""
+    def run(name: str, *args, env: dict =None):
+        return subprocess.run([ sys.executable, os.path.join(TOOLS, name + '.py') ] + [ str(a) for a in args ],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=TOOLS,
+                              env=dict(os.environ, **(env or dict())))
+    return run
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from ics import parse_ics
+from ics.walk import walk
+from ics.bench import generate, make_tree
+
+from conftest import TOOLS
+
+
+def test_generate_reproducible_by_seed():
+    assert generate(5, seed=1) == generate(5, seed=1)
+    assert generate(5, seed=1) != generate(5, seed=2)
+    text = generate(5, alarms=2, timezones=3, attach=300)
+    assert all(len(l.encode('utf-8')) <= 75 for l in text.split('\r\n'))
+    data = parse_ics(text)['VCALENDAR']
+    assert len(data['VEVENT']) == 5
+    assert len(data['VTIMEZONE']) == 3
+    assert all(len(e['VALARM']) == 2 for e in data['VEVENT'])
+
+
+def test_make_tree_layout(tmp_path):
+    total = make_tree(str(tmp_path), users=2, collections=1, items=3)
+    items = list(walk(str(tmp_path)))
+    assert len(items) == 6
+    assert total == sum(os.path.getsize(p) for p in items)
+    collection = tmp_path / 'collection-root' / 'user1' / 'calendar0'
+    assert json.loads((collection / '.Radicale.props').read_text())['tag'] == 'VCALENDAR'
+    assert len(os.listdir(collection / '.Radicale.cache' / 'item')) == 3
+
+
+def test_bench_output(tmp_path):
+    output = tmp_path / 'bench.json'
+    subprocess.run([ sys.executable, '-m', 'ics.bench', '-f', '4', '-r', '1', '-o', str(output), '5' ],
+                   cwd=TOOLS, stdout=subprocess.DEVNULL, check=True)
+    run = json.loads(output.read_text())
+    assert run['events'] == 5
+    assert run['files'] == 4
+    assert set(run['results']) >= { 'parse_ics', 'MyICS.fix', 'uid-fixer scan' }
+
+
+@pytest.mark.parametrize('args', [ [ '-f', 'x' ], [ '-r', '1.5' ], [ '--alarms=many' ], [ 'lots' ] ])
+def test_bench_bad_numbers(args):
+    result = subprocess.run([ sys.executable, '-m', 'ics.bench' ] + args, cwd=TOOLS,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 2
+    assert result.stdout.startswith(b'invalid number for ')
+    assert result.stderr == b''
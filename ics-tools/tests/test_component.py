@@ -0,0 +1,42 @@
+import pickle
+
+import pytest
+
+from ics import Component, parse_ics
+
+from conftest import calendar, vevent
+
+
+def test_component_behaves_like_dict():
+    comp = Component('VEVENT', { 'UID': 'a', 'SUMMARY': 'x' })
+    comp['DTSTART'] = '20200101'
+    comp['SUMMARY'] = 'y'
+    assert comp.keys() == [ 'UID', 'SUMMARY', 'DTSTART' ]
+    assert comp['SUMMARY'] == 'y'
+    assert comp.get('LOCATION', '-') == '-'
+    assert 'UID' in comp
+    assert len(comp) == 3
+    del comp['UID']
+    with pytest.raises(KeyError):
+        comp['UID']
+    assert comp.pop('DTSTART') == '20200101'
+    assert comp.pop('DTSTART', None) == None
+    assert comp == { 'SUMMARY': 'y' }
+
+
+def test_rename_keeps_position():
+    comp = Component('VEVENT', { 'UID': 'a', 'DTSTART;TZID=X': '20200101T100000', 'VALARM': [ Component('VALARM') ] })
+    comp.rename('DTSTART;TZID=X', 'DTSTART;TZID=Europe/Berlin')
+    assert comp.keys() == [ 'UID', 'DTSTART;TZID=Europe/Berlin', 'VALARM' ]
+    assert comp['DTSTART;TZID=Europe/Berlin'] == '20200101T100000'
+    with pytest.raises(KeyError):
+        comp.rename('DTEND', 'DTEND;TZID=Y')
+
+
+def test_parsed_tree_uses_components_and_pickles():
+    data = parse_ics(str(calendar(vevent('a', 'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM')), 'utf-8'))
+    event = data['VCALENDAR']['VEVENT'][0]
+    assert isinstance(data['VCALENDAR'], Component)
+    assert isinstance(event['VALARM'][0], Component)
+    assert event.name == 'VEVENT'
+    assert pickle.loads(pickle.dumps(data)) == data
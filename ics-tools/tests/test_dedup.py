@@ -0,0 +1,72 @@
+import os
+
+from ics import parse_ics
+from ics.dedup import digest, items, unfold, DigestIndex
+
+from conftest import calendar, vevent
+
+DESCRIPTION = 'DESCRIPTION:' + 'long text ' * 20
+
+
+def fold(line: str, width: int) -> str:
+    return '\n '.join(line[i:i + width] for i in range(0, len(line), width))
+
+
+def item_digest(text: bytes) -> bytes:
+    return [ digest(c) for c in items(parse_ics(text.decode('utf-8'))['VCALENDAR']).values() ][0]
+
+
+def test_copies_hash_alike():
+    original = calendar(vevent('uid-1', 'SUMMARY:s', fold(DESCRIPTION, 75), 'ATTENDEE;ROLE=CHAIR;CN=A:mailto:a@example.org',
+                               'ATTENDEE:mailto:b@example.org', 'DTEND;TZID=Europe/Berlin:20200102T120000',
+                               'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM', 'BEGIN:VALARM\nTRIGGER:-PT1H\nEND:VALARM'))
+    copy = calendar(vevent('uid-2', 'BEGIN:VALARM\nTRIGGER:-PT1H\nX-WR-ALARMUID:x\nEND:VALARM', fold(DESCRIPTION, 40),
+                           'DTEND;TZID=W. Europe Standard Time:20200102T120000', 'ATTENDEE:mailto:b@example.org',
+                           'ATTENDEE;CN=A;ROLE=CHAIR:mailto:a@example.org', 'SUMMARY:s', 'CREATED:20200101T000000Z',
+                           'X-RADICALE-NAME:uid-2.ics', 'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM'), eol='\n')
+    assert item_digest(original) == item_digest(copy)
+    assert item_digest(original) != item_digest(original.replace(b'SUMMARY:s', b'SUMMARY:t'))
+    assert unfold('a\r\n b\n\tc') == 'abc'
+
+
+def test_index_keeps_first():
+    index = DigestIndex()
+    assert index.add('a.ics', b'1') == None
+    assert index.add('a.ics', b'2') == None
+    assert index.add('b.ics', b'1') == 'a.ics'
+    assert (index.items, index.duplicates, index.paths) == (3, 1, [ 'a.ics' ])
+
+
+def write(path, data: bytes, mtime: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+
+def test_report_and_remove(tmp_path, tool):
+    collection = tmp_path / 'c'
+    write(collection / 'z-original.ics', calendar(vevent('uid-1', 'SUMMARY:s')), 1000)
+    write(collection / 'a-copy.ics', calendar(vevent('uid-2', 'SUMMARY:s')), 2000)
+    write(collection / 'mixed.ics', calendar(vevent('uid-3', 'SUMMARY:s'), vevent('uid-4', 'SUMMARY:other')), 3000)
+    result = tool('ics-dedup', collection)
+    assert result.returncode == 0
+    assert result.stdout.decode().splitlines() == [
+        '{} (uid-2) duplicates an item of {}'.format(collection / 'a-copy.ics', collection / 'z-original.ics'),
+        '{} (uid-3) duplicates an item of {}'.format(collection / 'mixed.ics', collection / 'z-original.ics'),
+    ]
+    assert len(os.listdir(collection)) == 3
+    assert tool('ics-dedup', '-r', collection).returncode == 0
+    assert sorted(os.listdir(collection)) == [ 'mixed.ics', 'z-original.ics' ]
+    mixed = parse_ics((collection / 'mixed.ics').read_bytes().decode('utf-8'))
+    assert [ e['UID'] for e in mixed['VCALENDAR']['VEVENT'] ] == [ 'uid-4' ]
+
+
+def test_across_collections_oldest_first(tmp_path, tool):
+    write(tmp_path / 'a' / 'copy.ics', calendar(vevent('uid-2', 'SUMMARY:s')), 2000)
+    write(tmp_path / 'b' / 'original.ics', calendar(vevent('uid-1', 'SUMMARY:s')), 1000)
+    assert tool('ics-dedup', '-r', tmp_path).stdout == b''
+    result = tool('ics-dedup', '-r', '-a', tmp_path)
+    assert result.returncode == 0
+    assert b'duplicates an item of ' + str(tmp_path / 'b' / 'original.ics').encode() in result.stdout
+    assert not (tmp_path / 'a' / 'copy.ics').exists()
+    assert (tmp_path / 'b' / 'original.ics').exists()
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from conftest import calendar, vevent
+
+
+@pytest.mark.parametrize('lazy', [ False, True ])
+def test_only_changed_files_replaced(tmp_path, tool, lazy):
+    clean = tmp_path / 'clean.ics'
+    clean.write_bytes(calendar(vevent('clean-uid-1', 'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM')))
+    broken = tmp_path / 'broken.ics'
+    broken.write_bytes(calendar(vevent('broken uid', 'COLOR:red'), eol='\n'))
+    os.chmod(broken, 0o600)
+    before = { p: os.stat(p) for p in (clean, broken) }
+    args = [ '-l' ] if lazy else list()
+    result = tool('ics-fixer1', *(args + [ tmp_path ]))
+    assert result.returncode == 0
+    assert result.stdout.decode().splitlines() == [ '{} modified'.format(broken) ]
+    after = { p: os.stat(p) for p in (clean, broken) }
+    assert after[clean].st_ino == before[clean].st_ino
+    assert after[clean].st_mtime_ns == before[clean].st_mtime_ns
+    assert after[broken].st_ino != before[broken].st_ino
+    assert after[broken].st_mode == before[broken].st_mode
+    assert sorted(os.listdir(tmp_path)) == [ 'broken.ics', 'clean.ics' ]
+    written = broken.read_bytes()
+    assert b'COLOR' not in written
+    assert written.count(b'\n') == written.count(b'\r\n')
+
+
+def test_fix_counts_changes(script):
+    fixer = script('ics-fixer1')
+    cal = fixer.MyICS(data=calendar(vevent('a-1-b', 'COLOR:red', 'X-LIC-ERROR:x')))
+    assert cal.fixup()
+    assert cal.changes == 2
+    cal = fixer.MyICS(data=calendar(vevent('a-1-c')))
+    assert cal.fixup()
+    assert cal.changes == 0
+    assert cal.repairs == list()
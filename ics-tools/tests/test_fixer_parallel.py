@@ -0,0 +1,28 @@
+import shutil
+
+import pytest
+
+from conftest import calendar, vevent, snapshot
+
+
+def make_collection(directory):
+    directory.mkdir()
+    items = { 'a.ics': 'shared-1', 'b.ics': 'shared-2', 'c.ics': 'shared-1', 'd.ics': 'own-uid-4',
+              'e.ics': 'shared-2', 'f.ics': 'bad uid', 'g.ics': 'shared-1' }
+    for (name, uid) in items.items():
+        (directory / name).write_bytes(calendar(vevent(uid, 'SUMMARY:' + name)))
+
+
+@pytest.mark.parametrize('jobs', [ 1, 2, 3 ])
+def test_parallel_renames_like_serial(tmp_path, tool, jobs):
+    make_collection(tmp_path / 'serial')
+    shutil.copytree(tmp_path / 'serial', tmp_path / 'parallel')
+    assert tool('ics-fixer1', tmp_path / 'serial').returncode == 0
+    assert tool('ics-fixer1', '-j', jobs, tmp_path / 'parallel').returncode == 0
+    serial = snapshot(tmp_path / 'serial')
+    assert snapshot(tmp_path / 'parallel') == serial
+    # the first file keeps a shared UID, later ones get new ones
+    assert b'UID:shared-1' in serial['a.ics']
+    assert b'UID:<uuid>' in serial['c.ics']
+    assert b'UID:<uuid>' in serial['g.ics']
+    assert b'UID:<uuid>' in serial['f.ics']
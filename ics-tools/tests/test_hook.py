@@ -0,0 +1,69 @@
+import os
+import subprocess
+
+import pytest
+
+from ics.hook import changed_paths, item, ENVIRONMENT
+from ics.uid_index import UIDIndex
+
+from conftest import calendar, vevent
+
+
+def git(store, *args):
+    subprocess.run([ 'git', '-C', str(store), '-c', 'user.name=test', '-c', 'user.email=test@example.org' ] + list(args),
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A git versioned store with one committed collection."""
+    store = tmp_path / 'store'
+    (store / 'user' / 'cal').mkdir(parents=True)
+    for uid in ('uid-a', 'uid-b'):
+        (store / 'user' / 'cal' / (uid + '.ics')).write_bytes(calendar(vevent(uid)))
+    git(store, 'init', '-q')
+    git(store, 'add', '-A')
+    git(store, 'commit', '-q', '-m', 'initial')
+    return store
+
+
+def test_item():
+    assert item('user/cal/a.ics')
+    assert not item('user/cal/.Radicale.props')
+    assert not item('user/cal/.Radicale.cache/item/a.ics')
+
+
+def test_changed_paths_from_git(store, monkeypatch):
+    monkeypatch.delenv(ENVIRONMENT, raising=False)
+    assert changed_paths(str(store)) == list()
+    (store / 'user' / 'cal' / 'uid-a.ics').write_bytes(calendar(vevent('changed')))
+    (store / 'user' / 'cal' / 'uid-b.ics').unlink()
+    (store / 'user' / 'cal' / 'new.ics').write_bytes(calendar(vevent('new')))
+    (store / 'user' / 'cal' / '.Radicale.props').write_bytes(b'{}')
+    assert changed_paths(str(store)) == [ str(store / 'user' / 'cal' / name) for name in ('new.ics', 'uid-a.ics', 'uid-b.ics') ]
+    assert changed_paths(str(store.parent)) == None
+
+
+def test_changed_paths_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv(ENVIRONMENT, 'cal/b.ics\ncal/.Radicale.props\n\ncal/a.ics\ncal/b.ics\n')
+    assert changed_paths(str(tmp_path)) == [ str(tmp_path / 'cal' / 'a.ics'), str(tmp_path / 'cal' / 'b.ics') ]
+
+
+def test_fixer_hook(store, tmp_path, tool):
+    index = tmp_path / 'index.sqlite'
+    assert tool('ics-fixer1', '--hook', store).returncode == 2
+    assert tool('ics-fixer1', '-i', index, store).returncode == 0
+    clean = store / 'user' / 'cal' / 'uid-a.ics'
+    before = clean.stat()
+    # reuses the UID of an unchanged item, deletes another
+    (store / 'user' / 'cal' / 'new.ics').write_bytes(calendar(vevent('uid-a')))
+    (store / 'user' / 'cal' / 'uid-b.ics').unlink()
+    result = tool('ics-fixer1', '--hook', '-i', index, store, env={ ENVIRONMENT: '' })
+    assert result.returncode == 0
+    assert result.stdout.decode().splitlines() == [ '{} modified'.format(store / 'user' / 'cal' / 'new.ics') ]
+    assert clean.stat().st_ino == before.st_ino
+    assert b'UID:uid-a' not in (store / 'user' / 'cal' / 'new.ics').read_bytes()
+    uids = UIDIndex(str(index))
+    assert uids.owners('uid-b') == list()
+    assert uids.owners('uid-a') == [ str(clean) ]
+    uids.close()
@@ -0,0 +1,39 @@
+import io
+
+from ics import parse_ics, write_ics_stream
+from ics.ics_lazy import LazyComponent, parse_ics_lazy
+from conftest import calendar, vevent, sample
+
+
+def test_lazy_values_match_eager_parse():
+    text = sample(30)
+    assert parse_ics_lazy(text.encode('utf-8')) == parse_ics(text)
+
+
+def test_raw_spans_until_changed():
+    source = calendar(vevent('a', 'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM'), vevent('b'))
+    data = parse_ics_lazy(source)
+    (a, b) = data['VCALENDAR']['VEVENT']
+    assert isinstance(a, LazyComponent)
+    assert a.raw() == b'\r\n'.join(source.split(b'\r\n')[3:11]) + b'\r\n'
+    a['VALARM'][0]['TRIGGER'] = '-PT10M'
+    assert a.raw() == None
+    assert b.raw() != None
+    b.rename('DTSTART', 'DTSTART;VALUE=DATE-TIME')
+    assert b.raw() == None
+
+
+def test_repaired_components_not_raw():
+    source = calendar(vevent('a', 'DESCRIPTION:one', '\\ntwo'), vevent('b'), 'BEGIN:VTODO\nUID:t\nEND:VTODO')
+    data = parse_ics_lazy(source)
+    (a, b) = data['VCALENDAR']['VEVENT']
+    assert a.raw() == None
+    assert b.raw() == (vevent('b') + '\n').replace('\n', '\r\n').encode('utf-8')
+    assert data['VCALENDAR']['VTODO'][0].raw() == b'BEGIN:VTODO\r\nUID:t\r\nEND:VTODO\r\n'
+
+
+def test_unchanged_lazy_tree_written_as_is():
+    source = sample(10).encode('utf-8')
+    out = io.BytesIO()
+    assert write_ics_stream(parse_ics_lazy(source), out)
+    assert out.getvalue() == source
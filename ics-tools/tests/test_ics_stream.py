@@ -0,0 +1,30 @@
+import io
+
+from ics import parse_ics, iter_ics, parse_ics_file
+from ics.component import Component
+from conftest import calendar, vevent, sample
+
+
+def test_iter_ics_yields_components_in_order():
+    data = calendar('BEGIN:VTIMEZONE\nTZID:Europe/Berlin\nEND:VTIMEZONE', vevent('a'), vevent('b'),
+                    'BEGIN:VTODO\nUID:c\nEND:VTODO')
+    items = list(iter_ics(io.BytesIO(data)))
+    names = [ (name, comp.get('UID')) for (name, comp) in items ]
+    assert names == [ ('VTIMEZONE', None), ('VEVENT', 'a'), ('VEVENT', 'b'), ('VTODO', 'c'), ('VCALENDAR', None) ]
+    assert all(isinstance(comp, Component) for (name, comp) in items)
+    assert list(items[-1][1].keys()) == [ 'VERSION', 'PRODID' ]
+
+
+def test_parse_ics_file_matches_parse_ics():
+    text = sample(50)
+    assert parse_ics_file(io.BytesIO(text.encode('utf-8'))) == parse_ics(text)
+    assert parse_ics_file(io.StringIO(text)) == parse_ics(text)
+
+
+def test_parse_ics_file_keeps_header_first():
+    data = parse_ics_file(io.BytesIO(calendar(vevent('a'))))
+    assert list(data['VCALENDAR'].keys()) == [ 'VERSION', 'PRODID', 'VEVENT' ]
+
+
+def test_parse_ics_file_rejects_non_ics():
+    assert parse_ics_file(io.BytesIO(b'BEGIN:VCARD\r\nEND:VCARD\r\n')) == None
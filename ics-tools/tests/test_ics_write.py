@@ -0,0 +1,46 @@
+import io
+
+from ics import parse_ics, write_ics_stream
+from ics.ics_write import fold, component_bytes
+from ics.ics_lazy import parse_ics_lazy
+from ics.tokenizer import parse_lines
+from conftest import calendar, vevent, sample
+
+
+def test_fold_at_75_octets_without_splitting_utf8():
+    line = ('DESCRIPTION:' + 'café ' * 40).encode('utf-8')
+    folded = fold(line)
+    parts = folded.split(b'\r\n')
+    assert all(len(p) <= 75 for p in parts)
+    assert all(p.startswith(b' ') for p in parts[1:])
+    assert b''.join([ parts[0] ] + [ p[1:] for p in parts[1:] ]) == line
+    for p in parts:
+        p.decode('utf-8')
+    assert fold(b'SUMMARY:short') == b'SUMMARY:short'
+
+
+def test_stream_round_trip():
+    text = sample(20)
+    data = parse_ics(text)
+    out = io.BytesIO()
+    assert write_ics_stream(data, out)
+    written = out.getvalue()
+    assert written.count(b'\n') == written.count(b'\r\n')
+    assert max(len(l) for l in written.split(b'\r\n')) <= 75
+    assert parse_lines(written.splitlines()) == data
+
+
+def test_lazy_lf_source_written_with_crlf_only():
+    source = calendar(vevent('bad uid'), 'BEGIN:VTODO\nUID:t-1-x\nEND:VTODO', eol='\n')
+    data = parse_ics_lazy(source)
+    data['VCALENDAR']['VEVENT'][0]['UID'] = 'fixed-uid-1'
+    out = io.BytesIO()
+    write_ics_stream(data, out)
+    written = out.getvalue()
+    assert written.count(b'\n') == written.count(b'\r\n')
+    assert b'BEGIN:VTODO\r\nUID:t-1-x\r\nEND:VTODO\r\n' in written
+    assert component_bytes('VTODO', data['VCALENDAR']['VTODO'][0]) == b'BEGIN:VTODO\r\nUID:t-1-x\r\nEND:VTODO\r\n'
+
+
+def test_not_ics_data():
+    assert not write_ics_stream({ 'VCARD': None }, io.BytesIO())
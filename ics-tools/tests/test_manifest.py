@@ -0,0 +1,55 @@
+import os
+import json
+
+import pytest
+
+from ics.manifest import Manifest, fingerprint
+
+from conftest import calendar, vevent, snapshot
+
+
+def test_manifest_clean_by_stat_then_hash(tmp_path):
+    item = tmp_path / 'a.ics'
+    item.write_bytes(calendar(vevent('a')))
+    manifest = Manifest(str(tmp_path / 'manifest.json'), 'v1')
+    manifest.record(str(item), 'hash-a', [ 'a' ])
+    assert manifest.clean(str(item))['uids'] == [ 'a' ]
+    os.utime(item, ns=(0, 0))
+    assert manifest.clean(str(item)) == None
+    assert manifest.same(str(item), 'other-hash') == None
+    assert manifest.same(str(item), 'hash-a') != None
+    # refreshed, clean on stat alone again
+    assert manifest.clean(str(item)) != None
+    assert manifest.save()
+    assert Manifest(str(tmp_path / 'manifest.json'), 'v1').clean(str(item)) != None
+    assert Manifest(str(tmp_path / 'manifest.json'), 'v2').clean(str(item)) == None
+
+
+def test_fingerprint_follows_source():
+    def one():
+        return 1
+    def two():
+        return 2
+    assert fingerprint(one) == fingerprint(one)
+    assert fingerprint(one) != fingerprint(two)
+
+
+@pytest.mark.parametrize('jobs', [ 0, 2 ])
+def test_clean_files_skipped_and_keep_uids(tmp_path, tool, jobs):
+    collection = tmp_path / 'c'
+    collection.mkdir()
+    for uid in ('uid-a', 'uid-b', 'uid-c'):
+        (collection / (uid + '.ics')).write_bytes(calendar(vevent(uid)))
+    manifest = tmp_path / 'manifest.json'
+    stats = tmp_path / 'metrics.json'
+    assert tool('ics-fixer1', '-j', jobs, '-m', manifest, collection).returncode == 0
+    assert sorted(json.loads(manifest.read_text())['files']) == [ 'c/uid-a.ics', 'c/uid-b.ics', 'c/uid-c.ics' ]
+    # a new item reusing the UID of a clean one sorts first
+    (collection / '0.ics').write_bytes(calendar(vevent('uid-b')))
+    assert tool('ics-fixer1', '-j', jobs, '-m', manifest, '--metrics', stats, collection).returncode == 0
+    run = json.loads(stats.read_text())
+    assert run['skipped_unchanged'] == 3
+    assert run['files_modified'] == 1
+    result = snapshot(collection)
+    assert b'UID:<uuid>' in result['0.ics']
+    assert b'UID:uid-b' in result['uid-b.ics']
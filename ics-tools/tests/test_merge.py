@@ -0,0 +1,59 @@
+import json
+
+from ics import parse_ics
+from ics.timeindex import span
+from ics.bench import generate
+
+from conftest import calendar, vevent
+
+
+def items(data: dict) -> dict:
+    return { (e['UID'], e.get('RECURRENCE-ID')): e for e in data['VCALENDAR']['VEVENT'] }
+
+
+def test_split_merge_round_trip(tmp_path, tool):
+    source = generate(30, alarms=1, timezones=2, seed=3)
+    (tmp_path / 'c').mkdir()
+    (tmp_path / 'c' / 'all.ics').write_bytes(source.encode('utf-8'))
+    assert tool('ics-splitter', tmp_path / 'c').returncode == 0
+    (tmp_path / 'c' / 'all.ics').unlink()
+    output = tmp_path / 'merged.ics'
+    result = tool('ics-merge', '-s', '-b', 4, '-o', output, tmp_path / 'c')
+    assert result.returncode == 0
+    original = parse_ics(source)
+    merged = parse_ics(output.read_bytes().decode('utf-8'))
+    assert items(merged) == items(original)
+    assert [ t['TZID'] for t in merged['VCALENDAR']['VTIMEZONE'] ] == [ t['TZID'] for t in original['VCALENDAR']['VTIMEZONE'] ]
+    starts = [ span(e)[0] for e in merged['VCALENDAR']['VEVENT'] ]
+    assert starts == sorted(starts)
+
+
+def test_first_item_per_uid_wins(tmp_path, tool):
+    (tmp_path / 'a.ics').write_bytes(calendar(vevent('uid-a', 'SUMMARY:first')))
+    (tmp_path / 'b.ics').write_bytes(calendar(vevent('uid-a', 'SUMMARY:second'),
+                                              vevent('uid-a', 'RECURRENCE-ID:20200109T100000Z')))
+    result = tool('ics-merge', tmp_path)
+    assert result.returncode == 0
+    merged = items(parse_ics(result.stdout.decode('utf-8')))
+    assert sorted(merged, key=str) == [ ('uid-a', '20200109T100000Z'), ('uid-a', None) ]
+    assert merged[('uid-a', None)]['SUMMARY'] == 'first'
+
+
+def test_stdout_holds_only_the_calendar(tmp_path, tool):
+    (tmp_path / 'a.ics').write_bytes(calendar(vevent('uid-a')))
+    (tmp_path / 'b.ics').write_bytes(calendar(vevent('uid-a')))
+    (tmp_path / 'junk.ics').write_bytes(b'junk')
+    result = tool('ics-merge', '-v', '-s', '--profile', '--metrics=-', tmp_path)
+    assert result.returncode == 0
+    assert result.stdout.startswith(b'BEGIN:VCALENDAR\r\n')
+    assert result.stdout.endswith(b'END:VCALENDAR\r\n')
+    assert result.stdout.count(b'BEGIN:VEVENT') == 1
+    assert b'duplicate UID uid-a' in result.stderr
+    assert b'slowest files:' in result.stderr
+    run = json.loads([ l for l in result.stderr.decode().splitlines() if l.startswith('{') ][0])
+    assert (run['items_written'], run['duplicates'], run['skipped_not_ics']) == (1, 1, 1)
+
+
+def test_usage_errors(tmp_path, tool):
+    assert tool('ics-merge', '-b', 'x', tmp_path).returncode == 2
+    assert tool('ics-merge', tmp_path / 'missing').returncode == 1
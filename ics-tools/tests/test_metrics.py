@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from ics import parse_ics
+from ics.metrics import Metrics
+
+from conftest import calendar, vevent
+
+
+def test_counters_and_merge(tmp_path):
+    metrics = Metrics()
+    metrics.count('files_scanned')
+    assert metrics.counters == dict()
+    metrics.enable(str(tmp_path / 'metrics.json'), 'test')
+    metrics.count('files_scanned', 2)
+    metrics.skip('empty')
+    metrics.skip(None)
+    metrics.error('parse')
+    metrics.tree(parse_ics(calendar(vevent('a', 'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM')).decode('utf-8')))
+    metrics.ruleset([ ('color', 2, 1, 0.0) ])
+    metrics.merge({ 'counters': { 'files_scanned': 1 }, 'components': { 'VEVENT': 1 }, 'errors': dict() })
+    assert metrics.save()
+    assert metrics.save()
+    runs = [ json.loads(l) for l in (tmp_path / 'metrics.json').read_text().splitlines() ]
+    assert len(runs) == 2
+    run = runs[0]
+    assert run['tool'] == 'test'
+    assert (run['files_scanned'], run['files_skipped'], run['files_modified']) == (3, 2, 0)
+    assert (run['skipped_empty'], run['skipped_unknown']) == (1, 1)
+    assert run['components'] == { 'VCALENDAR': 1, 'VEVENT': 2, 'VALARM': 1 }
+    assert run['rules'] == { 'color': 1 }
+    assert run['errors'] == { 'parse': 1 }
+
+
+@pytest.mark.parametrize('name,args,skipped', [
+    ('ics-fixer1', [ '-j', 2 ], { 'skipped_not_ics': 1 }),
+    ('ics-splitter', [], { 'skipped_not_ics': 1, 'skipped_single_entry': 1 }),
+    ('ics-uid-fixer', [ '-s' ], { 'skipped_empty': 1 }),
+])
+def test_tools_count_files_and_bytes(tmp_path, tool, name, args, skipped):
+    collection = tmp_path / 'c'
+    collection.mkdir()
+    (collection / 'a.ics').write_bytes(calendar(vevent('bad uid')))
+    (collection / 'b.ics').write_bytes(calendar(vevent('uid-b'), vevent('uid-c')))
+    (collection / 'empty.ics').write_bytes(b'')
+    size = sum(p.stat().st_size for p in collection.iterdir())
+    result = tool(name, *(args + [ '--metrics=-', collection ]))
+    assert result.returncode == 0
+    run = json.loads(result.stdout.decode().splitlines()[-1])
+    assert run['files_scanned'] == 3
+    assert run['files_skipped'] == sum(skipped.values())
+    assert { k: v for (k, v) in run.items() if k.startswith('skipped_') } == skipped
+    assert run['files_modified'] + run.get('files_split', 0) == 1
+    assert run['bytes_read'] >= size
+    assert run['bytes_written'] > 0
+
+
+def test_manifest_skips_quietly(tmp_path, tool):
+    (tmp_path / 'junk.ics').write_bytes(b'junk\n')
+    manifest = tmp_path / 'manifest.json'
+    result = tool('ics-fixer1', '-m', manifest, '--metrics=-', '-f', tmp_path / 'junk.ics')
+    assert result.returncode == 0
+    lines = result.stdout.decode().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])['skipped_not_ics'] == 1
+    result = tool('ics-fixer1', '-m', manifest, '--metrics=-', '-f', tmp_path / 'gone.ics')
+    run = json.loads(result.stdout.decode().splitlines()[-1])
+    assert (run['errors'], run['files_skipped']) == ({ 'read': 1 }, 0)
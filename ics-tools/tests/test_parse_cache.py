@@ -0,0 +1,111 @@
+import os
+import json
+
+import pytest
+
+from ics import parse_ics
+from ics.ics_lazy import parse_ics_lazy
+from ics.parse_cache import ParseCache
+from ics.bench import generate
+
+from conftest import calendar, vevent
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ParseCache()
+    cache.enable(str(tmp_path / 'cache'))
+    return cache
+
+
+def test_store_and_load(cache):
+    source = generate(5, alarms=1, timezones=1).encode('utf-8')
+    assert cache.load(source, 'eager') == None
+    assert cache.store(source, 'eager', parse_ics(source.decode('utf-8')), [ (1, 'binary blob') ])
+    (data, repairs) = cache.load(source, 'eager')
+    assert data == parse_ics(source.decode('utf-8'))
+    assert repairs == [ (1, 'binary blob') ]
+    assert cache.load(source, 'lazy') == None
+    assert cache.load(source + b'\r\n', 'eager') == None
+    assert not ParseCache().store(source, 'eager', data)
+
+
+def test_lazy_components_keep_raw_spans(cache):
+    source = calendar(vevent('a'), vevent('b'))
+    lazy = parse_ics_lazy(source)
+    raw = [ e.raw() for e in lazy['VCALENDAR']['VEVENT'] ]
+    assert cache.store(source, 'lazy', lazy)
+    (data, repairs) = cache.load(source, 'lazy')
+    assert [ e.raw() for e in data['VCALENDAR']['VEVENT'] ] == raw
+    data['VCALENDAR']['VEVENT'][0]['SUMMARY'] = 'changed'
+    assert data['VCALENDAR']['VEVENT'][0].raw() == None
+
+
+def test_broken_entry_dropped(cache):
+    source = calendar(vevent('a'))
+    cache.store(source, 'eager', parse_ics(source.decode('utf-8')))
+    path = cache._path(source, 'eager')
+    with open(path, 'wb') as file_handle:
+        file_handle.write(b'garbage')
+    assert cache.load(source, 'eager') == None
+    assert not os.path.exists(path)
+
+
+def test_evict_least_recently_used(cache):
+    sources = [ calendar(vevent('uid-{}'.format(i), 'DESCRIPTION:' + os.urandom(2000).hex())) for i in range(10) ]
+    for (i, source) in enumerate(sources):
+        cache.store(source, 'eager', parse_ics(source.decode('utf-8')))
+        os.utime(cache._path(source, 'eager'), (i, i))
+    cache.load(sources[0], 'eager')
+    size = os.path.getsize(cache._path(sources[0], 'eager'))
+    cache.maxsize = size * 5
+    assert cache.evict() == 6
+    assert [ i for (i, s) in enumerate(sources) if cache.load(s, 'eager') != None ] == [ 0, 7, 8, 9 ]
+
+
+def test_fixer_and_splitter_share_entries(tmp_path, tool):
+    source = calendar(vevent('uid-a'), vevent('uid-b'))
+    for name in ('split', 'fix'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'all.ics').write_bytes(source)
+    cachedir = tmp_path / 'cache'
+    stats = tmp_path / 'metrics.json'
+    assert tool('ics-splitter', '--cache', '--cachedir', cachedir, tmp_path / 'split').returncode == 0
+    assert tool('ics-fixer1', '--cache', '--cachedir', cachedir, '--metrics', stats, tmp_path / 'fix').returncode == 0
+    run = json.loads(stats.read_text())
+    assert (run['cache_hits'], run.get('cache_misses', 0)) == (1, 0)
+    assert tool('ics-fixer1', '--cache', '--cachesize=x', tmp_path / 'fix').returncode == 2
+
+
+def test_store_keeps_lazy_values(cache):
+    source = calendar(vevent('a', 'SUMMARY:s'))
+    lazy = parse_ics_lazy(source)
+    event = lazy['VCALENDAR']['VEVENT'][0]
+    assert cache.store(source, 'lazy', lazy)
+    assert all(type(v) is tuple for v in event._values)
+    assert cache.load(source, 'lazy')[0]['VCALENDAR']['VEVENT'][0]._values == event.values()
+
+
+def test_close_scans_once_until_full(cache):
+    scans = list()
+    evict = cache.evict
+    cache.evict = lambda: scans.append(1) or evict()
+    sources = [ calendar(vevent('uid-{}'.format(i), 'DESCRIPTION:' + os.urandom(2000).hex())) for i in range(4) ]
+    cache.store(sources[0], 'eager', parse_ics(sources[0].decode('utf-8')))
+    size = os.path.getsize(cache._path(sources[0], 'eager'))
+    cache.maxsize = size * 3.5
+    cache.close()
+    cache.store(sources[1], 'eager', parse_ics(sources[1].decode('utf-8')))
+    cache.close()
+    assert len(scans) == 1
+    # entries stored by a worker process count as well
+    cache.store(sources[2], 'eager', parse_ics(sources[2].decode('utf-8')))
+    cache.merge(size)
+    cache.close()
+    assert len(scans) == 2
+    cache.store(sources[3], 'eager', parse_ics(sources[3].decode('utf-8')))
+    for (i, source) in enumerate(sources):
+        os.utime(cache._path(source, 'eager'), (i, i))
+    cache.close()
+    assert len(scans) == 3
+    assert [ i for (i, s) in enumerate(sources) if cache.load(s, 'eager') != None ] == [ 1, 2, 3 ]
@@ -0,0 +1,59 @@
+import pstats
+
+import pytest
+
+from ics.profiling import Profile
+
+from conftest import calendar, vevent
+
+
+def test_disabled_profile_records_nothing():
+    profile = Profile()
+    profile.file('a.ics')
+    with profile.phase('read') as phase:
+        phase.bytes = 10
+    assert list(profile.timed('walk', [ 1, 2 ])) == [ 1, 2 ]
+    assert profile.snapshot() == { 'phases': dict(), 'files': dict() }
+
+
+def test_phases_per_file_and_merge():
+    profile = Profile()
+    profile.enable()
+    assert list(profile.timed('walk', [ 'a.ics', 'b.ics' ])) == [ 'a.ics', 'b.ics' ]
+    profile.file('a.ics')
+    with profile.phase('read') as phase:
+        phase.bytes = 10
+    with profile.phase('parse', 10):
+        pass
+    assert profile.phases['walk'][2] == 3
+    assert profile.phases['read'][1:] == [ 10, 1 ]
+    assert set(profile.files) == { 'a.ics' }
+    assert set(profile.files['a.ics']) == { 'read', 'parse' }
+    other = Profile()
+    other.enable()
+    other.file('b.ics')
+    other.add('read', 1.0, 20)
+    profile.merge(other.snapshot())
+    assert profile.phases['read'][1:] == [ 30, 2 ]
+    assert profile.files['b.ics']['read'] == [ 1.0, 20 ]
+
+
+@pytest.mark.parametrize('jobs', [ 0, 2 ])
+def test_fixer_report(tmp_path, tool, jobs):
+    collection = tmp_path / 'c'
+    collection.mkdir()
+    for uid in ('uid-a', 'uid-b', 'uid-c'):
+        (collection / (uid + '.ics')).write_bytes(calendar(vevent(uid)))
+    stats = tmp_path / 'fixer.pstats'
+    result = tool('ics-fixer1', '-j', jobs, '--profile', '--slowest=2', '--pstats', stats, collection)
+    assert result.returncode == 0
+    lines = result.stdout.decode().splitlines()
+    header = [ l.split() for l in lines ].index([ 'phase', 'seconds', 'calls', 'bytes', 'MB/s' ])
+    table = lines[header + 1:lines.index('slowest files:')]
+    calls = { l.split()[0]: int(l.split()[2]) for l in table }
+    # with -j the UIDs are collected in a first pass, so files are read twice
+    assert calls['fix'] == 3
+    assert calls['read'] == (6 if jobs else 3)
+    slowest = lines[lines.index('slowest files:') + 1:]
+    assert len(slowest) == 2
+    pstats.Stats(str(stats))
@@ -0,0 +1,94 @@
+import calendar as cal
+from datetime import datetime
+
+import pytz
+import pytest
+from dateutil.rrule import rrulestr
+
+from ics import recur
+from ics.recur import expand, simple, parts
+
+from conftest import calendar, vevent
+
+RULES = [
+    'FREQ=DAILY',
+    'FREQ=DAILY;INTERVAL=3;COUNT=40',
+    'FREQ=WEEKLY;BYDAY=MO,WE,FR',
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,TU;WKST=SU',
+    'FREQ=WEEKLY;UNTIL=20200601T000000Z',
+    'FREQ=MONTHLY;BYMONTHDAY=1,15,-1',
+    'FREQ=MONTHLY;BYMONTHDAY=31;COUNT=10',
+    'FREQ=MONTHLY;BYDAY=2TU',
+    'FREQ=YEARLY;BYMONTH=3,10;BYDAY=-1SU',
+]
+
+STARTS = [ ('DTSTART;TZID=Europe/Berlin', '20200131T023000'), ('DTSTART', '20200131T023000Z'),
+           ('DTSTART;VALUE=DATE', '20200131') ]
+
+
+def epoch(value: str) -> int:
+    return cal.timegm(datetime.strptime(value, '%Y%m%dT%H%M%S').timetuple())
+
+
+def window(index: int) -> tuple:
+    start = epoch('20200101T000000') + index * 53 * 86400
+    return (start, start + 120 * 86400)
+
+
+def test_simple_rules():
+    assert simple(parts('FREQ=WEEKLY;BYDAY=MO,TH'))
+    assert not simple(parts('FREQ=MONTHLY;BYDAY=2TU'))
+    assert not simple(parts('FREQ=YEARLY'))
+    assert not simple(parts('FREQ=DAILY;INTERVAL=0'))
+
+
+@pytest.mark.parametrize('rule', RULES)
+@pytest.mark.parametrize('dtkey,dtvalue', STARTS)
+def test_numpy_matches_dateutil(monkeypatch, rule, dtkey, dtvalue):
+    pytest.importorskip('numpy')
+    for i in range(4):
+        (start, end) = window(i)
+        vectorised = expand.__wrapped__('x', dtkey, dtvalue, rule, (), (), start, end, 3600)
+        monkeypatch.setattr(recur, 'numpy', None)
+        plain = expand.__wrapped__('x', dtkey, dtvalue, rule, (), (), start, end, 3600)
+        monkeypatch.undo()
+        assert vectorised == plain
+
+
+@pytest.mark.parametrize('rule', RULES)
+def test_wall_clock_expansion(rule):
+    berlin = pytz.timezone('Europe/Berlin')
+    local0 = datetime(2020, 1, 31, 2, 30)
+    text = ';'.join(p for p in rule.split(';') if not p.startswith('UNTIL'))
+    until = berlin.localize(datetime(2020, 6, 1, 2, 0)) if 'UNTIL' in rule else None
+    for i in range(4):
+        (start, end) = window(i)
+        expected = list()
+        # DTSTART is the first instance, even if the rule does not match it
+        days = { local0 } | set(rrulestr(text, dtstart=local0).between(datetime(2019, 12, 1), datetime(2021, 4, 1), inc=True))
+        for d in sorted(days):
+            t = cal.timegm(berlin.localize(d).utctimetuple())
+            if ((until == None) or (t <= cal.timegm(until.utctimetuple()))) and (start - 3600 < t < end):
+                expected.append(t)
+        assert list(expand('x', 'DTSTART;TZID=Europe/Berlin', '20200131T023000', rule, (), (), start, end, 3600)) == expected
+
+
+def test_rdate_and_exdate():
+    rdates = (('RDATE', '20200105T100000Z,20200106T100000Z/PT1H'), )
+    exdates = (('EXDATE', '20200103T100000Z'), )
+    result = expand('x', 'DTSTART', '20200101T100000Z', 'FREQ=DAILY;COUNT=3', rdates, exdates,
+                    epoch('20200101T000000'), epoch('20200201T000000'))
+    assert result == tuple(epoch(t) for t in ('20200101T100000', '20200102T100000', '20200105T100000', '20200106T100000'))
+
+
+def test_query_lists_instances(tmp_path, tool):
+    (tmp_path / 'weekly.ics').write_bytes(calendar(vevent('weekly', 'DURATION:PT1H', 'RRULE:FREQ=WEEKLY;COUNT=3')))
+    (tmp_path / 'once.ics').write_bytes(calendar(vevent('once', 'DURATION:PT1H')))
+    result = tool('ics-timeindex', 'query', '--from=2020-01-01', '--to=2020-02-01', tmp_path)
+    assert result.returncode == 0
+    assert [ l.split()[:3] for l in result.stdout.decode().splitlines() ] == [
+        [ '2020-01-02T10:00:00Z', '2020-01-02T11:00:00Z', 'once' ],
+        [ '2020-01-02T10:00:00Z', '2020-01-02T11:00:00Z', 'weekly' ],
+        [ '2020-01-09T10:00:00Z', '2020-01-09T11:00:00Z', 'weekly' ],
+        [ '2020-01-16T10:00:00Z', '2020-01-16T11:00:00Z', 'weekly' ],
+    ]
@@ -0,0 +1,56 @@
+from ics import parse_ics
+from ics.rules import RuleEngine
+
+from conftest import calendar, vevent
+
+
+def test_rules_matched_by_component_and_prefix():
+    engine = RuleEngine()
+    seen = list()
+
+    @engine.rule('component', [ 'VEVENT' ])
+    def component(context, comp, key):
+        seen.append(('component', comp.name, key))
+
+    @engine.rule('drop', [ 'VEVENT', 'VALARM' ], [ 'X-' ])
+    def drop(context, comp, key):
+        seen.append(('drop', comp.name, key))
+        del comp[key]
+        return 1
+
+    data = parse_ics(calendar(vevent('a', 'X-ONE:1', 'SUMMARY:s', 'BEGIN:VALARM\nX-TWO:2\nEND:VALARM'),
+                              'BEGIN:VTODO\nUID:t\nX-THREE:3\nEND:VTODO').decode('utf-8'))
+    assert engine.run(data['VCALENDAR']) == 2
+    assert seen == [ ('component', 'VEVENT', None), ('drop', 'VEVENT', 'X-ONE'), ('drop', 'VALARM', 'X-TWO') ]
+    event = data['VCALENDAR']['VEVENT'][0]
+    assert 'X-ONE' not in event
+    assert 'X-TWO' not in event['VALARM'][0]
+    assert data['VCALENDAR']['VTODO'][0]['X-THREE'] == '3'
+
+
+def test_stats_merge_and_reset():
+    engine = RuleEngine()
+
+    @engine.rule('summary', [ 'VEVENT' ], [ 'SUMMARY' ])
+    def summary(context, comp, key):
+        return int(comp[key] == 'change')
+
+    data = parse_ics(calendar(vevent('a', 'SUMMARY:change'), vevent('b', 'SUMMARY:keep')).decode('utf-8'))
+    assert engine.run(data['VCALENDAR']) == 1
+    assert [ s[:3] for s in engine.stats() ] == [ ('summary', 2, 1) ]
+    engine.merge(engine.stats())
+    assert [ s[:3] for s in engine.stats() ] == [ ('summary', 4, 2) ]
+    engine.reset()
+    assert engine.stats() == [ ('summary', 0, 0, 0.0) ]
+
+
+def test_fixer_stats(tmp_path, tool):
+    (tmp_path / 'a.ics').write_bytes(calendar(vevent('a-1-b', 'COLOR:red')))
+    result = tool('ics-fixer1', '-s', tmp_path)
+    assert result.returncode == 0
+    lines = result.stdout.decode().splitlines()
+    assert lines[0] == '{} modified'.format(tmp_path / 'a.ics')
+    assert lines[1].split() == [ 'rule', 'calls', 'fired', 'seconds' ]
+    report = { l.split()[0]: l.split()[1:3] for l in lines[2:] }
+    assert report['color'] == [ '1', '1' ]
+    assert report['unique-uid'] == [ '1', '0' ]
@@ -0,0 +1,37 @@
+import pytest
+
+from ics.sniff import classify, sniff
+
+from conftest import calendar, vevent
+
+
+@pytest.mark.parametrize('head,kind', [
+    (b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n', 'ical'),
+    (b'\x00\x01junkBEGIN:VCALENDAR\nVERSION:2.0\n', 'ical'),
+    (b'X-' + b'A' * 600 + b'BEGIN:VCALENDAR', 'ical'),
+    (b'\xef\xbb\xbfBEGIN:VCARD\r\n', 'vcard'),
+    (b'{"tag": "VCALENDAR"}', 'radicale'),
+    (b'', 'empty'),
+    (b'PK\x03\x04binary\nBEGIN:VCALENDAR\n', 'junk'),
+])
+def test_classify(head, kind):
+    assert classify(head) == kind
+
+
+def test_sniff_reads_only_the_head(tmp_path):
+    item = tmp_path / 'item.ics'
+    item.write_bytes(calendar(vevent('a')))
+    assert sniff(str(item)) == 'ical'
+    assert sniff(str(item), 4) == 'junk'
+    assert sniff(str(tmp_path / '.Radicale.props')) == None
+    (tmp_path / '.Radicale.props').write_bytes(b'BEGIN:VCALENDAR\n')
+    assert sniff(str(tmp_path / '.Radicale.props')) == 'radicale'
+
+
+def test_fixer_skips_junk(tmp_path, tool):
+    (tmp_path / 'backup.ics').write_bytes(b'PK\x03\x04' + bytes(4096))
+    (tmp_path / 'a.ics').write_bytes(calendar(vevent('bad uid')))
+    result = tool('ics-fixer1', '--metrics=-', tmp_path)
+    assert result.returncode == 0
+    assert b'"skipped_not_ics": 1' in result.stdout
+    assert (tmp_path / 'backup.ics').read_bytes() == b'PK\x03\x04' + bytes(4096)
@@ -0,0 +1,33 @@
+import os
+
+from ics import parse_ics
+from conftest import calendar, vevent, sample
+
+
+def test_mmapsplit_matches_parsed_split(tmp_path, script):
+    splitter = script('ics-splitter')
+    text = sample(20)
+    source = tmp_path / 'all.ics'
+    source.write_bytes(text.encode('utf-8'))
+    assert splitter.mmapsplit(str(source)) == 20
+    expected = splitter.MyICS(data=text.encode('utf-8')).split()
+    assert sorted(expected) == sorted(f for f in os.listdir(tmp_path) if f != 'all.ics')
+    for (uid, data) in expected.items():
+        written = (tmp_path / uid).read_bytes()
+        assert parse_ics(str(written, 'utf-8')) == data
+        # original bytes of the component, not rewritten
+        assert written.count(b'\r\n') == written.count(b'\n')
+
+
+def test_mmapsplit_single_entry_and_junk(tmp_path, script):
+    splitter = script('ics-splitter')
+    single = tmp_path / 'one.ics'
+    single.write_bytes(calendar(vevent('a')))
+    junk = tmp_path / 'junk.ics'
+    junk.write_bytes(b'no calendar here\n')
+    empty = tmp_path / 'empty.ics'
+    empty.write_bytes(b'')
+    assert splitter.mmapsplit(str(single)) == 0
+    assert splitter.mmapsplit(str(junk)) == -1
+    assert splitter.mmapsplit(str(empty)) == -1
+    assert sorted(os.listdir(tmp_path)) == [ 'empty.ics', 'junk.ics', 'one.ics' ]
@@ -0,0 +1,117 @@
+import os
+import random
+import calendar as cal
+from datetime import datetime, timezone
+
+import pytest
+
+from ics import parse_ics
+from ics.timeindex import TimeIndex, parse_duration, interval, recurrence, intervals, indexfile
+
+from conftest import calendar, vevent
+
+DAY = 86400
+
+
+def epoch(value: str) -> int:
+    return cal.timegm(datetime.strptime(value, '%Y%m%dT%H%M%S').timetuple())
+
+
+def component(*lines: str):
+    return parse_ics(calendar('\n'.join([ 'BEGIN:VEVENT', 'UID:x' ] + list(lines) + [ 'END:VEVENT' ])).decode('utf-8'))['VCALENDAR']['VEVENT'][0]
+
+
+@pytest.mark.parametrize('value,seconds', [
+    ('PT1H30M', 5400), ('P1W', 7 * DAY), ('-P1D', -DAY), ('P1DT12H', 1.5 * DAY), ('PT', None), ('1H', None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_interval():
+    assert interval(component('DTSTART:20200102T100000Z', 'DURATION:PT1H')) == (epoch('20200102T100000'), epoch('20200102T110000'))
+    assert interval(component('DTSTART;VALUE=DATE:20200102')) == (epoch('20200102T000000'), epoch('20200103T000000'))
+    # Berlin is UTC+1 in winter
+    assert interval(component('DTSTART;TZID=Europe/Berlin:20200102T100000', 'DTEND;TZID=Europe/Berlin:20200102T110000')) == \
+        (epoch('20200102T090000'), epoch('20200102T100000'))
+    assert interval(component('SUMMARY:no start')) == None
+    assert interval(component('DTSTART:20200102T100000Z', 'RRULE:FREQ=DAILY')) == (epoch('20200102T100000'), None)
+    assert interval(component('DTSTART:20200102T100000Z', 'RRULE:FREQ=DAILY;UNTIL=20200110T100000Z')) == \
+        (epoch('20200102T100000'), epoch('20200110T100000'))
+
+
+def test_count_rules_are_bounded():
+    # the fifth weekly instance is after the switch to summer time, still at 10:00 local time
+    comp = component('DTSTART;TZID=Europe/Berlin:20200312T100000', 'DURATION:PT1H', 'RRULE:FREQ=WEEKLY;COUNT=5')
+    assert interval(comp) == (epoch('20200312T090000'), epoch('20200409T090000'))
+    comp = component('DTSTART:20200102T100000Z', 'RRULE:FREQ=SECONDLY;COUNT=1000000')
+    assert interval(comp) == (epoch('20200102T100000'), None)
+
+
+def test_recurrence_needs_dtstart():
+    assert recurrence(component('RRULE:FREQ=DAILY')) == None
+    assert recurrence(component('DTSTART:20200102T100000Z')) == None
+    assert recurrence(component('DTSTART:20200102T100000Z', 'DTEND:20200102T110000Z', 'RRULE:FREQ=DAILY')) == \
+        [ 'DTSTART', '20200102T100000Z', 'FREQ=DAILY', list(), list(), 3600 ]
+    data = parse_ics(calendar('BEGIN:VEVENT\nUID:broken\nRRULE:FREQ=DAILY\nEND:VEVENT').decode('utf-8'))
+    assert intervals(data) == list()
+
+
+def test_query_matches_brute_force(tmp_path):
+    rng = random.Random(1)
+    base = epoch('20200101T000000')
+    for i in range(200):
+        start = base + rng.randrange(0, 60 * DAY, 900)
+        stamp = datetime.fromtimestamp(start, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        props = [ 'DURATION:PT{}M'.format(rng.choice([ 0, 30, 60, 60 * 24 * 10 ])) ]
+        if i % 20 == 0:
+            props.append('RRULE:FREQ=WEEKLY')
+        item = vevent('uid-{}'.format(i), *props).replace('DTSTART:20200102T100000Z', 'DTSTART:' + stamp)
+        (tmp_path / '{}.ics'.format(i)).write_bytes(calendar(item))
+    names = sorted(os.listdir(tmp_path))
+    index = TimeIndex(str(tmp_path))
+    assert index.update(names) == 200
+    assert index.save()
+    assert sorted(os.listdir(tmp_path)) == names
+    index = TimeIndex(str(tmp_path))
+    assert index.update(names) == 0
+    spans = [ (s, e, uid) for (s, e, uid, recur) in (t for (size, mtime, times) in index.files.values() for t in times) ]
+    for i in range(50):
+        start = base + rng.randrange(-5 * DAY, 65 * DAY, 3600)
+        end = start + rng.randrange(0, 5 * DAY, 3600)
+        expected = sorted(uid for (s, e, uid) in spans if (s < end) and ((e == None) or (e > start) or (s >= start)))
+        assert sorted(r[2] for r in index.query(start, end)) == expected
+    os.utime(tmp_path / '3.ics', ns=(0, 0))
+    (tmp_path / '4.ics').unlink()
+    assert index.update([ n for n in names if n != '4.ics' ]) == 1
+    assert '4.ics' not in index.files
+
+
+def test_long_series_do_not_widen_scans(tmp_path):
+    base = epoch('20200101T000000')
+    index = TimeIndex(str(tmp_path))
+    # a year of hourly items and a few series running for years
+    index.files['short.ics'] = [ 0, 0, [ [ base + i * 3600, base + i * 3600 + 1800, 'short-{}'.format(i), None ] for i in range(24 * 365) ] ]
+    index.files['long.ics'] = [ 0, 0, [ [ base + i * DAY, base + (i + 1000) * DAY, 'long-{}'.format(i), None ] for i in range(10) ] ]
+    result = index.query(base + 100 * DAY, base + 101 * DAY)
+    assert len(result) == 24 + 10
+    assert index.scanned <= 2 * len(result)
+
+
+def test_index_kept_outside_the_store(tmp_path, tool):
+    store = tmp_path / 'store'
+    store.mkdir()
+    (store / 'a.ics').write_bytes(calendar(vevent('a')))
+    assert tool('ics-timeindex', 'index', '--indexdir', tmp_path / 'times', store).returncode == 0
+    assert os.listdir(store) == [ 'a.ics' ]
+    assert os.path.exists(indexfile(str(store), str(tmp_path / 'times')))
+
+
+def test_query_sorts_unbounded_items(tmp_path, tool):
+    # same start and UID, one of them recurring forever
+    (tmp_path / 'a.ics').write_bytes(calendar(vevent('x', 'DURATION:PT1H', 'RRULE:FREQ=DAILY')))
+    (tmp_path / 'b.ics').write_bytes(calendar(vevent('x', 'DURATION:PT1H')))
+    result = tool('ics-timeindex', 'query', '--from=2020-01-02', '--to=2020-01-04', tmp_path)
+    assert result.returncode == 0
+    assert [ l.split()[0] + ' ' + os.path.basename(l.split()[3]) for l in result.stdout.decode().splitlines() ] == [
+        '2020-01-02T10:00:00Z a.ics', '2020-01-03T10:00:00Z a.ics', '2020-01-02T10:00:00Z b.ics' ]
@@ -0,0 +1,47 @@
+from ics import parse_ics
+from ics.tokenizer import parse_lines
+from ics.ics_lazy import parse_ics_lazy
+from ics.bench import legacy_parse_ics, make_calendar
+
+from conftest import sample
+
+
+def test_tokenizer_matches_legacy_parser():
+    # the legacy parser cannot unfold property names, so no generate() here
+    text = make_calendar(20)
+    assert parse_ics(text) == legacy_parse_ics(text)
+
+
+def test_bytes_and_str_lines_parse_alike():
+    text = sample(10)
+    assert parse_lines(text.encode('utf-8').splitlines()) == parse_lines(text.splitlines())
+
+
+def test_repairs_are_reported():
+    repairs = list()
+    lines = [ 'junkBEGIN:VCALENDAR', 'BEGIN:VEVENT', 'UID:a', 'DESCRIPTION:one', '\\ntwo', 'END:VEVENT', 'END:VCALENDAR' ]
+    data = parse_lines(lines, repairs=repairs)
+    assert repairs == [ (1, 'binary blob'), (5, 'broken continuation') ]
+    assert data['VCALENDAR']['VEVENT'][0]['DESCRIPTION'] == 'one\n \\ntwo'
+
+
+def test_folded_property_name():
+    data = parse_lines([ 'BEGIN:VCALENDAR', 'BEGIN:VEVENT', 'DTSTART;TZID=Eur', ' ope/Berlin:20200101T100000',
+                         'END:VEVENT', 'END:VCALENDAR' ])
+    assert data['VCALENDAR']['VEVENT'][0] == { 'DTSTART;TZID=Europe/Berlin': '20200101T100000' }
+
+
+def test_lazy_parser_shares_the_tokenizer():
+    lines = [ 'junkBEGIN:VCALENDAR', 'BEGIN:VEVENT', 'UID:a', 'ATTENDEE:mailto:a@exa', ' mple.org', 'ATTENDEE:b',
+              'DESCRIPTION:one', '\\ntwo', 'BEGIN:VJOURNAL', 'X-IN-JOURNAL:1', 'END:VJOURNAL', 'END:VEVENT',
+              'BEGIN:VTODO', 'UID:b', 'END:VTODO', 'END:VCALENDAR' ]
+    (eager, lazy) = (list(), list())
+    data = parse_lines(lines, repairs=eager)
+    assert data['VCALENDAR']['VEVENT'][0]['ATTENDEE'] == [ 'mailto:a@exa\n mple.org', 'b' ]
+    assert data['VCALENDAR']['VEVENT'][0]['X-IN-JOURNAL'] == '1'
+    assert parse_ics_lazy('\r\n'.join(lines).encode('utf-8'), repairs=lazy) == data
+    assert lazy == eager == [ (1, 'binary blob'), (8, 'broken continuation') ]
+
+
+def test_non_ics_data():
+    assert parse_lines([ 'BEGIN:VCARD', 'END:VCARD' ]) == None
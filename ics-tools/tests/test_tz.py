@@ -0,0 +1,51 @@
+import pytest
+
+from ics import parse_ics
+from ics.tz import resolve, zone, locations, normalise, tzparam
+
+from conftest import calendar, vevent
+
+VTIMEZONE = 'BEGIN:VTIMEZONE\nTZID:Customized Time Zone\nX-LIC-LOCATION:Europe/Vienna\nEND:VTIMEZONE'
+
+
+@pytest.mark.parametrize('tzid,name', [
+    ('Europe/Berlin', 'Europe/Berlin'),
+    ('europe/berlin', 'Europe/Berlin'),
+    ('W. Europe Standard Time', 'Europe/Berlin'),
+    ('/mozilla.org/20050126_1/Europe/Berlin', 'Europe/Berlin'),
+    ('"America/New_York"', 'America/New_York'),
+    ('Customized Time Zone', None),
+    (None, None),
+])
+def test_resolve(tzid, name):
+    assert resolve(tzid) == name
+
+
+def test_locations_and_normalise():
+    data = parse_ics(calendar(VTIMEZONE, vevent('a')).decode('utf-8'))
+    tzids = locations(data['VCALENDAR'])
+    assert tzids == { 'Customized Time Zone': 'Europe/Vienna' }
+    assert zone('Customized Time Zone', 'Europe/Vienna') is zone('Europe/Vienna')
+    assert normalise('DTSTART;TZID=Customized Time Zone', tzids) == 'DTSTART;TZID=Europe/Vienna'
+    assert normalise('DTSTART;VALUE=DATE-TIME;TZID=W. Europe Standard Time') == 'DTSTART;VALUE=DATE-TIME;TZID=Europe/Berlin'
+    assert normalise('DTSTART;TZID=Nowhere/Special') == 'DTSTART;TZID=Nowhere/Special'
+    assert tzparam('DTSTART;tzid="Europe/Berlin"') == 'Europe/Berlin'
+
+
+@pytest.mark.parametrize('lazy', [ False, True ])
+def test_tzid_name_keeps_property_order(tmp_path, tool, lazy):
+    item = vevent('tz-uid-1', 'DTEND;TZID=W. Europe Standard Time:20200102T120000', 'SUMMARY:s',
+                  'BEGIN:VALARM\nTRIGGER:-PT5M\nEND:VALARM').replace('DTSTART:20200102T100000Z',
+                  'DTSTART;TZID=/mozilla.org/20050126_1/Europe/Berlin:20200102T100000')
+    (tmp_path / 'a.ics').write_bytes(calendar(item))
+    (tmp_path / 'b.ics').write_bytes(calendar(VTIMEZONE, vevent('tz-uid-2', 'DTEND;TZID=Customized Time Zone:20200102T120000')))
+    (tmp_path / 'c.ics').write_bytes(calendar(vevent('tz-uid-3', 'DTEND;TZID=Nowhere/Special:20200102T120000')))
+    args = [ '-l' ] if lazy else list()
+    result = tool('ics-fixer1', *(args + [ tmp_path ]))
+    assert result.returncode == 0
+    assert b'broken timezone id' not in result.stdout
+    expected = item.replace('/mozilla.org/20050126_1/', '').replace('W. Europe Standard Time', 'Europe/Berlin')
+    assert (tmp_path / 'a.ics').read_bytes() == calendar(expected)
+    assert b'TZID=Customized Time Zone' in (tmp_path / 'b.ics').read_bytes()
+    result = tool('ics-fixer1', *(args + [ '-v', '-f', tmp_path / 'c.ics' ]))
+    assert b'broken timezone id Nowhere/Special' in result.stdout
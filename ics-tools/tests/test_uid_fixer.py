@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import calendar, vevent, snapshot
+
+ITEMS = {
+    'bad.ics': [ vevent('bad uid', 'DESCRIPTION:one', '\\ntwo') ],
+    'clean.ics': [ vevent('clean-uid-1', 'DESCRIPTION:one', '\\ntwo') ],
+    'tz.ics': [ vevent('tz-uid-1', 'X-RADICALE-NAME:a:b') ],
+}
+
+
+def make_tree(directory, eol: str):
+    directory.mkdir()
+    for (name, components) in ITEMS.items():
+        (directory / name).write_bytes(calendar(*components, eol=eol))
+
+
+def test_scan_matches_line_mode(tmp_path, tool):
+    for mode in ('lines', 'scan'):
+        make_tree(tmp_path / mode, '\n')
+    assert tool('ics-uid-fixer', tmp_path / 'lines').returncode == 0
+    assert tool('ics-uid-fixer', '-s', tmp_path / 'scan').returncode == 0
+    result = snapshot(tmp_path / 'scan')
+    assert result == snapshot(tmp_path / 'lines')
+    assert b'X-FIXER-UID:bad uid\nUID:<uuid>\n' in result['bad.ics']
+    assert b'X-FIXER-X-RADICALE-NAME:a:b\n' in result['tz.ics']
+    assert b'  \\ntwo' in result['bad.ics']
+    assert b'\n\\ntwo' in result['clean.ics']
+    assert result['clean.ics'] == calendar(*ITEMS['clean.ics'], eol='\n')
+
+
+def test_scan_keeps_crlf(tmp_path, tool):
+    make_tree(tmp_path / 'scan', '\r\n')
+    result = tool('ics-uid-fixer', '-s', tmp_path / 'scan')
+    assert result.returncode == 0
+    assert sorted(result.stdout.decode().splitlines()) == [ '{} modified'.format(tmp_path / 'scan' / name)
+                                                           for name in ('bad.ics', 'tz.ics') ]
+    for data in snapshot(tmp_path / 'scan').values():
+        assert data.count(b'\n') == data.count(b'\r\n')
+
+
+@pytest.mark.parametrize('args', [ [], [ '-s' ] ])
+def test_unchanged_files_not_written(tmp_path, tool, args):
+    make_tree(tmp_path / 'c', '\r\n')
+    clean = tmp_path / 'c' / 'clean.ics'
+    before = clean.stat()
+    assert tool('ics-uid-fixer', *(args + [ tmp_path / 'c' ])).returncode == 0
+    assert clean.stat().st_ino == before.st_ino
+    assert clean.read_bytes() == calendar(*ITEMS['clean.ics'])
@@ -0,0 +1,69 @@
+import shutil
+
+import pytest
+
+from ics.uid_index import UIDIndex
+
+from conftest import calendar, vevent, snapshot
+
+
+def test_index_owners_and_taken(tmp_path):
+    index = UIDIndex(str(tmp_path / 'index.sqlite'))
+    a = str(tmp_path / 'c' / 'a.ics')
+    b = str(tmp_path / 'c' / 'b.ics')
+    index.update(a, [ ('UID', 'x'), ('X-RADICALE-NAME', 'a.ics') ], 'hash-a')
+    index.update(b, [ ('UID', 'y') ])
+    assert index.owners('x') == [ a ]
+    assert index.taken('x', b)
+    assert not index.taken('x', a)
+    assert 'x' in index.view(b)
+    assert index.filehash(a) == 'hash-a'
+    # update replaces, remove and prune drop entries
+    index.update(a, [ ('UID', 'z') ])
+    assert index.owners('x') == list()
+    assert index.prune(str(tmp_path / 'c'), [ a ]) == 1
+    assert index.owners('y') == list()
+    index.remove(a)
+    assert index.owners('z') == list()
+    index.close()
+
+
+def test_index_paths_relative_to_index(tmp_path):
+    (tmp_path / 'old').mkdir()
+    index = UIDIndex(str(tmp_path / 'old' / 'index.sqlite'))
+    index.update(str(tmp_path / 'old' / 'c' / 'a.ics'), [ ('UID', 'x') ])
+    index.close()
+    shutil.move(str(tmp_path / 'old'), str(tmp_path / 'new'))
+    index = UIDIndex(str(tmp_path / 'new' / 'index.sqlite'))
+    assert index.owners('x') == [ str(tmp_path / 'new' / 'c' / 'a.ics') ]
+    index.close()
+
+
+@pytest.mark.parametrize('jobs', [ 0, 2 ])
+def test_indexed_owner_keeps_uid(tmp_path, tool, jobs):
+    collection = tmp_path / 'c'
+    collection.mkdir()
+    (collection / 'a.ics').write_bytes(calendar(vevent('uid-x', 'SUMMARY:a')))
+    (collection / 'b.ics').write_bytes(calendar(vevent('uid-y', 'SUMMARY:b')))
+    index = tmp_path / 'index.sqlite'
+    assert tool('ics-fixer1', '-i', index, collection).returncode == 0
+    # a new item sorting before the indexed owner of its UID
+    (collection / '0.ics').write_bytes(calendar(vevent('uid-x', 'SUMMARY:zero')))
+    assert tool('ics-fixer1', '-j', jobs, '-i', index, collection).returncode == 0
+    result = snapshot(collection)
+    assert b'UID:uid-x' in result['a.ics']
+    assert b'UID:<uuid>' in result['0.ics']
+    assert b'UID:uid-y' in result['b.ics']
+
+
+def test_single_file_checked_against_index(tmp_path, tool):
+    collection = tmp_path / 'c'
+    collection.mkdir()
+    (collection / 'a.ics').write_bytes(calendar(vevent('uid-x')))
+    index = tmp_path / 'index.sqlite'
+    assert tool('ics-fixer1', '-i', index, collection).returncode == 0
+    (collection / 'new.ics').write_bytes(calendar(vevent('uid-x')))
+    assert tool('ics-fixer1', '-i', index, '-f', collection / 'new.ics').returncode == 0
+    result = snapshot(collection)
+    assert b'UID:uid-x' in result['a.ics']
+    assert b'UID:<uuid>' in result['new.ics']
@@ -0,0 +1,19 @@
+import os
+
+from ics.walk import walk, hidden
+
+
+def test_walk_sorted_and_prunes_dotfiles(tmp_path):
+    for path in ('user/b/2.ics', 'user/b/1.ics', 'user/a/z.ics', 'user/a/.Radicale.props',
+                 'user/a/.Radicale.cache/item/1.ics', 'user/.Radicale.tmp-x', 'top.ics'):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b'')
+    os.symlink(tmp_path / 'user', tmp_path / 'user' / 'loop')
+    found = [ os.path.relpath(p, tmp_path) for p in walk(str(tmp_path)) ]
+    assert found == [ 'top.ics', 'user/a/z.ics', 'user/b/1.ics', 'user/b/2.ics' ]
+    assert hidden('/x/.Radicale.lock')
+    assert not hidden('/x/.y/item.ics')
+
+
+def test_walk_missing_directory(tmp_path):
+    assert list(walk(str(tmp_path / 'missing'))) == list()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import fcntl
+import signal
+import threading
+import subprocess
+
+from ics.watch import Watcher, StoreLock, lockfile, LOCKFILE
+
+from conftest import TOOLS, calendar, vevent
+
+
+def test_lockfile_found_above(tmp_path):
+    collection = tmp_path / 'collection-root' / 'user' / 'cal'
+    collection.mkdir(parents=True)
+    assert lockfile(str(collection)) == None
+    (tmp_path / LOCKFILE).write_bytes(b'')
+    assert lockfile(str(collection)) == str(tmp_path / LOCKFILE)
+
+
+def test_store_lock_waits_for_radicale(tmp_path):
+    path = tmp_path / LOCKFILE
+    path.write_bytes(b'')
+    events = list()
+
+    def fix():
+        with StoreLock(str(path)):
+            events.append('fixed')
+
+    with open(path) as radicale:
+        fcntl.flock(radicale.fileno(), fcntl.LOCK_EX)
+        thread = threading.Thread(target=fix)
+        thread.start()
+        thread.join(0.3)
+        events.append('released')
+    thread.join(5)
+    assert events == [ 'released', 'fixed' ]
+    with StoreLock(None):
+        pass
+
+
+def test_watcher_batches(tmp_path):
+    (tmp_path / 'cal').mkdir()
+    (tmp_path / 'cal' / 'old.ics').write_bytes(b'')
+    watcher = Watcher(str(tmp_path))
+    try:
+        (tmp_path / 'cal' / 'a.ics').write_bytes(b'a')
+        (tmp_path / 'cal' / '.Radicale.tmp-a').write_bytes(b'a')
+        os.rename(tmp_path / 'cal' / '.Radicale.tmp-a', tmp_path / 'cal' / 'b.ics')
+        (tmp_path / 'cal' / 'old.ics').unlink()
+        (tmp_path / '.new').mkdir()
+        (tmp_path / '.new' / 'c.ics').write_bytes(b'c')
+        os.rename(tmp_path / '.new', tmp_path / 'new')
+        (changed, deleted) = next(watcher.batches(debounce=0.2))
+    finally:
+        watcher.close()
+    assert changed == [ str(tmp_path / p) for p in ('cal/a.ics', 'cal/b.ics', 'new/c.ics') ]
+    assert deleted == [ str(tmp_path / 'cal' / 'old.ics') ]
+
+
+def test_fixer_watch(tmp_path):
+    collection = tmp_path / 'collection-root' / 'cal'
+    collection.mkdir(parents=True)
+    (tmp_path / LOCKFILE).write_bytes(b'')
+    process = subprocess.Popen([ sys.executable, '-u', os.path.join(TOOLS, 'ics-fixer1.py'), '--watch', '--debounce=0.1',
+                                 '-v', '-i', str(tmp_path / 'index.sqlite'), str(collection) ],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=TOOLS)
+    try:
+        for line in process.stdout:
+            if line.startswith(b'watching'):
+                break
+        item = collection / 'a.ics'
+        item.write_bytes(calendar(vevent('bad uid')))
+        deadline = time.monotonic() + 10
+        while (b'\nUID:bad uid' in item.read_bytes()) and (time.monotonic() < deadline):
+            time.sleep(0.05)
+        assert b'\nUID:bad uid' not in item.read_bytes()
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(10)
+    assert process.returncode == 0